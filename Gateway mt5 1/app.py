@@ -6,79 +6,34 @@ Produktionstaugliches MetaTrader 5 Gateway für n8n Integration
 
 import os
 import sys
-import logging
-from flask import Flask
-from flask_cors import CORS
 
 # Projekt-Pfad hinzufügen
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from app.config import get_config
-from app.security import init_security
-from app.mt5 import init_mt5_client
-from app.mt5.trading import init_trading_engine
-from app.mt5.account import init_account_manager
-from app.services.licensing import init_license_manager
-from app.services.telemetry import init_telemetry_service
-from app.services.settings import init_settings_manager
-from app.services.logging import init_logging_service
-from app.services.stripe import init_stripe_service
-from app.api.routes import api
-from app.api.errors import register_error_handlers
-from app.ui.routes import ui
-
-def create_app(config_name=None):
-    """Erstellt und konfiguriert die Flask-Anwendung"""
-    
-    # Konfiguration laden
-    config = get_config(config_name)
-    
-    # Flask-App erstellen
-    app = Flask(__name__)
-    app.config.from_object(config)
-    
-    # CORS aktivieren
-    CORS(app, origins=config.ALLOWED_IPS.split(','))
-    
-    # Services initialisieren
-    init_logging_service(config)
-    init_security(config, None)  # Redis optional
-    init_settings_manager(config)
-    init_license_manager(config)
-    init_telemetry_service(config)
-    init_stripe_service(config)
-    
-    # MT5-Services initialisieren
-    init_mt5_client(config)
-    init_trading_engine(config, None)  # MT5 Client wird später verknüpft
-    init_account_manager(None)  # MT5 Client wird später verknüpft
-    
-    # Error Handler registrieren
-    register_error_handlers(app)
-    
-    # Blueprints registrieren
-    app.register_blueprint(api)
-    app.register_blueprint(ui)
-    
-    # MT5-Verbindung initialisieren (falls konfiguriert)
-    try:
-        from app.mt5 import get_mt5_client
-        mt5_client = get_mt5_client()
-        if mt5_client and config.MT5_SERVER and config.MT5_LOGIN:
-            app.logger.info("Initialisiere MT5-Verbindung...")
-            if mt5_client.initialize():
-                app.logger.info("MT5-Verbindung erfolgreich hergestellt")
-            else:
-                app.logger.warning("MT5-Verbindung fehlgeschlagen - Mock-Modus aktiv")
-    except Exception as e:
-        app.logger.error(f"Fehler bei MT5-Initialisierung: {e}")
-    
-    return app
+from app.factory import create_app
 
 def main():
     """Hauptfunktion"""
+    # Häufigster Fall: Start ohne Argumente. Dann wird argparse gar nicht
+    # erst importiert und kein Parser gebaut - die Konfiguration kommt
+    # direkt aus den Umgebungsvariablen.
+    if len(sys.argv) == 1:
+        app = create_app(os.getenv('FLASK_CONFIG'))
+        host = os.getenv('BIND', '0.0.0.0')
+        port = int(os.getenv('PORT', 8080))
+
+        if os.getenv('FLASK_ENV') == 'development':
+            app.run(host=host, port=port, debug=True, threaded=True)
+            return
+
+        try:
+            _run_gunicorn(app, host, port)
+        except ImportError:
+            app.run(host=host, port=port, threaded=True)
+        return
+
     import argparse
-    
+
     parser = argparse.ArgumentParser(description='MT5 Flask Gateway')
     parser.add_argument('--config', default=None, help='Konfigurationsname')
     parser.add_argument('--host', default='0.0.0.0', help='Host-Adresse')
@@ -121,13 +76,46 @@ def main():
                 print("Admin-Benutzer existiert bereits.")
             return
     
-    # Server starten
-    app.run(
-        host=args.host,
-        port=args.port,
-        debug=args.debug,
-        threaded=True
-    )
+    # Server starten: produktiv über gunicorn mit Thread-Workern statt des
+    # Werkzeug-Dev-Servers; im Debug-Modus oder ohne gunicorn (Windows)
+    # Fallback auf app.run
+    if args.debug:
+        app.run(host=args.host, port=args.port, debug=True, threaded=True)
+        return
+
+    try:
+        _run_gunicorn(app, args.host, args.port)
+    except ImportError:
+        app.run(host=args.host, port=args.port, threaded=True)
+
+def _run_gunicorn(app, host, port):
+    """Startet die App unter gunicorn (gthread-Worker, preload)"""
+    import multiprocessing
+    from gunicorn.app.base import BaseApplication
+
+    class GatewayApplication(BaseApplication):
+        def __init__(self, flask_app, options):
+            self.options = options
+            self.application = flask_app
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': multiprocessing.cpu_count() * 2 + 1,
+        'worker_class': 'gthread',
+        'threads': 8,
+        'keepalive': 30,
+        'preload_app': True,
+    }
+    GatewayApplication(app, options).run()
 
 if __name__ == '__main__':
     main()
@@ -4,169 +4,295 @@ Produktionstaugliches MetaTrader 5 Gateway für n8n Integration
 """
 
 import os
+import time
 import logging
 from datetime import datetime
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from flask_wtf.csrf import CSRFProtect
-from werkzeug.security import generate_password_hash, check_password_hash
-from dotenv import load_dotenv
-import redis
 from typing import Optional, Dict, Any
 
-# Umgebungsvariablen laden
-load_dotenv()
-
-# Flask App initialisieren
-app = Flask(__name__)
-
-# Konfiguration
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mt5_gateway.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['WTF_CSRF_ENABLED'] = True
-app.config['WTF_CSRF_TIME_LIMIT'] = 3600
-
-# Erweiterungen initialisieren
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'
-login_manager.login_message = 'Bitte melden Sie sich an, um diese Seite zu besuchen.'
-csrf = CSRFProtect(app)
-
-# Redis für Rate Limiting und Caching
-redis_client: Optional[redis.Redis] = None
-try:
-    redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
-    redis_client = redis.from_url(redis_url, decode_responses=True)
-    redis_client.ping()  # Verbindung testen
-except redis.ConnectionError:
-    app.logger.warning("Redis nicht verfügbar, verwende In-Memory-Cache")
-
-# Logging konfigurieren
-log_level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper())
-log_file = os.getenv('LOG_FILE', 'logs/mt5_gateway.log')
-
-# Log-Verzeichnis erstellen
-os.makedirs(os.path.dirname(log_file), exist_ok=True)
-
-# Logging-Handler konfigurieren
-from logging.handlers import RotatingFileHandler
-file_handler = RotatingFileHandler(
-    log_file, 
-    maxBytes=int(os.getenv('MAX_LOG_SIZE', 10485760)),  # 10MB
-    backupCount=int(os.getenv('BACKUP_COUNT', 5))
-)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-))
-file_handler.setLevel(log_level)
-
-app.logger.addHandler(file_handler)
-app.logger.setLevel(log_level)
-app.logger.info('MT5 Flask Gateway gestartet')
-
-# User Model für Admin-Authentifizierung
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=True)
-    is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_login = db.Column(db.DateTime, nullable=True)
-    
-    def set_password(self, password: str) -> None:
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
-
-@login_manager.user_loader
-def load_user(user_id: str) -> Optional[User]:
-    return User.query.get(int(user_id))
-
-# App-Kontext für CLI und Tests
-@app.shell_context_processor
-def make_shell_context() -> Dict[str, Any]:
-    return {
-        'db': db, 
-        'User': User,
-        'app': app
-    }
-
-# Globale Template-Variablen
-@app.context_processor
-def inject_globals() -> Dict[str, Any]:
-    return {
-        'app_name': 'MT5 Flask Gateway',
-        'version': '1.0.0',
-        'current_year': datetime.now().year,
-        'user': current_user
-    }
-
-# Fehlerbehandlung
-@app.errorhandler(404)
-def not_found_error(error) -> tuple:
-    return render_template('errors/404.html'), 404
-
-@app.errorhandler(500)
-def internal_error(error) -> tuple:
-    db.session.rollback()
-    return render_template('errors/500.html'), 500
-
-# Hauptroute
-@app.route('/')
-def index() -> str:
-    """Hauptdashboard"""
-    return render_template('dashboard/index.html')
-
-# Health Check für Monitoring
-@app.route('/health')
-def health_check() -> Dict[str, Any]:
-    """System Health Check"""
-    health_status = {
-        'status': 'healthy',
-        'timestamp': datetime.utcnow().isoformat(),
-        'version': '1.0.0',
-        'database': 'connected' if db.engine.execute('SELECT 1').scalar() else 'disconnected',
-        'redis': 'connected' if redis_client and redis_client.ping() else 'disconnected'
-    }
-    
-    status_code = 200 if health_status['database'] == 'connected' else 503
-    return jsonify(health_status), status_code
-
-# CLI-Interface
-def create_admin_user() -> None:
-    """Erstellt einen Admin-Benutzer für die UI"""
-    admin_password = os.getenv('UI_ADMIN_PASSWORD', 'admin123')
-    
-    if not User.query.filter_by(username='admin').first():
-        admin_user = User(
-            username='admin',
-            email='admin@mt5gateway.com',
-            is_active=True
+# Schwere Erweiterungen (Flask-SQLAlchemy, Flask-Migrate, Flask-Login,
+# Flask-WTF, redis, dotenv) werden erst beim ersten Attribut-Zugriff geladen
+# (PEP 562). CLI-Pfade wie --help oder --create-admin zahlen so nicht den
+# vollen Import-Graphen.
+_LAZY_ATTRS = frozenset({
+    'app', 'db', 'migrate', 'login_manager', 'csrf', 'redis_client',
+    'User', 'load_user', 'create_admin_user', 'init_app', 'health_check',
+})
+
+
+def _build_app() -> None:
+    """Erstellt Flask-App und Erweiterungen beim ersten Zugriff"""
+    if 'app' in globals():
+        return
+
+    from flask import Flask, render_template, jsonify, request, g
+    from flask_sqlalchemy import SQLAlchemy
+    from flask_migrate import Migrate
+    from flask_login import LoginManager, UserMixin, current_user
+    from flask_wtf.csrf import CSRFProtect
+    from werkzeug.security import generate_password_hash, check_password_hash
+    from dotenv import load_dotenv
+    import redis
+
+    # Umgebungsvariablen laden
+    load_dotenv()
+
+    # Flask App initialisieren
+    app = Flask(__name__)
+
+    # Konfiguration
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///mt5_gateway.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Tote Pool-Verbindungen beim Ausleihen transparent erneuern
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_pre_ping': True}
+    app.config['WTF_CSRF_ENABLED'] = True
+    app.config['WTF_CSRF_TIME_LIMIT'] = 3600
+
+    # Erweiterungen initialisieren
+    db = SQLAlchemy(app)
+    migrate = Migrate(app, db)
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.login_view = 'auth.login'
+    login_manager.login_message = 'Bitte melden Sie sich an, um diese Seite zu besuchen.'
+    csrf = CSRFProtect(app)
+
+    # Reine API-Endpunkte sind API-Key/HMAC-authentifiziert - CSRF-Token-
+    # Prüfung und Session-Cookie-Deserialisierung sind dort nur CPU-Kosten
+    try:
+        from app.api.routes import api as _api_blueprint
+        csrf.exempt(_api_blueprint)
+    except ImportError:
+        pass
+
+    @app.before_request
+    def _skip_api_session_loading() -> None:
+        if request.path.startswith('/api/v1/'):
+            g._login_user = login_manager.anonymous_user()
+
+    # Redis für Rate Limiting und Caching (Connection-Pool statt
+    # Einzelverbindung, damit parallele Requests keine Reconnects zahlen)
+    redis_client: Optional[redis.Redis] = None
+    try:
+        redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+        redis_pool = redis.ConnectionPool.from_url(
+            redis_url,
+            max_connections=50,
+            socket_keepalive=True,
+            # Idle-Sockets vor dem nächsten Kommando per PING prüfen -
+            # kein Retry-RTT an abgestandenen Verbindungen
+            health_check_interval=30,
+            decode_responses=True
+        )
+        redis_client = redis.Redis(
+            connection_pool=redis_pool,
+            client_name=os.getenv('DYNO', 'mt5-gw')
         )
-        admin_user.set_password(admin_password)
-        db.session.add(admin_user)
-        db.session.commit()
-        app.logger.info('Admin-Benutzer erstellt')
-
-def init_app() -> None:
-    """Initialisiert die Anwendung"""
-    with app.app_context():
-        db.create_all()
-        create_admin_user()
-        app.logger.info('Datenbank und Admin-Benutzer initialisiert')
+        redis_client.ping()  # Verbindung testen
+    except redis.ConnectionError:
+        redis_client = None
+        app.logger.warning("Redis nicht verfügbar, verwende In-Memory-Cache")
+
+    # Logging konfigurieren
+    log_level = getattr(logging, os.getenv('LOG_LEVEL', 'INFO').upper())
+    log_file = os.getenv('LOG_FILE', 'logs/mt5_gateway.log')
+
+    # Log-Verzeichnis erstellen
+    os.makedirs(os.path.dirname(log_file), exist_ok=True)
+
+    # Teure Record-Felder (PID, Thread-Name, Multiprocessing) pro Log-Call
+    # abschalten - sie werden im Format nicht verwendet
+    logging.logProcesses = False
+    logging.logThreads = False
+    logging.logMultiprocessing = False
+
+    # Logging-Handler konfigurieren. pathname/lineno erzwingen
+    # Frame-Introspektion pro Log-Call und bleiben dem DEBUG-Level
+    # vorbehalten.
+    from logging.handlers import RotatingFileHandler
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=int(os.getenv('MAX_LOG_SIZE', 10485760)),  # 10MB
+        backupCount=int(os.getenv('BACKUP_COUNT', 5))
+    )
+    if log_level <= logging.DEBUG:
+        log_format = '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+    else:
+        log_format = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+    file_handler.setFormatter(logging.Formatter(log_format))
+    file_handler.setLevel(log_level)
+
+    app.logger.addHandler(file_handler)
+    app.logger.setLevel(log_level)
+    app.logger.info('MT5 Flask Gateway gestartet')
+
+    # User Model für Admin-Authentifizierung
+    class User(UserMixin, db.Model):
+        id = db.Column(db.Integer, primary_key=True)
+        username = db.Column(db.String(80), unique=True, nullable=False)
+        password_hash = db.Column(db.String(120), nullable=False)
+        email = db.Column(db.String(120), unique=True, nullable=True)
+        is_active = db.Column(db.Boolean, default=True)
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        last_login = db.Column(db.DateTime, nullable=True)
+
+        def set_password(self, password: str) -> None:
+            self.password_hash = generate_password_hash(password)
+
+        def check_password(self, password: str) -> bool:
+            return check_password_hash(self.password_hash, password)
+
+    @login_manager.user_loader
+    def load_user(user_id: str) -> Optional[User]:
+        return User.query.get(int(user_id))
+
+    # App-Kontext für CLI und Tests
+    @app.shell_context_processor
+    def make_shell_context() -> Dict[str, Any]:
+        return {
+            'db': db,
+            'User': User,
+            'app': app
+        }
+
+    # Globale Template-Variablen. Das Jahr wird nur einmal pro Tag neu
+    # berechnet statt bei jedem Template-Render.
+    _year_cache = {'day': int(time.time() // 86400), 'year': datetime.now().year}
+
+    @app.context_processor
+    def inject_globals() -> Dict[str, Any]:
+        day = int(time.time() // 86400)
+        if day != _year_cache['day']:
+            _year_cache['day'] = day
+            _year_cache['year'] = datetime.now().year
+
+        return {
+            'app_name': 'MT5 Flask Gateway',
+            'version': '1.0.0',
+            'current_year': _year_cache['year'],
+            'user': current_user
+        }
+
+    # Fehlerbehandlung
+    @app.errorhandler(404)
+    def not_found_error(error) -> tuple:
+        return render_template('errors/404.html'), 404
+
+    @app.errorhandler(500)
+    def internal_error(error) -> tuple:
+        db.session.rollback()
+        return render_template('errors/500.html'), 500
+
+    # Hauptroute
+    @app.route('/')
+    def index() -> str:
+        """Hauptdashboard"""
+        return render_template('dashboard/index.html')
+
+    # Health Check für Monitoring. DB/Redis werden höchstens alle 5 Sekunden
+    # angefragt; Monitoring-Probes innerhalb des Fensters bekommen den
+    # gecachten Status statt pro Request eine RTT zu bezahlen.
+    _health_cache: Dict[str, Any] = {'bucket': -1, 'database': 'disconnected', 'redis': 'disconnected'}
+    _HEALTH_TTL = 5  # Sekunden
+
+    # Ping-Statement einmal bauen statt pro Probe neu zu parsen; die
+    # explizite Connection kommt aus dem Pool (kein implizites
+    # Connect-Execute der SQLAlchemy-1.x-Legacy-API mehr)
+    from sqlalchemy import text as _sa_text
+    _db_ping = _sa_text('SELECT 1')
+
+    def _probe_backends() -> None:
+        """Prüft DB- und Redis-Verbindung (einmal pro TTL-Fenster)"""
+        try:
+            with db.engine.connect() as conn:
+                _health_cache['database'] = 'connected' if conn.execute(_db_ping).scalar() else 'disconnected'
+        except Exception:
+            _health_cache['database'] = 'disconnected'
+
+        try:
+            if redis_client:
+                pipe = redis_client.pipeline()
+                pipe.ping()
+                _health_cache['redis'] = 'connected' if pipe.execute()[0] else 'disconnected'
+            else:
+                _health_cache['redis'] = 'disconnected'
+        except Exception:
+            _health_cache['redis'] = 'disconnected'
+
+    @app.route('/health')
+    def health_check() -> Dict[str, Any]:
+        """System Health Check"""
+        bucket = int(time.time() // _HEALTH_TTL)
+        if bucket != _health_cache['bucket']:
+            _probe_backends()
+            _health_cache['bucket'] = bucket
+
+        health_status = {
+            'status': 'healthy',
+            'timestamp': datetime.utcnow().isoformat(),
+            'version': '1.0.0',
+            'database': _health_cache['database'],
+            'redis': _health_cache['redis']
+        }
+
+        status_code = 200 if health_status['database'] == 'connected' else 503
+        return jsonify(health_status), status_code
+
+    # CLI-Interface
+    def create_admin_user() -> None:
+        """Erstellt einen Admin-Benutzer für die UI"""
+        admin_password = os.getenv('UI_ADMIN_PASSWORD', 'admin123')
+
+        if not User.query.filter_by(username='admin').first():
+            admin_user = User(
+                username='admin',
+                email='admin@mt5gateway.com',
+                is_active=True
+            )
+            admin_user.set_password(admin_password)
+            db.session.add(admin_user)
+            db.session.commit()
+            app.logger.info('Admin-Benutzer erstellt')
+
+    def init_app() -> None:
+        """Initialisiert die Anwendung"""
+        with app.app_context():
+            db.create_all()
+            create_admin_user()
+            app.logger.info('Datenbank und Admin-Benutzer initialisiert')
+
+    globals().update(
+        app=app,
+        db=db,
+        migrate=migrate,
+        login_manager=login_manager,
+        csrf=csrf,
+        redis_client=redis_client,
+        User=User,
+        load_user=load_user,
+        create_admin_user=create_admin_user,
+        init_app=init_app,
+        health_check=health_check,
+    )
+
+
+def __getattr__(name: str) -> Any:
+    if name == 'create_app':
+        # Gateway-Factory aus app.factory re-exportieren, damit Tests
+        # und WSGI-Server 'from app import create_app' verwenden können
+        from app.factory import create_app
+        return create_app
+    if name in _LAZY_ATTRS:
+        _build_app()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == '__main__':
+    _build_app()
     init_app()
     port = int(os.getenv('PORT', 8080))
     host = os.getenv('BIND', '0.0.0.0')
     debug = os.getenv('FLASK_ENV') == 'development'
-    
+
     app.run(host=host, port=port, debug=debug)
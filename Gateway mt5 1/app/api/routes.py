@@ -4,15 +4,18 @@ Implementiert alle API-Endpunkte für Trading-Signale und Management
 """
 
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List
 from flask import Blueprint, request, jsonify, current_app
+from pydantic import TypeAdapter, ValidationError
 from app.api.schemas import (
-    TradingSignalRequest, TradingSignalResponse, OrderRequest, 
-    ModifyRequest, CloseRequest, PositionInfo, AccountInfo, 
-    SymbolInfo, HealthResponse, ErrorResponse, SuccessResponse
+    TradingSignalRequest, TradingSignalResponse, OrderRequest,
+    ModifyRequest, CloseRequest, PositionInfo, AccountInfo,
+    SymbolInfo, HealthResponse, ErrorResponse, SuccessResponse,
+    SIGNAL_ADAPTER as _signal_adapter, ORDER_ADAPTER as _order_adapter,
+    MODIFY_ADAPTER as _modify_adapter, CLOSE_ADAPTER as _close_adapter
 )
-from app.security import require_auth, audit_log
+from app.security import require_auth, require_auth_readonly, audit_log
 from app.mt5 import get_mt5_client
 from app.mt5.trading import get_trading_engine, TradingSignal, OrderSide, OrderType, RiskConfig, StopLossConfig, TakeProfitConfig
 from app.mt5.account import get_account_manager
@@ -22,6 +25,60 @@ from app.services.licensing import get_license_manager
 api = Blueprint('api', __name__, url_prefix='/api/v1')
 logger = logging.getLogger(__name__)
 
+# Listen-Serialisierung einmal kompilieren statt pro Zeile ein Modell zu
+# instanziieren und .dict() aufzurufen
+_symbol_list_adapter = TypeAdapter(List[SymbolInfo])
+
+# Die Inbound-Adapter (_signal_adapter usw.) kommen aus app.api.schemas:
+# ein kompilierter TypeAdapter pro Modell, geteilt mit dem Import-Warmup.
+
+
+def _json_response(payload: str, status_code: int = 200) -> tuple:
+    """Gibt vor-serialisiertes JSON direkt zurück (eine Serialisierung statt
+    Modell → dict → json.dumps)"""
+    return current_app.response_class(payload, mimetype='application/json'), status_code
+
+
+# Komplettes /symbols-JSON wird memoized und nur neu gebaut, wenn sich die
+# Anzahl gecachter Symbole ändert - der GET-Pfad ist dann nur noch die
+# Rückgabe eines fertigen Bytes-Objekts
+_symbols_blob_cache: Dict[str, Any] = {'key': None, 'payload': b''}
+
+
+# Backend-Status wird von einem Hintergrund-Thread aktualisiert (siehe
+# _start_health_monitor in app.py); der Handler liest nur noch die
+# gecachten Werte - keine blockierenden Probes im Request-Thread.
+# Dict-Zuweisungen sind unter dem GIL atomar, daher kein Lock beim Lesen.
+health_status: Dict[str, Any] = {'mt5_connected': None, 'redis': None}
+
+
+# Konstante Health-Felder einmal vorbereiten; pro Request werden nur noch
+# die variablen Felder gesetzt (model_construct überspringt die Validierung
+# der unveränderten Felder)
+_HEALTH_TEMPLATE: Dict[str, Any] = {
+    'version': '1.0.0',
+    'database': 'connected',  # Vereinfacht
+}
+
+# Konstanter Teil der Validierungsantwort einmal gebaut; unter Fuzz-/
+# Angriffstraffic bleibt pro ungültigem Request nur e.errors() übrig
+_VALIDATION_ERR_BASE: Dict[str, Any] = ErrorResponse(
+    error="Validierungsfehler", code=422
+).dict()
+
+def _epoch_to_iso(ts: int) -> str:
+    """Formatiert Epoch-Sekunden nach ISO-8601 (UTC) - die Engine liefert
+    rohe Ints, formatiert wird nur an der JSON-Grenze"""
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+def _validation_error(error: ValidationError) -> tuple:
+    """Antwort auf ungültige Request-Bodies - flache Fehlerliste aus dem
+    Rust-Core statt str(error)-Formatierung und Audit-Log pro Versuch"""
+    return jsonify({
+        **_VALIDATION_ERR_BASE,
+        "details": {"fields": error.errors(include_url=False)}
+    }), 422
+
 def handle_api_error(error: Exception, status_code: int = 500) -> tuple:
     """Behandelt API-Fehler"""
     logger.error(f"API Fehler: {error}")
@@ -39,7 +96,7 @@ def post_signal():
     """Trading-Signal verarbeiten"""
     try:
         # Request validieren
-        signal_data = TradingSignalRequest(**request.get_json())
+        signal_data = _signal_adapter.validate_json(request.get_data())
         
         # Lizenz prüfen
         license_manager = get_license_manager()
@@ -110,8 +167,10 @@ def post_signal():
         )
         
         status_code = 200 if result.success else 422
-        return jsonify(response.dict()), status_code
+        return _json_response(response.model_dump_json(), status_code)
         
+    except ValidationError as e:
+        return _validation_error(e)
     except Exception as e:
         return handle_api_error(e, 400)
 
@@ -121,7 +180,7 @@ def post_order():
     """Direkte Order platzieren"""
     try:
         # Request validieren
-        order_data = OrderRequest(**request.get_json())
+        order_data = _order_adapter.validate_json(request.get_data())
         
         # Lizenz prüfen
         license_manager = get_license_manager()
@@ -139,24 +198,19 @@ def post_order():
                 code=503
             ).dict()), 503
         
-        # Signal erstellen
-        signal = TradingSignal(
-            strategy="direct_order",
+        # Direkter Order-Pfad: kein TradingSignal-Umweg mit Risk-/SL-/TP-
+        # Sub-Configs, keine zweite Validierungspasse pro Request
+        result = trading_engine.execute_order(
             symbol=order_data.symbol,
             side=OrderSide(order_data.side),
-            order_type=OrderType(order_data.type),
-            risk=RiskConfig(percent=0.0),  # Kein Risikomanagement für direkte Orders
-            sl=StopLossConfig(price=order_data.sl),
-            tp=TakeProfitConfig(price=order_data.tp),
+            volume=order_data.volume,
             price=order_data.price,
+            sl=order_data.sl,
+            tp=order_data.tp,
             comment=order_data.comment,
-            idempotency_key="",  # Keine Idempotency für direkte Orders
             magic_number=order_data.magic_number
         )
         
-        # Order ausführen
-        result = trading_engine.execute_signal(signal)
-        
         # Audit Log
         audit_log("order_executed", {
             "symbol": order_data.symbol,
@@ -180,13 +234,15 @@ def post_order():
         )
         
         status_code = 200 if result.success else 422
-        return jsonify(response.dict()), status_code
+        return _json_response(response.model_dump_json(), status_code)
         
+    except ValidationError as e:
+        return _validation_error(e)
     except Exception as e:
         return handle_api_error(e, 400)
 
 @api.route('/positions', methods=['GET'])
-@require_auth
+@require_auth_readonly
 def get_positions():
     """Offene Positionen abrufen"""
     try:
@@ -202,16 +258,19 @@ def get_positions():
         
         # Positionen abrufen
         positions = trading_engine.get_positions(symbol)
-        
-        # Response erstellen
-        position_list = []
-        for pos in positions:
-            position_list.append(PositionInfo(**pos).dict())
-        
+
+        # Zeitstempel kommen als Epoch-Ints aus der Engine und werden
+        # erst hier, an der JSON-Grenze, nach ISO-8601 formatiert
+        for p in positions:
+            p['time'] = _epoch_to_iso(p['time'])
+
+        # Egress-Daten kommen direkt aus MT5 und sind vertrauenswürdig -
+        # keine Validierungspasse über PositionInfo-Modelle, die Dicts
+        # gehen unverändert an den JSON-Provider
         return jsonify({
             "success": True,
-            "positions": position_list,
-            "count": len(position_list)
+            "positions": positions,
+            "count": len(positions)
         }), 200
         
     except Exception as e:
@@ -223,7 +282,7 @@ def modify_position():
     """Position modifizieren"""
     try:
         # Request validieren
-        modify_data = ModifyRequest(**request.get_json())
+        modify_data = _modify_adapter.validate_json(request.get_data())
         
         # Trading Engine abrufen
         trading_engine = get_trading_engine()
@@ -258,6 +317,8 @@ def modify_position():
                 code=422
             ).dict()), 422
         
+    except ValidationError as e:
+        return _validation_error(e)
     except Exception as e:
         return handle_api_error(e, 400)
 
@@ -267,7 +328,7 @@ def close_position():
     """Position schließen"""
     try:
         # Request validieren
-        close_data = CloseRequest(**request.get_json())
+        close_data = _close_adapter.validate_json(request.get_data())
         
         # Trading Engine abrufen
         trading_engine = get_trading_engine()
@@ -300,11 +361,13 @@ def close_position():
                 code=422
             ).dict()), 422
         
+    except ValidationError as e:
+        return _validation_error(e)
     except Exception as e:
         return handle_api_error(e, 400)
 
 @api.route('/account', methods=['GET'])
-@require_auth
+@require_auth_readonly
 def get_account():
     """Kontoinformationen abrufen"""
     try:
@@ -341,13 +404,13 @@ def get_account():
             server_time=account_info.server_time
         )
         
-        return jsonify(response.dict()), 200
+        return _json_response(response.model_dump_json())
         
     except Exception as e:
         return handle_api_error(e, 500)
 
 @api.route('/symbols', methods=['GET'])
-@require_auth
+@require_auth_readonly
 def get_symbols():
     """Verfügbare Symbole abrufen"""
     try:
@@ -380,64 +443,75 @@ def get_symbols():
                 spread=symbol_info.spread,
                 is_trade_allowed=symbol_info.is_trade_allowed
             )
-            
-            return jsonify(response.dict()), 200
+
+            return _json_response(response.model_dump_json())
         else:
-            # Alle Symbole (vereinfacht - nur gecachte)
-            symbols = []
-            for symbol_name, symbol_info in mt5_client.symbols_cache.items():
-                symbols.append(SymbolInfo(
-                    name=symbol_info.name,
-                    digits=symbol_info.digits,
-                    point=symbol_info.point,
-                    tick_value=symbol_info.tick_value,
-                    contract_size=symbol_info.contract_size,
-                    margin_required=symbol_info.margin_required,
-                    spread=symbol_info.spread,
-                    is_trade_allowed=symbol_info.is_trade_allowed
-                ).dict())
-            
-            return jsonify({
-                "success": True,
-                "symbols": symbols,
-                "count": len(symbols)
-            }), 200
+            # Alle Symbole (vereinfacht - nur gecachte). Der fertige
+            # JSON-Blob wird memoized, bis sich der Cache-Bestand ändert.
+            cache_key = len(mt5_client.symbols_cache)
+            if _symbols_blob_cache['key'] != cache_key:
+                models = [
+                    SymbolInfo(
+                        name=symbol_info.name,
+                        digits=symbol_info.digits,
+                        point=symbol_info.point,
+                        tick_value=symbol_info.tick_value,
+                        contract_size=symbol_info.contract_size,
+                        margin_required=symbol_info.margin_required,
+                        spread=symbol_info.spread,
+                        is_trade_allowed=symbol_info.is_trade_allowed
+                    )
+                    for _expiry, symbol_info in mt5_client.symbols_cache.values()
+                ]
+                _symbols_blob_cache['payload'] = (
+                    b'{"success": true, "count": ' + str(len(models)).encode()
+                    + b', "symbols": ' + _symbol_list_adapter.dump_json(models) + b'}'
+                )
+                _symbols_blob_cache['key'] = cache_key
+
+            return _json_response(_symbols_blob_cache['payload'])
         
     except Exception as e:
         return handle_api_error(e, 500)
 
 @api.route('/health', methods=['GET'])
-@require_auth
+@require_auth_readonly
 def get_health():
     """System Health Check"""
     try:
-        # MT5 Client Status
-        mt5_client = get_mt5_client()
-        mt5_connected = mt5_client.is_connected if mt5_client else False
-        
+        # MT5 Client Status (gecacht vom Monitor-Thread; Fallback auf
+        # Direktabfrage, solange der Monitor noch nicht gelaufen ist)
+        mt5_connected = health_status['mt5_connected']
+        if mt5_connected is None:
+            mt5_client = get_mt5_client()
+            mt5_connected = mt5_client.is_connected if mt5_client else False
+
+        redis_status = health_status['redis']
+        if redis_status is None:
+            redis_status = "connected" if current_app.config.get('REDIS_URL') else "disconnected"
+
         # Lizenz Status
         license_manager = get_license_manager()
         license_status = "licensed" if license_manager and license_manager.is_licensed() else "unlicensed"
-        
+
         # Response erstellen
-        response = HealthResponse(
+        response = HealthResponse.model_construct(
+            **_HEALTH_TEMPLATE,
             status="healthy" if mt5_connected else "degraded",
             timestamp=datetime.utcnow(),
-            version="1.0.0",
-            database="connected",  # Vereinfacht
-            redis="connected" if current_app.config.get('REDIS_URL') else "disconnected",
+            redis=redis_status,
             mt5_connected=mt5_connected,
             license_status=license_status
         )
         
         status_code = 200 if mt5_connected else 503
-        return jsonify(response.dict()), status_code
+        return _json_response(response.model_dump_json(), status_code)
         
     except Exception as e:
         return handle_api_error(e, 500)
 
 @api.route('/metrics', methods=['GET'])
-@require_auth
+@require_auth_readonly
 def get_metrics():
     """System-Metriken abrufen"""
     try:
@@ -3,10 +3,11 @@ REST API Schemas für MT5 Flask Gateway
 Pydantic-Modelle für Request/Response-Validierung
 """
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from enum import Enum
+from uuid import uuid4
 
 class OrderSide(str, Enum):
     """Order-Seiten"""
@@ -49,16 +50,12 @@ class TradingSignalRequest(BaseModel):
     tp: TakeProfitConfig = Field(..., description="Take-Profit Konfiguration")
     price: Optional[float] = Field(None, gt=0, description="Limit-Preis")
     comment: str = Field("", max_length=100, description="Kommentar")
-    idempotency_key: str = Field("", min_length=1, max_length=100, description="Idempotency-Key")
+    # Default-Factory statt Validator: pydantic-core füllt den Default ohne
+    # Python-Roundtrip, und .hex spart die Bindestrich-Formatierung
+    idempotency_key: str = Field(default_factory=lambda: uuid4().hex,
+                                 min_length=1, max_length=100, description="Idempotency-Key")
     magic_number: int = Field(0, ge=0, le=999999, description="Magic Number")
 
-    @validator('idempotency_key')
-    def validate_idempotency_key(cls, v):
-        if not v:
-            import uuid
-            v = str(uuid.uuid4())
-        return v
-
 class OrderRequest(BaseModel):
     """Direkte Order-Request"""
     symbol: str = Field(..., min_length=3, max_length=20, description="Symbol")
@@ -82,8 +79,11 @@ class CloseRequest(BaseModel):
     ticket: int = Field(..., gt=0, description="Position-Ticket")
     volume: Optional[float] = Field(None, gt=0, description="Schließungs-Volumen")
 
+# Response-Modelle sind eingefroren: keine Mutations-Checks pro
+# Attribut-Zugriff, und kurzlebige Instanzen bleiben hashbar/teilbar
 class TradingSignalResponse(BaseModel):
     """Trading-Signal Response"""
+    model_config = ConfigDict(frozen=True, extra='forbid')
     ok: bool = Field(..., description="Erfolg")
     order_id: Optional[int] = Field(None, description="Order-ID")
     position_id: Optional[int] = Field(None, description="Position-ID")
@@ -96,6 +96,7 @@ class TradingSignalResponse(BaseModel):
 
 class PositionInfo(BaseModel):
     """Position-Informationen"""
+    model_config = ConfigDict(frozen=True, extra='forbid')
     ticket: int = Field(..., description="Ticket")
     symbol: str = Field(..., description="Symbol")
     type: str = Field(..., description="Typ")
@@ -112,6 +113,7 @@ class PositionInfo(BaseModel):
 
 class AccountInfo(BaseModel):
     """Konto-Informationen"""
+    model_config = ConfigDict(frozen=True, extra='forbid')
     login: int = Field(..., description="Login")
     server: str = Field(..., description="Server")
     balance: float = Field(..., description="Balance")
@@ -128,6 +130,7 @@ class AccountInfo(BaseModel):
 
 class SymbolInfo(BaseModel):
     """Symbol-Informationen"""
+    model_config = ConfigDict(frozen=True, extra='forbid')
     name: str = Field(..., description="Symbol-Name")
     digits: int = Field(..., description="Nachkommastellen")
     point: float = Field(..., description="Point-Wert")
@@ -139,6 +142,7 @@ class SymbolInfo(BaseModel):
 
 class HealthResponse(BaseModel):
     """Health Check Response"""
+    model_config = ConfigDict(frozen=True, extra='forbid')
     status: str = Field(..., description="Status")
     timestamp: datetime = Field(..., description="Zeitstempel")
     version: str = Field(..., description="Version")
@@ -149,12 +153,31 @@ class HealthResponse(BaseModel):
 
 class ErrorResponse(BaseModel):
     """Fehler-Response"""
+    model_config = ConfigDict(frozen=True, extra='forbid')
     error: str = Field(..., description="Fehlermeldung")
     code: Optional[int] = Field(None, description="Fehlercode")
     details: Optional[Dict[str, Any]] = Field(None, description="Zusätzliche Details")
 
 class SuccessResponse(BaseModel):
     """Erfolgs-Response"""
+    model_config = ConfigDict(frozen=True, extra='forbid')
     success: bool = Field(True, description="Erfolg")
     message: Optional[str] = Field(None, description="Nachricht")
     data: Optional[Dict[str, Any]] = Field(None, description="Daten")
+
+
+# Ein kompilierter TypeAdapter pro Inbound-Modell, einmal beim Import
+# gebaut und von den Routen mitbenutzt - die Validierung läuft direkt über
+# den Rust-Core statt über den __init__-Umweg pro Request
+from pydantic import TypeAdapter
+
+SIGNAL_ADAPTER = TypeAdapter(TradingSignalRequest)
+ORDER_ADAPTER = TypeAdapter(OrderRequest)
+MODIFY_ADAPTER = TypeAdapter(ModifyRequest)
+CLOSE_ADAPTER = TypeAdapter(CloseRequest)
+
+# Response-Modelle beim Import fertig bauen, damit nicht der erste Request
+# im Request-Thread die pydantic-core-Kompilierung bezahlt (P99-Warmup)
+for _model in (TradingSignalResponse, PositionInfo, AccountInfo, SymbolInfo,
+               HealthResponse, ErrorResponse, SuccessResponse):
+    _model.model_rebuild()
@@ -0,0 +1,151 @@
+"""
+App-Factory für MT5 Flask Gateway
+Baut die Flask-Anwendung samt Services, Blueprints und Health-Monitor
+"""
+
+def create_app(config_name=None):
+    """Erstellt und konfiguriert die Flask-Anwendung"""
+
+    # Schwere Imports erst hier, damit CLI-Pfade (--help, --init-db,
+    # --create-admin) nicht den vollen Import-Graphen bezahlen
+    from flask import Flask, g, request
+    from flask_cors import CORS
+    from werkzeug.middleware.proxy_fix import ProxyFix
+
+    from app.config import get_config
+    from app.security import init_security
+    from app.mt5 import init_mt5_client
+    from app.mt5.trading import init_trading_engine
+    from app.mt5.account import init_account_manager
+    from app.services.licensing import init_license_manager
+    from app.services.telemetry import init_telemetry_service
+    from app.services.settings import init_settings_manager
+    from app.services.logging import init_logging_service
+    from app.services.stripe import init_stripe_service
+    from app.api.routes import api
+    from app.api.errors import register_error_handlers
+    from app.ui.routes import ui
+
+    # Konfiguration laden
+    config = get_config(config_name)
+    
+    # Flask-App erstellen
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    # X-Forwarded-For einmal in der WSGI-Schicht auflösen (ProxyFix setzt
+    # remote_addr auf die echte Client-IP) und pro Request in g cachen -
+    # Auth, Rate Limiting und Audit-Log lesen dann nur noch g.client_ip
+    # statt jeweils selbst den Header zu parsen
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+
+    @app.before_request
+    def _cache_client_ip() -> None:
+        g.client_ip = request.remote_addr
+
+    # orjson als JSON-Provider verwenden, falls verfügbar (serialisiert
+    # direkt nach Bytes, deutlich schneller als stdlib json)
+    try:
+        import orjson
+        from flask.json.provider import JSONProvider
+
+        class OrjsonProvider(JSONProvider):
+            def dumps(self, obj, **kwargs):
+                return orjson.dumps(obj, default=str).decode('utf-8')
+
+            def loads(self, s, **kwargs):
+                return orjson.loads(s)
+
+        app.json = OrjsonProvider(app)
+    except ImportError:
+        pass
+    
+    # CORS aktivieren: Origins einmal vorberechnen statt pro Request zu
+    # splitten, nur auf die API-Routen scopen und Preflight-Antworten vom
+    # Browser einen Tag cachen lassen
+    allowed_origins = frozenset(
+        origin.strip() for origin in config.ALLOWED_IPS.split(',') if origin.strip()
+    )
+    CORS(
+        app,
+        resources={r"/api/v1/*": {"origins": list(allowed_origins)}},
+        send_wildcard=False,
+        max_age=86400
+    )
+    
+    # Services initialisieren
+    init_logging_service(config)
+    init_security(config, None)  # Redis optional
+    init_settings_manager(config)
+    init_license_manager(config)
+    init_telemetry_service(config)
+    init_stripe_service(config)
+    
+    # MT5-Services initialisieren
+    init_mt5_client(config)
+    init_trading_engine(config, None)  # MT5 Client wird später verknüpft
+    init_account_manager(None)  # MT5 Client wird später verknüpft
+
+    # Services einmal an die App binden: Routen lesen
+    # current_app.extensions['mt5_services'] statt pro Request mehrere
+    # get_*-Modul-Lookups (Funktionsaufruf + None-Check) aufzulösen
+    from types import SimpleNamespace
+    from app.services.licensing import get_license_manager
+    from app.services.settings import get_settings_manager
+    from app.services.logging import get_logging_service
+    from app.mt5 import get_mt5_client
+    app.extensions['mt5_services'] = SimpleNamespace(
+        settings=get_settings_manager(),
+        license=get_license_manager(),
+        logging=get_logging_service(),
+        mt5=get_mt5_client(),
+    )
+
+
+    # Error Handler registrieren
+    register_error_handlers(app)
+    
+    # Blueprints registrieren
+    app.register_blueprint(api)
+    app.register_blueprint(ui)
+    
+    # MT5-Verbindung initialisieren (falls konfiguriert)
+    try:
+        mt5_client = get_mt5_client()
+        if mt5_client and config.MT5_SERVER and config.MT5_LOGIN:
+            app.logger.info("Initialisiere MT5-Verbindung...")
+            if mt5_client.initialize():
+                app.logger.info("MT5-Verbindung erfolgreich hergestellt")
+            else:
+                app.logger.warning("MT5-Verbindung fehlgeschlagen - Mock-Modus aktiv")
+    except Exception as e:
+        app.logger.error(f"Fehler bei MT5-Initialisierung: {e}")
+
+    # Health-Monitor starten: Backend-Probes laufen im Hintergrund statt
+    # pro /health-Request im Request-Thread
+    _start_health_monitor(app)
+
+    return app
+
+def _start_health_monitor(app, interval: int = 5) -> None:
+    """Startet einen Daemon-Thread, der den Backend-Status periodisch
+    aktualisiert; die Health-Handler lesen nur noch gecachte Werte"""
+    import threading
+    import time
+
+    from app.mt5 import get_mt5_client
+    from app.api.routes import health_status
+
+    redis_configured = bool(app.config.get('REDIS_URL'))
+
+    def _monitor() -> None:
+        while True:
+            try:
+                mt5_client = get_mt5_client()
+                health_status['mt5_connected'] = bool(mt5_client and mt5_client.is_connected)
+                health_status['redis'] = 'connected' if redis_configured else 'disconnected'
+            except Exception:
+                pass  # Monitor darf nie sterben
+            time.sleep(interval)
+
+    threading.Thread(target=_monitor, name='health-monitor', daemon=True).start()
@@ -3,15 +3,16 @@ MetaTrader 5 Client für MT5 Flask Gateway
 Verbindungsmanagement, Heartbeat und Symbol-Pflege
 """
 
-import MetaTrader5 as mt5
 import time
 import logging
-from datetime import datetime, timedelta
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List, Tuple
 from dataclasses import dataclass
 from app.config import Config
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MT5ConnectionInfo:
     """MT5 Verbindungsinformationen"""
     server: str
@@ -20,7 +21,7 @@ class MT5ConnectionInfo:
     path: str
     timeout: int = 10000
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SymbolInfo:
     """Symbol-Informationen"""
     name: str
@@ -32,12 +33,19 @@ class SymbolInfo:
     spread: int
     is_trade_allowed: bool
 
+# Obergrenze für den Symbol-Cache (LRU-Verdrängung)
+_SYMBOL_CACHE_MAX = 512
+
 class MT5Client:
     """MetaTrader 5 Client"""
     
     def __init__(self, config: Config):
         self.config = config
         self.logger = logging.getLogger(__name__)
+        # MetaTrader5 (DLL-Load, nur Windows) wird erst beim tatsächlichen
+        # Verbindungsaufbau importiert - Tests und Nicht-MT5-Pfade starten
+        # ohne die DLL; Mocks können _mt5 direkt ersetzen
+        self._mt5 = None
         self.connection_info = MT5ConnectionInfo(
             server=config.MT5_SERVER,
             login=int(config.MT5_LOGIN),
@@ -45,13 +53,46 @@ class MT5Client:
             path=config.MT5_PATH
         )
         self.is_connected = False
-        self.last_heartbeat = None
-        self.symbols_cache: Dict[str, SymbolInfo] = {}
-        self.account_info = None
+        # Epoch-Float statt datetime-Objekt: der Heartbeat laeuft haeufig,
+        # formatiert wird erst an der JSON-Grenze
+        self.last_heartbeat_epoch: Optional[float] = None
+        # Cache-Eintrag ist ein schlankes (Ablauf-Monotonic, Info)-Tupel;
+        # ein Float-Vergleich pro Hit statt datetime-Arithmetik. Als LRU
+        # begrenzt, damit Scanner-Strategien auf Brokern mit 10k+ Symbolen
+        # den Speicher nicht unbegrenzt wachsen lassen.
+        self.symbols_cache: 'OrderedDict[str, Tuple[float, SymbolInfo]]' = OrderedDict()
+        # Konto-Snapshot mit 1-Sekunden-TTL: bursty Aufrufer (z. B.
+        # /account und /metrics kurz hintereinander) teilen sich eine
+        # MT5-IPC-Antwort statt jeweils eine eigene auszuloesen
+        self._account_snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_mono: float = 0.0
+        # (monotonic, Server-Epoch) aus dem letzten Heartbeat; daraus wird
+        # die Server-Zeit extrapoliert statt per Tick-Abfrage geholt
+        self._server_time_base: Optional[Tuple[float, float]] = None
+        # Letzte Epoch->datetime-Konvertierung; aufeinanderfolgende
+        # Heartbeats liefern oft denselben Sekundenstempel
+        self._last_server_ts: float = 0.0
+        self._last_server_dt: Optional[datetime] = None
+        # Bereits abonnierte Symbole - erspart den IPC-Roundtrip pro
+        # Signal; wird bei Initialisierung/Shutdown geleert
+        self._subscribed: set = set()
+
+    def _to_server_dt(self, ts: float) -> datetime:
+        """Konvertiert einen Server-Epoch-Wert nach UTC (tz-bewusst statt
+        lokaler Zeit des Gateways; der letzte Wert wird gecacht)"""
+        if self._last_server_dt is None or ts != self._last_server_ts:
+            self._last_server_dt = datetime.fromtimestamp(ts, tz=timezone.utc)
+            self._last_server_ts = ts
+        return self._last_server_dt
         
     def initialize(self) -> bool:
         """Initialisiert MT5-Verbindung"""
         try:
+            if self._mt5 is None:
+                import MetaTrader5
+                self._mt5 = MetaTrader5
+            mt5 = self._mt5
+
             # MT5 initialisieren
             if not mt5.initialize(path=self.connection_info.path, 
                                  timeout=self.connection_info.timeout):
@@ -72,9 +113,9 @@ class MT5Client:
                 return False
             
             self.is_connected = True
-            self.last_heartbeat = datetime.utcnow()
-            self.account_info = account_info
-            
+            self.last_heartbeat_epoch = time.time()
+            self._subscribed.clear()
+
             self.logger.info(f"MT5 erfolgreich verbunden: {account_info.login} @ {account_info.server}")
             return True
             
@@ -85,29 +126,54 @@ class MT5Client:
     def shutdown(self) -> None:
         """Beendet MT5-Verbindung"""
         try:
-            mt5.shutdown()
+            if self._mt5 is None:
+                return
+            self._mt5.shutdown()
             self.is_connected = False
+            self._subscribed.clear()
             self.logger.info("MT5-Verbindung beendet")
         except Exception as e:
             self.logger.error(f"Fehler beim Beenden der MT5-Verbindung: {e}")
     
     def heartbeat(self) -> bool:
-        """Prüft Verbindungsstatus"""
+        """Prüft Verbindungsstatus und pflegt den Konto-Snapshot"""
         try:
             if not self.is_connected:
                 return False
-            
+
+            # Innerhalb der TTL keinen neuen IPC-Roundtrip ausloesen
+            now = time.monotonic()
+            if self._account_snapshot is not None and now - self._snapshot_mono < 1.0:
+                return True
+
             # Account-Info abrufen
-            account_info = mt5.account_info()
+            account_info = self._mt5.account_info()
             if account_info is None:
                 self.logger.warning("MT5 Heartbeat fehlgeschlagen - Verbindung verloren")
                 self.is_connected = False
                 return False
-            
-            self.last_heartbeat = datetime.utcnow()
-            self.account_info = account_info
+
+            self.last_heartbeat_epoch = time.time()
+            # Snapshot einmal bauen; get_account_info gibt ihn direkt zurück
+            self._account_snapshot = {
+                'login': account_info.login,
+                'server': account_info.server,
+                'balance': account_info.balance,
+                'equity': account_info.equity,
+                'margin': account_info.margin,
+                'free_margin': account_info.margin_free,
+                'margin_level': account_info.margin_level,
+                'currency': account_info.currency,
+                'leverage': account_info.leverage,
+                'profit': account_info.profit,
+                'company': account_info.company,
+                'name': account_info.name,
+                'server_time': self._to_server_dt(account_info.server_time)
+            }
+            self._snapshot_mono = now
+            self._server_time_base = (now, float(account_info.server_time))
             return True
-            
+
         except Exception as e:
             self.logger.error(f"MT5 Heartbeat Fehler: {e}")
             self.is_connected = False
@@ -126,14 +192,19 @@ class MT5Client:
     def get_symbol_info(self, symbol: str) -> Optional[SymbolInfo]:
         """Ruft Symbol-Informationen ab"""
         try:
-            # Cache prüfen
-            if symbol in self.symbols_cache:
-                cached_info = self.symbols_cache[symbol]
-                # Cache für 5 Minuten gültig
-                if datetime.utcnow() - cached_info.get('timestamp', datetime.min) < timedelta(minutes=5):
-                    return cached_info['info']
-            
+            # Cache prüfen (5 Minuten gültig)
+            now = time.monotonic()
+            entry = self.symbols_cache.get(symbol)
+            if entry is not None and entry[0] > now:
+                self.symbols_cache.move_to_end(symbol)
+                return entry[1]
+
             # Symbol-Info von MT5 abrufen
+            mt5 = self._mt5
+            if mt5 is None:
+                self.logger.error("MT5 nicht initialisiert")
+                return None
+
             symbol_info = mt5.symbol_info(symbol)
             if symbol_info is None:
                 self.logger.error(f"Symbol {symbol} nicht gefunden")
@@ -152,24 +223,37 @@ class MT5Client:
             )
             
             # Cache aktualisieren
-            self.symbols_cache[symbol] = {
-                'info': info,
-                'timestamp': datetime.utcnow()
-            }
-            
+            self.cache_symbol(symbol, info, now=now)
+
             return info
             
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Symbol-Info für {symbol}: {e}")
             return None
     
+    def cache_symbol(self, symbol: str, info: SymbolInfo,
+                     now: Optional[float] = None) -> None:
+        """Legt einen Symbol-Eintrag im LRU-Cache ab (verdrängt bei
+        Erreichen der Kappe den am längsten unbenutzten Eintrag)"""
+        if now is None:
+            now = time.monotonic()
+        if len(self.symbols_cache) >= _SYMBOL_CACHE_MAX:
+            self.symbols_cache.popitem(last=False)
+        self.symbols_cache[symbol] = (now + 300.0, info)
+        self.symbols_cache.move_to_end(symbol)
+
     def subscribe_symbol(self, symbol: str) -> bool:
-        """Abonniert Symbol für Preis-Updates"""
+        """Abonniert Symbol für Preis-Updates (bereits abonnierte Symbole
+        werden ohne IPC-Roundtrip bestätigt)"""
         try:
-            if not mt5.symbol_select(symbol, True):
+            if symbol in self._subscribed:
+                return True
+
+            if self._mt5 is None or not self._mt5.symbol_select(symbol, True):
                 self.logger.error(f"Symbol {symbol} konnte nicht abonniert werden")
                 return False
-            
+
+            self._subscribed.add(symbol)
             self.logger.info(f"Symbol {symbol} erfolgreich abonniert")
             return True
             
@@ -178,44 +262,30 @@ class MT5Client:
             return False
     
     def get_account_info(self) -> Optional[Dict[str, Any]]:
-        """Ruft Kontoinformationen ab"""
+        """Ruft Kontoinformationen ab (Snapshot aus dem Heartbeat, kein
+        zweiter IPC-Roundtrip und kein Dict-Neubau pro Aufruf)"""
         try:
             if not self.heartbeat():
                 return None
-            
-            account = self.account_info
-            if account is None:
-                return None
-            
-            return {
-                'login': account.login,
-                'server': account.server,
-                'balance': account.balance,
-                'equity': account.equity,
-                'margin': account.margin,
-                'free_margin': account.margin_free,
-                'margin_level': account.margin_level,
-                'currency': account.currency,
-                'leverage': account.leverage,
-                'profit': account.profit,
-                'company': account.company,
-                'name': account.name,
-                'server_time': datetime.fromtimestamp(account.server_time)
-            }
-            
+
+            return self._account_snapshot
+
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Kontoinformationen: {e}")
             return None
     
     def get_server_time(self) -> Optional[datetime]:
-        """Ruft Server-Zeit ab"""
+        """Ruft Server-Zeit ab (extrapoliert aus dem letzten Heartbeat -
+        kein IPC-Roundtrip und keine Abhängigkeit von einem fest
+        abonnierten Symbol)"""
         try:
-            time_info = mt5.symbol_info_tick("EURUSD")  # Beliebiges Symbol für Zeit
-            if time_info is None:
+            if self._server_time_base is None and not self.heartbeat():
                 return None
-            
-            return datetime.fromtimestamp(time_info.time)
-            
+
+            base_mono, base_epoch = self._server_time_base
+            return datetime.fromtimestamp(base_epoch + (time.monotonic() - base_mono),
+                                          tz=timezone.utc)
+
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Server-Zeit: {e}")
             return None
@@ -224,19 +294,26 @@ class MT5Client:
         """Gibt Verbindungsstatus zurück"""
         return {
             'is_connected': self.is_connected,
-            'last_heartbeat': self.last_heartbeat.isoformat() if self.last_heartbeat else None,
+            'last_heartbeat': (datetime.fromtimestamp(self.last_heartbeat_epoch, tz=timezone.utc).isoformat()
+                               if self.last_heartbeat_epoch else None),
             'server': self.connection_info.server,
             'login': self.connection_info.login,
             'account_info': self.get_account_info()
         }
 
-# Globale MT5 Client Instanz
+# Globale MT5 Client Instanz. Double-checked Locking: der Getter bleibt
+# ein lockfreier Pointer-Read, nur die Erstinitialisierung nimmt den Lock.
 mt5_client: Optional[MT5Client] = None
+_init_lock = threading.Lock()
 
 def init_mt5_client(config: Config) -> None:
-    """Initialisiert den MT5 Client"""
+    """Initialisiert den MT5 Client (thread-sicher, einmalig)"""
     global mt5_client
-    mt5_client = MT5Client(config)
+    if mt5_client is not None:
+        return
+    with _init_lock:
+        if mt5_client is None:
+            mt5_client = MT5Client(config)
 
 def get_mt5_client() -> Optional[MT5Client]:
     """Gibt den MT5 Client zurück"""
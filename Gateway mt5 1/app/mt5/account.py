@@ -3,14 +3,19 @@ MetaTrader 5 Account Management für MT5 Flask Gateway
 Kontoinformationen, Margin und Risikomanagement
 """
 
-import MetaTrader5 as mt5
+import json
 import logging
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+import threading
+import time
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, List
 from dataclasses import dataclass
-from app.mt5 import MT5Client
+from app.mt5 import MT5Client, SymbolInfo
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class AccountSummary:
     """Konto-Zusammenfassung"""
     login: int
@@ -27,7 +32,7 @@ class AccountSummary:
     name: str
     server_time: datetime
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MarginInfo:
     """Margin-Informationen"""
     symbol: str
@@ -36,12 +41,46 @@ class MarginInfo:
     margin_currency: str
     margin_rate: float
 
+# Ablage für abgeschlossene History-Tage: eine JSON-Datei pro
+# (Login, UTC-Tag). Vergangene Tage sind unveränderlich, nur der
+# laufende Tag muss noch bei MT5 abgefragt werden.
+_HISTORY_CACHE_DIR = Path('cache/history')
+
+class PositionTable:
+    """Spaltenweise (SoA) gehaltene Positionsdaten für vektorisierte
+    Aggregationen - eine ndarray-Spalte pro Feld statt ein Python-Objekt
+    mit ~14 Attributen pro Position"""
+
+    __slots__ = ('ticket', 'volume', 'price_open', 'price_current',
+                 'sl', 'tp', 'profit', 'swap', 'symbol')
+
+    def __init__(self, raw: tuple):
+        n = len(raw)
+        self.ticket = np.fromiter((p.ticket for p in raw), dtype=np.int64, count=n)
+        self.volume = np.fromiter((p.volume for p in raw), dtype=np.float64, count=n)
+        self.price_open = np.fromiter((p.price_open for p in raw), dtype=np.float64, count=n)
+        self.price_current = np.fromiter((p.price_current for p in raw), dtype=np.float64, count=n)
+        self.sl = np.fromiter((p.sl for p in raw), dtype=np.float64, count=n)
+        self.tp = np.fromiter((p.tp for p in raw), dtype=np.float64, count=n)
+        self.profit = np.fromiter((p.profit for p in raw), dtype=np.float64, count=n)
+        self.swap = np.fromiter((p.swap for p in raw), dtype=np.float64, count=n)
+        self.symbol = [p.symbol for p in raw]
+
+    def __len__(self) -> int:
+        return len(self.ticket)
+
 class AccountManager:
     """MetaTrader 5 Account Manager"""
     
     def __init__(self, mt5_client: MT5Client):
         self.mt5_client = mt5_client
         self.logger = logging.getLogger(__name__)
+
+    @property
+    def _mt5(self):
+        """MetaTrader5-Modul des injizierten Clients (lazy geladen,
+        von Tests durch ein Fake-Objekt ersetzbar)"""
+        return self.mt5_client._mt5 if self.mt5_client else None
     
     def get_account_summary(self) -> Optional[AccountSummary]:
         """Ruft Konto-Zusammenfassung ab"""
@@ -49,23 +88,10 @@ class AccountManager:
             account_info = self.mt5_client.get_account_info()
             if not account_info:
                 return None
-            
-            return AccountSummary(
-                login=account_info['login'],
-                server=account_info['server'],
-                balance=account_info['balance'],
-                equity=account_info['equity'],
-                margin=account_info['margin'],
-                free_margin=account_info['free_margin'],
-                margin_level=account_info['margin_level'],
-                currency=account_info['currency'],
-                leverage=account_info['leverage'],
-                profit=account_info['profit'],
-                company=account_info['company'],
-                name=account_info['name'],
-                server_time=account_info['server_time']
-            )
-            
+
+            # Snapshot-Keys entsprechen 1:1 den Dataclass-Feldern
+            return AccountSummary(**account_info)
+
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Konto-Zusammenfassung: {e}")
             return None
@@ -73,7 +99,7 @@ class AccountManager:
     def get_margin_info(self, symbol: str) -> Optional[MarginInfo]:
         """Ruft Margin-Informationen für Symbol ab"""
         try:
-            symbol_info = mt5.symbol_info(symbol)
+            symbol_info = self._mt5.symbol_info(symbol)
             if not symbol_info:
                 return None
             
@@ -93,35 +119,109 @@ class AccountManager:
                                  price: float) -> Optional[float]:
         """Berechnet erforderliche Margin"""
         try:
-            margin_info = self.get_margin_info(symbol)
-            if not margin_info:
+            # Eine IPC-Abfrage; alle benötigten Felder kommen aus demselben
+            # Named-Tuple statt aus drei separaten symbol_info-Aufrufen
+            symbol_info = self._mt5.symbol_info(symbol)
+            if not symbol_info:
                 return None
-            
+
             # Margin basierend auf Margin-Modus berechnen
-            if margin_info.margin_mode == mt5.SYMBOL_CALC_MODE_FOREX:
+            if symbol_info.margin_mode == self._mt5.SYMBOL_CALC_MODE_FOREX:
                 # Forex: Margin = Contract Size * Volume / Leverage
                 account_info = self.get_account_summary()
                 if not account_info:
                     return None
-                
-                leverage = account_info.leverage
-                contract_size = mt5.symbol_info(symbol).trade_contract_size
-                margin = (contract_size * volume) / leverage
-                
-            elif margin_info.margin_mode == mt5.SYMBOL_CALC_MODE_FUTURES:
+
+                margin = (symbol_info.trade_contract_size * volume) / account_info.leverage
+
+            elif symbol_info.margin_mode == self._mt5.SYMBOL_CALC_MODE_FUTURES:
                 # Futures: Margin = Contract Size * Volume * Margin Rate
-                contract_size = mt5.symbol_info(symbol).trade_contract_size
-                margin = contract_size * volume * margin_info.margin_rate
-                
+                margin = symbol_info.trade_contract_size * volume * symbol_info.margin_rate
+
             else:
                 # Andere Modi: Vereinfachte Berechnung
-                margin = margin_info.margin_required * volume
-            
+                margin = symbol_info.margin_required * volume
+
             return margin
-            
+
         except Exception as e:
             self.logger.error(f"Fehler bei Margin-Berechnung für {symbol}: {e}")
             return None
+
+    def calculate_margin_batch(self, symbols: List[str],
+                               volumes: List[float]) -> Optional[np.ndarray]:
+        """Berechnet Margins für viele Symbol/Volumen-Paare vektorisiert:
+        eine symbols_get-Abfrage, SoA-Arrays und np.select statt N
+        interpreter-gebundener Einzelberechnungen"""
+        try:
+            if len(symbols) != len(volumes) or not symbols:
+                return None
+
+            infos = self._mt5.symbols_get(group=','.join(symbols))
+            if not infos:
+                return None
+
+            by_name = {info.name: info for info in infos}
+            ordered = [by_name.get(s) for s in symbols]
+            if any(info is None for info in ordered):
+                return None
+
+            n = len(ordered)
+            contract_size = np.fromiter((i.trade_contract_size for i in ordered), dtype=np.float64, count=n)
+            margin_rate = np.fromiter((i.margin_rate for i in ordered), dtype=np.float64, count=n)
+            margin_required = np.fromiter((i.margin_required for i in ordered), dtype=np.float64, count=n)
+            mode = np.fromiter((i.margin_mode for i in ordered), dtype=np.int64, count=n)
+            volume = np.asarray(volumes, dtype=np.float64)
+
+            account_summary = self.get_account_summary()
+            leverage = float(account_summary.leverage) if account_summary else 1.0
+
+            return np.select(
+                [mode == self._mt5.SYMBOL_CALC_MODE_FOREX,
+                 mode == self._mt5.SYMBOL_CALC_MODE_FUTURES],
+                [contract_size * volume / leverage,
+                 contract_size * volume * margin_rate],
+                default=margin_required * volume
+            )
+
+        except Exception as e:
+            self.logger.error(f"Fehler bei Batch-Margin-Berechnung: {e}")
+            return None
+
+    def prefetch_symbols(self, symbols: Iterable[str]) -> int:
+        """Lädt Metadaten mehrerer Symbole mit einer einzigen
+        symbols_get-Abfrage vor und füllt den Symbol-Cache des Clients
+        (N IPC-Roundtrips -> 1 für Bulk-Flows wie das Risiko-Dashboard)"""
+        try:
+            names = [s for s in symbols if s]
+            if not names:
+                return 0
+
+            infos = self._mt5.symbols_get(group=','.join(names))
+            if not infos:
+                return 0
+
+            now = time.monotonic()
+            count = 0
+            for raw in infos:
+                info = SymbolInfo(
+                    name=raw.name,
+                    digits=raw.digits,
+                    point=raw.point,
+                    tick_value=raw.trade_tick_value,
+                    contract_size=raw.trade_contract_size,
+                    margin_required=raw.margin_required,
+                    spread=raw.spread,
+                    is_trade_allowed=raw.trade_mode & self._mt5.SYMBOL_TRADE_MODE_FULL
+                )
+                self.mt5_client.cache_symbol(raw.name, info, now=now)
+                count += 1
+
+            return count
+
+        except Exception as e:
+            self.logger.error(f"Fehler beim Vorladen der Symbole: {e}")
+            return 0
     
     def check_margin_sufficient(self, symbol: str, volume: float, 
                                price: float) -> bool:
@@ -173,42 +273,133 @@ class AccountManager:
                 warnings.append("Niedrige freie Margin")
             
             risk_metrics['warnings'] = warnings
-            
+
+            # Offene Positionen vektorisiert aggregieren (np.sum über
+            # Spalten statt Python-Schleife über Positionsobjekte)
+            raw_positions = self._mt5.positions_get()
+            if raw_positions:
+                table = PositionTable(raw_positions)
+                risk_metrics['open_positions'] = len(table)
+                risk_metrics['floating_profit'] = float(table.profit.sum() + table.swap.sum())
+                risk_metrics['open_volume'] = float(table.volume.sum())
+            else:
+                risk_metrics['open_positions'] = 0
+                risk_metrics['floating_profit'] = 0.0
+                risk_metrics['open_volume'] = 0.0
+
             return risk_metrics
             
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Risiko-Metriken: {e}")
             return None
     
-    def get_trading_history(self, days: int = 30) -> List[Dict[str, Any]]:
-        """Ruft Trading-Historie ab"""
+    def _fetch_deals(self, from_epoch: int, to_epoch: int) -> List[Dict[str, Any]]:
+        """Holt Deals für ein Epoch-Fenster und konvertiert sie
+        spaltenweise in C-Schleifen statt pro Deal durch den Interpreter.
+        Zeitstempel bleiben Epoch-Ints; formatiert wird erst an der
+        JSON-Grenze (kein datetime-Objekt pro Zeile)."""
+        deals = self._mt5.history_deals_get(
+            datetime.fromtimestamp(from_epoch, tz=timezone.utc),
+            datetime.fromtimestamp(to_epoch, tz=timezone.utc))
+        if not deals:
+            return []
+
+        n = len(deals)
+        times = np.fromiter((d.time for d in deals), dtype=np.int64, count=n)
+        types = np.where(
+            np.fromiter((d.type for d in deals), dtype=np.int64, count=n)
+            == self._mt5.DEAL_TYPE_BUY, 'buy', 'sell')
+        dts = times.tolist()
+
+        return [{
+            'ticket': deals[i].ticket,
+            'order': deals[i].order,
+            'symbol': deals[i].symbol,
+            'type': str(types[i]),
+            'volume': deals[i].volume,
+            'price': deals[i].price,
+            'profit': deals[i].profit,
+            'swap': deals[i].swap,
+            'commission': deals[i].commission,
+            'comment': deals[i].comment,
+            'magic': deals[i].magic,
+            'time': dts[i]
+        } for i in range(n)]
+
+    def _history_cache_path(self, login: int, day: int) -> Path:
+        return _HISTORY_CACHE_DIR / f"deals_{login}_{day}.json"
+
+    def _read_history_cache(self, login: int, day: int) -> Optional[List[Dict[str, Any]]]:
+        """Liest einen gecachten Tag; None bei Cache-Miss oder Defekt"""
         try:
-            from_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            from_date = from_date.replace(day=from_date.day - days)
-            
-            deals = mt5.history_deals_get(from_date, datetime.now())
-            if deals is None:
-                return []
-            
-            history = []
-            for deal in deals:
-                history.append({
-                    'ticket': deal.ticket,
-                    'order': deal.order,
-                    'symbol': deal.symbol,
-                    'type': 'buy' if deal.type == mt5.DEAL_TYPE_BUY else 'sell',
-                    'volume': deal.volume,
-                    'price': deal.price,
-                    'profit': deal.profit,
-                    'swap': deal.swap,
-                    'commission': deal.commission,
-                    'comment': deal.comment,
-                    'magic': deal.magic,
-                    'time': datetime.fromtimestamp(deal.time)
-                })
-            
-            return sorted(history, key=lambda x: x['time'], reverse=True)
-            
+            with open(self._history_cache_path(login, day), 'r', encoding='utf-8') as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return None
+
+    def _write_history_cache(self, login: int, day: int,
+                             rows: List[Dict[str, Any]]) -> None:
+        """Persistiert einen abgeschlossenen Tag (best effort)"""
+        try:
+            _HISTORY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            with open(self._history_cache_path(login, day), 'w', encoding='utf-8') as fh:
+                json.dump(rows, fh)
+        except OSError as e:
+            self.logger.warning(f"History-Cache nicht schreibbar: {e}")
+
+    def get_trading_history(self, days: int = 30,
+                            only_cache: bool = False) -> List[Dict[str, Any]]:
+        """Ruft Trading-Historie ab. Abgeschlossene UTC-Tage sind
+        unveränderlich und liegen als Platten-Cache pro (Login, Tag);
+        nach Warmup wird bei MT5 nur noch der laufende Tag abgefragt.
+        only_cache liefert ausschließlich gecachte Tage ohne IPC."""
+        try:
+            now = int(time.time())
+            today = now // 86400
+            first_day = today - days
+            login = self.mt5_client.connection_info.login
+
+            cached: Dict[int, List[Dict[str, Any]]] = {}
+            first_missing: Optional[int] = None
+            for day in range(first_day, today):
+                rows = self._read_history_cache(login, day)
+                if rows is not None:
+                    cached[day] = rows
+                elif first_missing is None:
+                    first_missing = day
+
+            history: List[Dict[str, Any]] = []
+            if only_cache:
+                for day in range(first_day, today):
+                    history.extend(cached.get(day, ()))
+                self.logger.info(
+                    f"Trading-Historie aus Cache: {len(history)} Deals, "
+                    f"{len(cached)}/{days} Tage vorhanden")
+            else:
+                # Ein Roundtrip ab dem ersten fehlenden Tag (sonst nur
+                # der laufende Tag); abgeschlossene Tage daraus werden
+                # gleich persistiert
+                fetch_from = (first_missing if first_missing is not None
+                              else today) * 86400
+                fetched = self._fetch_deals(fetch_from, now)
+
+                by_day: Dict[int, List[Dict[str, Any]]] = {}
+                for row in fetched:
+                    by_day.setdefault(row['time'] // 86400, []).append(row)
+                for day, rows in by_day.items():
+                    if day < today:
+                        self._write_history_cache(login, day, rows)
+
+                for day in range(first_day, today):
+                    if day * 86400 >= fetch_from:
+                        history.extend(by_day.get(day, ()))
+                    else:
+                        history.extend(cached.get(day, ()))
+                history.extend(by_day.get(today, ()))
+
+            history.sort(key=itemgetter('time'), reverse=True)
+            return history
+
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Trading-Historie: {e}")
             return []
@@ -216,44 +407,56 @@ class AccountManager:
     def get_order_history(self, days: int = 30) -> List[Dict[str, Any]]:
         """Ruft Order-Historie ab"""
         try:
-            from_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            from_date = from_date.replace(day=from_date.day - days)
-            
-            orders = mt5.history_orders_get(from_date, datetime.now())
-            if orders is None:
+            from_date = (datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                         - timedelta(days=days))
+
+            orders = self._mt5.history_orders_get(from_date, datetime.now())
+            if not orders:
                 return []
-            
-            history = []
-            for order in orders:
-                history.append({
-                    'ticket': order.ticket,
-                    'symbol': order.symbol,
-                    'type': 'buy' if order.type == mt5.ORDER_TYPE_BUY else 'sell',
-                    'volume': order.volume,
-                    'price_open': order.price_open,
-                    'price_current': order.price_current,
-                    'sl': order.sl,
-                    'tp': order.tp,
-                    'state': order.state,
-                    'comment': order.comment,
-                    'magic': order.magic,
-                    'time_setup': datetime.fromtimestamp(order.time_setup),
-                    'time_done': datetime.fromtimestamp(order.time_done) if order.time_done > 0 else None
-                })
-            
-            return sorted(history, key=lambda x: x['time_setup'], reverse=True)
+
+            # Gleiche SoA-Konvertierung wie in get_trading_history
+            n = len(orders)
+            setup_ts = np.fromiter((o.time_setup for o in orders), dtype=np.int64, count=n)
+            done_ts = np.fromiter((o.time_done for o in orders), dtype=np.int64, count=n)
+            types = np.where(
+                np.fromiter((o.type for o in orders), dtype=np.int64, count=n)
+                == self._mt5.ORDER_TYPE_BUY, 'buy', 'sell')
+            setup_dt = setup_ts.tolist()
+            done_dt = done_ts.tolist()
+            idx = np.argsort(setup_ts)[::-1]
+
+            return [{
+                'ticket': orders[i].ticket,
+                'symbol': orders[i].symbol,
+                'type': types[i],
+                'volume': orders[i].volume,
+                'price_open': orders[i].price_open,
+                'price_current': orders[i].price_current,
+                'sl': orders[i].sl,
+                'tp': orders[i].tp,
+                'state': orders[i].state,
+                'comment': orders[i].comment,
+                'magic': orders[i].magic,
+                'time_setup': setup_dt[i],
+                'time_done': done_dt[i] if done_ts[i] > 0 else None
+            } for i in idx]
             
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Order-Historie: {e}")
             return []
 
-# Globale Account Manager Instanz
+# Globale Account Manager Instanz (Double-checked Locking, siehe app.mt5)
 account_manager: Optional[AccountManager] = None
+_init_lock = threading.Lock()
 
 def init_account_manager(mt5_client: MT5Client) -> None:
-    """Initialisiert den Account Manager"""
+    """Initialisiert den Account Manager (thread-sicher, einmalig)"""
     global account_manager
-    account_manager = AccountManager(mt5_client)
+    if account_manager is not None:
+        return
+    with _init_lock:
+        if account_manager is None:
+            account_manager = AccountManager(mt5_client)
 
 def get_account_manager() -> Optional[AccountManager]:
     """Gibt den Account Manager zurück"""
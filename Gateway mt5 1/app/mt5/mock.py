@@ -3,15 +3,19 @@ Mock-Backend für MT5 Flask Gateway
 Simuliert MT5-Funktionalität für Tests und Entwicklung
 """
 
+import hashlib
 import random
+import sys
 import time
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime, timezone
+from types import MappingProxyType
 from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from app.mt5 import SymbolInfo
-from app.mt5.trading import OrderResult, TradingSignal, OrderSide, OrderType
+from app.mt5.trading import OrderResult, TradingSignal, OrderSide, OrderType, ErrorCode
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class MockAccountInfo:
     """Mock Konto-Informationen"""
     login: int = 1234567
@@ -27,7 +31,7 @@ class MockAccountInfo:
     company: str = "Mock Broker"
     name: str = "Mock Account"
 
-@dataclass
+@dataclass(slots=True)
 class MockPosition:
     """Mock Position"""
     ticket: int
@@ -42,17 +46,27 @@ class MockPosition:
     swap: float
     comment: str
     magic: int
-    time: datetime
+    time: int  # Epoch-Sekunden, wie beim echten Backend
 
 class MockMT5Client:
     """Mock MT5 Client für Tests"""
     
     def __init__(self):
         self.is_connected = True
-        self.last_heartbeat = datetime.utcnow()
+        # Epoch-Float wie beim echten Client; formatiert wird erst an
+        # der JSON-Grenze
+        self.last_heartbeat_epoch = time.time()
         self.account_info = MockAccountInfo()
+        # Konto-Sicht einmal bauen: die Mock-Felder sind statisch, pro
+        # get_account_info wird nur server_time aufgefrischt und eine
+        # read-only-View zurückgegeben statt das Dict neu aufzubauen
+        self._account_info_dict = asdict(self.account_info)
+        self._account_info_dict['server_time'] = datetime.now(timezone.utc)
+        self._account_info_view = MappingProxyType(self._account_info_dict)
         self.symbols_cache: Dict[str, SymbolInfo] = {}
-        self.positions: List[MockPosition] = []
+        # Ticket-indiziert: Modify/Close sind O(1) statt Linear-Scans
+        # über eine Liste (O(N²) beim Schließen ganzer Portfolios)
+        self.positions: Dict[int, MockPosition] = {}
         self.order_counter = 1000000
         
         # Standard-Symbole initialisieren
@@ -68,8 +82,10 @@ class MockMT5Client:
             ("USDCAD", 5, 0.00001, 1.0, 100000, 0.0),
         ]
         
+        # Symbolnamen interniert ablegen: Hash wird einmal berechnet,
+        # Lookups mit internierten Keys vergleichen per Pointer
         for symbol, digits, point, tick_value, contract_size, margin_required in symbols:
-            self.symbols_cache[symbol] = SymbolInfo(
+            self.symbols_cache[sys.intern(symbol)] = SymbolInfo(
                 name=symbol,
                 digits=digits,
                 point=point,
@@ -90,7 +106,7 @@ class MockMT5Client:
     
     def heartbeat(self) -> bool:
         """Mock Heartbeat"""
-        self.last_heartbeat = datetime.utcnow()
+        self.last_heartbeat_epoch = time.time()
         return True
     
     def reconnect(self) -> bool:
@@ -106,7 +122,7 @@ class MockMT5Client:
         """Mock Symbol-Abonnement"""
         if symbol not in self.symbols_cache:
             # Symbol hinzufügen
-            self.symbols_cache[symbol] = SymbolInfo(
+            self.symbols_cache[sys.intern(symbol)] = SymbolInfo(
                 name=symbol,
                 digits=5,
                 point=0.00001,
@@ -120,31 +136,19 @@ class MockMT5Client:
     
     def get_account_info(self) -> Optional[Dict[str, Any]]:
         """Mock Konto-Info"""
-        return {
-            'login': self.account_info.login,
-            'server': self.account_info.server,
-            'balance': self.account_info.balance,
-            'equity': self.account_info.equity,
-            'margin': self.account_info.margin,
-            'free_margin': self.account_info.free_margin,
-            'margin_level': self.account_info.margin_level,
-            'currency': self.account_info.currency,
-            'leverage': self.account_info.leverage,
-            'profit': self.account_info.profit,
-            'company': self.account_info.company,
-            'name': self.account_info.name,
-            'server_time': datetime.utcnow()
-        }
-    
+        self._account_info_dict['server_time'] = datetime.now(timezone.utc)
+        return self._account_info_view
+
     def get_server_time(self) -> Optional[datetime]:
         """Mock Server-Zeit"""
-        return datetime.utcnow()
+        return datetime.now(timezone.utc)
     
     def get_connection_status(self) -> Dict[str, Any]:
         """Mock Verbindungsstatus"""
         return {
             'is_connected': self.is_connected,
-            'last_heartbeat': self.last_heartbeat.isoformat(),
+            'last_heartbeat': datetime.fromtimestamp(self.last_heartbeat_epoch,
+                                                     tz=timezone.utc).isoformat(),
             'server': self.account_info.server,
             'login': self.account_info.login,
             'account_info': self.get_account_info()
@@ -155,12 +159,14 @@ class MockTradingEngine:
     
     def __init__(self, mock_client: MockMT5Client):
         self.mock_client = mock_client
-        self.idempotency_cache: Dict[str, datetime] = {}
+        self.idempotency_cache: 'OrderedDict[bytes, float]' = OrderedDict()
         self.idempotency_ttl = 3600
     
-    def calculate_lot_size(self, symbol: str, risk_config, sl_points: float) -> Optional[float]:
+    def calculate_lot_size(self, symbol: str, risk_config, sl_points: float,
+                           symbol_info: Optional[SymbolInfo] = None) -> Optional[float]:
         """Mock Lot-Berechnung"""
-        symbol_info = self.mock_client.get_symbol_info(symbol)
+        if symbol_info is None:
+            symbol_info = self.mock_client.get_symbol_info(symbol)
         if not symbol_info:
             return None
         
@@ -184,10 +190,12 @@ class MockTradingEngine:
         
         return lot_size
     
-    def calculate_sl_tp_prices(self, symbol: str, side: OrderSide, entry_price: float, 
-                              sl_config, tp_config) -> tuple:
+    def calculate_sl_tp_prices(self, symbol: str, side: OrderSide, entry_price: float,
+                              sl_config, tp_config,
+                              symbol_info: Optional[SymbolInfo] = None) -> tuple:
         """Mock SL/TP-Berechnung"""
-        symbol_info = self.mock_client.get_symbol_info(symbol)
+        if symbol_info is None:
+            symbol_info = self.mock_client.get_symbol_info(symbol)
         if not symbol_info:
             return None, None
         
@@ -214,11 +222,21 @@ class MockTradingEngine:
         """Mock Idempotency-Validierung"""
         if not idempotency_key:
             return True
-        
-        if idempotency_key in self.idempotency_cache:
+
+        # Wie die echte Engine: Key auf einen 128-Bit-Digest
+        # normalisieren - konstante Eintragsgröße im Cache statt
+        # Voll-String-Hashing beliebig langer Keys
+        key = hashlib.blake2b(idempotency_key.encode(), digest_size=16).digest()
+
+        now = time.monotonic()
+        cache = self.idempotency_cache
+        while cache and now - next(iter(cache.values())) > self.idempotency_ttl:
+            cache.popitem(last=False)
+
+        if key in cache:
             return False
-        
-        self.idempotency_cache[idempotency_key] = datetime.utcnow()
+
+        cache[key] = now
         return True
     
     def execute_signal(self, signal: TradingSignal) -> OrderResult:
@@ -227,7 +245,8 @@ class MockTradingEngine:
         if not self.validate_idempotency(signal.idempotency_key):
             return OrderResult(
                 success=False,
-                error_message="Idempotency-Key bereits verwendet"
+                error_message="Idempotency-Key bereits verwendet",
+                error_code=ErrorCode.DUPLICATE_IDEMPOTENCY
             )
         
         # Symbol-Info abrufen
@@ -235,7 +254,8 @@ class MockTradingEngine:
         if not symbol_info:
             return OrderResult(
                 success=False,
-                error_message=f"Symbol {signal.symbol} nicht verfügbar"
+                error_message=f"Symbol {signal.symbol} nicht verfügbar",
+                error_code=ErrorCode.SYMBOL_UNAVAILABLE
             )
         
         # Mock-Preis generieren
@@ -246,16 +266,19 @@ class MockTradingEngine:
         sl_points = signal.sl.pips or 20
         
         # Lot-Größe berechnen
-        lot_size = self.calculate_lot_size(signal.symbol, signal.risk, sl_points)
+        lot_size = self.calculate_lot_size(signal.symbol, signal.risk, sl_points,
+                                           symbol_info=symbol_info)
         if not lot_size:
             return OrderResult(
                 success=False,
-                error_message="Lot-Größe konnte nicht berechnet werden"
+                error_message="Lot-Größe konnte nicht berechnet werden",
+                error_code=ErrorCode.LOT_SIZE_INVALID
             )
         
         # SL/TP Preise berechnen
         sl_price, tp_price = self.calculate_sl_tp_prices(
-            signal.symbol, signal.side, current_price, signal.sl, signal.tp
+            signal.symbol, signal.side, current_price, signal.sl, signal.tp,
+            symbol_info=symbol_info
         )
         
         # Mock-Order erstellen
@@ -276,10 +299,10 @@ class MockTradingEngine:
             swap=0.0,
             comment=signal.comment,
             magic=signal.magic_number,
-            time=datetime.utcnow()
+            time=int(time.time())
         )
         
-        self.mock_client.positions.append(position)
+        self.mock_client.positions[order_id] = position
         
         return OrderResult(
             success=True,
@@ -289,12 +312,12 @@ class MockTradingEngine:
             sl_price=sl_price,
             tp_price=tp_price,
             lot_size=lot_size,
-            server_time=datetime.utcnow()
+            server_time=datetime.now(timezone.utc)
         )
     
     def get_positions(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
         """Mock Positionen abrufen"""
-        positions = self.mock_client.positions
+        positions = self.mock_client.positions.values()
         if symbol:
             positions = [p for p in positions if p.symbol == symbol]
         
@@ -321,25 +344,27 @@ class MockTradingEngine:
     def modify_position(self, ticket: int, sl: Optional[float] = None, 
                        tp: Optional[float] = None) -> bool:
         """Mock Position modifizieren"""
-        for pos in self.mock_client.positions:
-            if pos.ticket == ticket:
-                if sl is not None:
-                    pos.sl = sl
-                if tp is not None:
-                    pos.tp = tp
-                return True
-        return False
+        pos = self.mock_client.positions.get(ticket)
+        if pos is None:
+            return False
+
+        if sl is not None:
+            pos.sl = sl
+        if tp is not None:
+            pos.tp = tp
+        return True
     
     def close_position(self, ticket: int, volume: Optional[float] = None) -> bool:
         """Mock Position schließen"""
-        for i, pos in enumerate(self.mock_client.positions):
-            if pos.ticket == ticket:
-                if volume and volume < pos.volume:
-                    pos.volume -= volume
-                else:
-                    del self.mock_client.positions[i]
-                return True
-        return False
+        pos = self.mock_client.positions.get(ticket)
+        if pos is None:
+            return False
+
+        if volume and volume < pos.volume:
+            pos.volume -= volume
+        else:
+            del self.mock_client.positions[ticket]
+        return True
 
 # Mock-Instanzen für Tests
 mock_mt5_client = MockMT5Client()
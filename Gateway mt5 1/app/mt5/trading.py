@@ -6,10 +6,15 @@ Order-Management, Risikomanagement und Positionsverwaltung
 import MetaTrader5 as mt5
 import hashlib
 import logging
-from datetime import datetime, timedelta
+import threading
+import time
+import redis
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from typing import Optional, Dict, Any, List, Tuple
 from dataclasses import dataclass
-from enum import Enum
+from enum import Enum, IntEnum
 from app.config import Config
 from app.mt5 import MT5Client, SymbolInfo
 
@@ -25,28 +30,38 @@ class OrderSide(Enum):
     BUY = "buy"
     SELL = "sell"
 
-@dataclass
+class ErrorCode(IntEnum):
+    """Maschinenlesbare Fehlercodes für OrderResult - Aufrufer und Tests
+    vergleichen den Code statt in lokalisierten Meldungen zu suchen"""
+    DUPLICATE_IDEMPOTENCY = 1
+    SYMBOL_UNAVAILABLE = 2
+    PRICE_UNAVAILABLE = 3
+    LOT_SIZE_INVALID = 4
+    ORDER_FAILED = 5
+    INTERNAL_ERROR = 6
+
+@dataclass(slots=True)
 class RiskConfig:
     """Risikokonfiguration"""
     percent: float
     fixed_amount: Optional[float] = None
     max_risk_per_trade: float = 2.0
 
-@dataclass
+@dataclass(slots=True)
 class StopLossConfig:
     """Stop-Loss Konfiguration"""
     pips: Optional[int] = None
     price: Optional[float] = None
     atr_multiplier: Optional[float] = None
 
-@dataclass
+@dataclass(slots=True)
 class TakeProfitConfig:
     """Take-Profit Konfiguration"""
     pips: Optional[int] = None
     price: Optional[float] = None
     risk_reward_ratio: Optional[float] = None
 
-@dataclass
+@dataclass(slots=True)
 class TradingSignal:
     """Trading-Signal"""
     strategy: str
@@ -61,7 +76,7 @@ class TradingSignal:
     idempotency_key: str = ""
     magic_number: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class OrderResult:
     """Order-Ergebnis"""
     success: bool
@@ -72,122 +87,165 @@ class OrderResult:
     tp_price: Optional[float] = None
     lot_size: Optional[float] = None
     error_message: Optional[str] = None
+    error_code: Optional[ErrorCode] = None
     server_time: Optional[datetime] = None
 
+# Typ-Konstanten einmal beim Import auf ihre API-Strings abgebildet -
+# Dict-Lookup statt Vergleich plus Attributzugriff pro Zeile
+_POS_TYPE_STR = {mt5.POSITION_TYPE_BUY: 'buy', mt5.POSITION_TYPE_SELL: 'sell'}
+
+def _lot_size_kernel(balance: float, percent: float, fixed: float,
+                     max_risk: float, tick_value: float, contract_size: float,
+                     sl_points: float, point: float, min_lot: float,
+                     max_lot: float, lot_step: float) -> float:
+    """Reiner Zahlenkern der Lot-Berechnung - keine MT5- oder
+    self-Zugriffe, damit Backtests ihn direkt und billig aufrufen
+    können. Liefert -1.0 bei ungültigem Verlust pro Lot."""
+    risk_amount = fixed if fixed else balance * (percent / 100.0)
+    risk_amount = min(risk_amount, balance * (max_risk / 100.0))
+
+    loss_per_lot = sl_points * point * tick_value * contract_size
+    if loss_per_lot <= 0.0:
+        return -1.0
+
+    lot_size = min(max(risk_amount / loss_per_lot, min_lot), max_lot)
+    return round(lot_size / lot_step) * lot_step
+
+def _sl_tp_kernel(sign: float, entry: float, point: float,
+                  sl_pips: Optional[int], sl_price: Optional[float],
+                  tp_pips: Optional[int], tp_price: Optional[float],
+                  risk_reward: Optional[float],
+                  stop_level_pips: int) -> Tuple[Optional[float], Optional[float]]:
+    """Reiner Zahlenkern der SL/TP-Ableitung; sign ist +1 für Buy und
+    -1 für Sell, womit beide Seiten ohne Verzweigungen auskommen"""
+    sl = None
+    tp = None
+    risk = 0.0
+
+    if sl_pips:
+        risk = sl_pips * point
+        sl = entry - sign * risk
+    elif sl_price:
+        sl = sl_price
+        risk = abs(entry - sl)
+
+    if tp_pips:
+        tp = entry + sign * tp_pips * point
+    elif tp_price:
+        tp = tp_price
+    elif risk_reward and sl is not None:
+        # Risiko-Distanz aus dem SL-Zweig wiederverwenden statt sie
+        # über abs() erneut herzuleiten
+        tp = entry + sign * risk * risk_reward
+
+    # Mindestabstand prüfen
+    min_distance = stop_level_pips * point
+    if sl is not None and abs(entry - sl) < min_distance:
+        sl = entry - sign * min_distance
+    if tp is not None and abs(entry - tp) < min_distance:
+        tp = entry + sign * min_distance
+
+    return sl, tp
+
 class TradingEngine:
     """MetaTrader 5 Trading Engine"""
     
-    def __init__(self, config: Config, mt5_client: MT5Client):
+    def __init__(self, config: Config, mt5_client: MT5Client,
+                 redis_client: Optional[redis.Redis] = None):
         self.config = config
         self.mt5_client = mt5_client
+        self.redis_client = redis_client
         self.logger = logging.getLogger(__name__)
-        self.idempotency_cache: Dict[str, datetime] = {}
+        # Fallback ohne Redis: Einfüge-geordnet mit monotonic-Stempeln,
+        # abgelaufene Keys werden amortisiert O(1) vorne abgeräumt
+        self.idempotency_cache: 'OrderedDict[bytes, float]' = OrderedDict()
         self.idempotency_ttl = 3600  # 1 Stunde
+        # Ticket->Position-Map mit kurzer TTL: Bulk-Aufrufer ("list,
+        # then modify each") teilen sich eine positions_get-Abfrage
+        # statt N+1 IPC-Hops
+        self._positions_by_ticket: Dict[int, Any] = {}
+        self._positions_mono: float = 0.0
+        # Begrenzter Pool für parallele MT5-Abfragen; das Binding gibt
+        # während des IPC den GIL frei, die Aufrufe überlappen also
+        self._io_pool = ThreadPoolExecutor(max_workers=8,
+                                           thread_name_prefix='mt5-io')
+        # Konstante Order-Parameter einmal gebaut; pro Order bleibt ein
+        # copy() plus die variablen Felder
+        self._base_request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "deviation": 20,
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": mt5.ORDER_FILLING_IOC,
+        }
+
+    def _get_position(self, ticket: int) -> Optional[Any]:
+        """Liefert eine Position aus der gebündelten positions_get-Abfrage
+        (50-ms-TTL) statt per Einzel-Lookup bei MT5"""
+        now = time.monotonic()
+        if now - self._positions_mono > 0.05:
+            positions = mt5.positions_get()
+            self._positions_by_ticket = (
+                {p.ticket: p for p in positions} if positions else {}
+            )
+            self._positions_mono = now
+        return self._positions_by_ticket.get(ticket)
         
-    def calculate_lot_size(self, symbol: str, risk_config: RiskConfig, 
-                          sl_points: float) -> Optional[float]:
-        """Berechnet Lot-Größe basierend auf Risiko"""
+    def calculate_lot_size(self, symbol: str, risk_config: RiskConfig,
+                          sl_points: float,
+                          symbol_info: Optional[SymbolInfo] = None,
+                          balance: Optional[float] = None) -> Optional[float]:
+        """Berechnet Lot-Größe basierend auf Risiko (Aufrufer, die
+        Symbol-Info/Balance bereits geholt haben, reichen sie durch und
+        sparen die erneuten MT5-Abfragen)"""
         try:
             # Symbol-Info abrufen
-            symbol_info = self.mt5_client.get_symbol_info(symbol)
+            if symbol_info is None:
+                symbol_info = self.mt5_client.get_symbol_info(symbol)
             if not symbol_info:
                 return None
-            
+
             # Kontoinformationen abrufen
-            account_info = self.mt5_client.get_account_info()
-            if not account_info:
-                return None
-            
-            balance = account_info['balance']
-            
-            # Risikobetrag berechnen
-            if risk_config.fixed_amount:
-                risk_amount = risk_config.fixed_amount
-            else:
-                risk_amount = balance * (risk_config.percent / 100)
-            
-            # Maximales Risiko pro Trade begrenzen
-            max_risk = balance * (risk_config.max_risk_per_trade / 100)
-            risk_amount = min(risk_amount, max_risk)
-            
-            # Verlust pro Lot berechnen
-            point_value = symbol_info.tick_value * symbol_info.contract_size
-            loss_per_lot = sl_points * symbol_info.point * point_value
-            
-            if loss_per_lot <= 0:
+            if balance is None:
+                account_info = self.mt5_client.get_account_info()
+                if not account_info:
+                    return None
+                balance = account_info['balance']
+
+            lot_size = _lot_size_kernel(
+                balance, risk_config.percent, risk_config.fixed_amount or 0.0,
+                risk_config.max_risk_per_trade, symbol_info.tick_value,
+                symbol_info.contract_size, sl_points, symbol_info.point,
+                self.config.MIN_LOT_SIZE, self.config.MAX_LOT_SIZE,
+                self.config.LOT_STEP
+            )
+            if lot_size < 0.0:
                 self.logger.error(f"Ungültiger Verlust pro Lot für {symbol}")
                 return None
-            
-            # Lot-Größe berechnen
-            lot_size = risk_amount / loss_per_lot
-            
-            # Lot-Größe begrenzen
-            lot_size = max(lot_size, self.config.MIN_LOT_SIZE)
-            lot_size = min(lot_size, self.config.MAX_LOT_SIZE)
-            
-            # Lot-Step berücksichtigen
-            lot_size = round(lot_size / self.config.LOT_STEP) * self.config.LOT_STEP
-            
+
             return lot_size
             
         except Exception as e:
             self.logger.error(f"Fehler bei Lot-Berechnung für {symbol}: {e}")
             return None
     
-    def calculate_sl_tp_prices(self, symbol: str, side: OrderSide, 
+    def calculate_sl_tp_prices(self, symbol: str, side: OrderSide,
                               entry_price: float, sl_config: StopLossConfig,
-                              tp_config: TakeProfitConfig) -> Tuple[Optional[float], Optional[float]]:
+                              tp_config: TakeProfitConfig,
+                              symbol_info: Optional[SymbolInfo] = None) -> Tuple[Optional[float], Optional[float]]:
         """Berechnet SL/TP Preise"""
         try:
-            symbol_info = self.mt5_client.get_symbol_info(symbol)
+            if symbol_info is None:
+                symbol_info = self.mt5_client.get_symbol_info(symbol)
             if not symbol_info:
                 return None, None
-            
-            sl_price = None
-            tp_price = None
-            
-            # Stop-Loss berechnen
-            if sl_config.pips:
-                pip_value = sl_config.pips * symbol_info.point
-                if side == OrderSide.BUY:
-                    sl_price = entry_price - pip_value
-                else:
-                    sl_price = entry_price + pip_value
-            elif sl_config.price:
-                sl_price = sl_config.price
-            
-            # Take-Profit berechnen
-            if tp_config.pips:
-                pip_value = tp_config.pips * symbol_info.point
-                if side == OrderSide.BUY:
-                    tp_price = entry_price + pip_value
-                else:
-                    tp_price = entry_price - pip_value
-            elif tp_config.price:
-                tp_price = tp_config.price
-            elif tp_config.risk_reward_ratio and sl_price:
-                risk = abs(entry_price - sl_price)
-                reward = risk * tp_config.risk_reward_ratio
-                if side == OrderSide.BUY:
-                    tp_price = entry_price + reward
-                else:
-                    tp_price = entry_price - reward
-            
-            # Mindestabstand prüfen
-            min_distance = self.config.STOP_LEVEL_PIPS * symbol_info.point
-            if sl_price and abs(entry_price - sl_price) < min_distance:
-                if side == OrderSide.BUY:
-                    sl_price = entry_price - min_distance
-                else:
-                    sl_price = entry_price + min_distance
-            
-            if tp_price and abs(entry_price - tp_price) < min_distance:
-                if side == OrderSide.BUY:
-                    tp_price = entry_price + min_distance
-                else:
-                    tp_price = entry_price - min_distance
-            
-            return sl_price, tp_price
+
+            sign = 1.0 if side == OrderSide.BUY else -1.0
+            return _sl_tp_kernel(
+                sign, entry_price, symbol_info.point,
+                sl_config.pips, sl_config.price,
+                tp_config.pips, tp_config.price, tp_config.risk_reward_ratio,
+                self.config.STOP_LEVEL_PIPS
+            )
             
         except Exception as e:
             self.logger.error(f"Fehler bei SL/TP-Berechnung für {symbol}: {e}")
@@ -197,21 +255,37 @@ class TradingEngine:
         """Validiert Idempotency-Key"""
         if not idempotency_key:
             return True
-        
+
+        # Redis-Pfad: SET NX + GET des Ergebnisses in einer Pipeline,
+        # eine RTT statt zwei sequenzieller Kommandos
+        if self.redis_client:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                pipe.set(f"idem:{idempotency_key}", "pending",
+                         nx=True, ex=self.idempotency_ttl)
+                pipe.get(f"idem:{idempotency_key}:result")
+                set_ok, prior = pipe.execute()
+                return bool(set_ok) and prior is None
+            except redis.RedisError:
+                pass  # Fallback auf In-Memory-Cache
+
+        # Key einmal auf einen 128-Bit-Digest normalisieren: konstante
+        # Eintragsgröße und billige Vergleiche statt Voll-String-Compares
+        # bei langen Webhook-Keys
+        key = hashlib.blake2b(idempotency_key.encode(), digest_size=16).digest()
+
+        # Abgelaufene Keys vorne abräumen (älteste zuerst) statt den
+        # Cache bei jedem Signal komplett neu aufzubauen
+        now = time.monotonic()
+        cache = self.idempotency_cache
+        while cache and now - next(iter(cache.values())) > self.idempotency_ttl:
+            cache.popitem(last=False)
+
         # Prüfen ob Key bereits verwendet wurde
-        if idempotency_key in self.idempotency_cache:
+        if key in cache:
             return False
-        
-        # Key zur Cache hinzufügen
-        self.idempotency_cache[idempotency_key] = datetime.utcnow()
-        
-        # Alte Keys bereinigen
-        cutoff = datetime.utcnow() - timedelta(seconds=self.idempotency_ttl)
-        self.idempotency_cache = {
-            k: v for k, v in self.idempotency_cache.items() 
-            if v > cutoff
-        }
-        
+
+        cache[key] = now
         return True
     
     def execute_signal(self, signal: TradingSignal) -> OrderResult:
@@ -221,14 +295,16 @@ class TradingEngine:
             if not self.validate_idempotency(signal.idempotency_key):
                 return OrderResult(
                     success=False,
-                    error_message="Idempotency-Key bereits verwendet"
+                    error_message="Idempotency-Key bereits verwendet",
+                    error_code=ErrorCode.DUPLICATE_IDEMPOTENCY
                 )
             
             # Symbol abonnieren
             if not self.mt5_client.subscribe_symbol(signal.symbol):
                 return OrderResult(
                     success=False,
-                    error_message=f"Symbol {signal.symbol} nicht verfügbar"
+                    error_message=f"Symbol {signal.symbol} nicht verfügbar",
+                    error_code=ErrorCode.SYMBOL_UNAVAILABLE
                 )
             
             # Symbol-Info abrufen
@@ -236,7 +312,8 @@ class TradingEngine:
             if not symbol_info:
                 return OrderResult(
                     success=False,
-                    error_message=f"Symbol-Info für {signal.symbol} nicht verfügbar"
+                    error_message=f"Symbol-Info für {signal.symbol} nicht verfügbar",
+                    error_code=ErrorCode.SYMBOL_UNAVAILABLE
                 )
             
             # Aktueller Preis
@@ -244,7 +321,8 @@ class TradingEngine:
             if tick is None:
                 return OrderResult(
                     success=False,
-                    error_message=f"Aktueller Preis für {signal.symbol} nicht verfügbar"
+                    error_message=f"Aktueller Preis für {signal.symbol} nicht verfügbar",
+                    error_code=ErrorCode.PRICE_UNAVAILABLE
                 )
             
             current_price = tick.ask if signal.side == OrderSide.BUY else tick.bid
@@ -256,36 +334,37 @@ class TradingEngine:
             elif signal.sl.price:
                 sl_points = abs(current_price - signal.sl.price) / symbol_info.point
             
-            # Lot-Größe berechnen
-            lot_size = self.calculate_lot_size(signal.symbol, signal.risk, sl_points)
+            # Lot-Größe berechnen (Symbol-Info wird durchgereicht - eine
+            # MT5-Abfrage pro Signal statt drei)
+            lot_size = self.calculate_lot_size(signal.symbol, signal.risk,
+                                               sl_points, symbol_info=symbol_info)
             if not lot_size:
                 return OrderResult(
                     success=False,
-                    error_message="Lot-Größe konnte nicht berechnet werden"
+                    error_message="Lot-Größe konnte nicht berechnet werden",
+                    error_code=ErrorCode.LOT_SIZE_INVALID
                 )
-            
+
             # SL/TP Preise berechnen
             sl_price, tp_price = self.calculate_sl_tp_prices(
-                signal.symbol, signal.side, current_price, signal.sl, signal.tp
+                signal.symbol, signal.side, current_price, signal.sl, signal.tp,
+                symbol_info=symbol_info
             )
             
             # Order-Parameter erstellen
             order_type = mt5.ORDER_TYPE_BUY if signal.side == OrderSide.BUY else mt5.ORDER_TYPE_SELL
             
-            request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "symbol": signal.symbol,
-                "volume": lot_size,
-                "type": order_type,
-                "price": current_price,
-                "sl": sl_price or 0.0,
-                "tp": tp_price or 0.0,
-                "deviation": 20,
-                "magic": signal.magic_number,
-                "comment": signal.comment,
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_IOC,
-            }
+            request = self._base_request.copy()
+            request.update(
+                symbol=signal.symbol,
+                volume=lot_size,
+                type=order_type,
+                price=current_price,
+                sl=sl_price or 0.0,
+                tp=tp_price or 0.0,
+                magic=signal.magic_number,
+                comment=signal.comment,
+            )
             
             # Order senden
             result = mt5.order_send(request)
@@ -293,9 +372,20 @@ class TradingEngine:
             if result.retcode != mt5.TRADE_RETCODE_DONE:
                 return OrderResult(
                     success=False,
-                    error_message=f"Order fehlgeschlagen: {result.comment}"
+                    error_message=f"Order fehlgeschlagen: {result.comment}",
+                    error_code=ErrorCode.ORDER_FAILED
                 )
             
+            # Ergebnis für Idempotency-Wiederholungen hinterlegen
+            if self.redis_client and signal.idempotency_key:
+                try:
+                    self.redis_client.set(
+                        f"idem:{signal.idempotency_key}:result", "done",
+                        ex=self.idempotency_ttl
+                    )
+                except redis.RedisError:
+                    pass
+
             # Erfolgreiche Ausführung
             return OrderResult(
                 success=True,
@@ -312,9 +402,92 @@ class TradingEngine:
             self.logger.error(f"Fehler bei Signal-Ausführung: {e}")
             return OrderResult(
                 success=False,
-                error_message=f"Interner Fehler: {str(e)}"
+                error_message=f"Interner Fehler: {str(e)}",
+                error_code=ErrorCode.INTERNAL_ERROR
             )
     
+    def execute_signals_batch(self, signals: List[TradingSignal]) -> List[OrderResult]:
+        """Führt mehrere Signale nebenläufig über den IO-Pool aus; die
+        order_send-Aufrufe geben während des Broker-Roundtrips den GIL
+        frei, aus der Summe der Latenzen wird damit ~die größte.
+        Ergebnisse kommen in Eingabereihenfolge zurück. (MT5 bietet mit
+        OrderSendAsync ein natives Pendant, das das Python-Binding
+        derzeit nicht exponiert.)"""
+        if not signals:
+            return []
+
+        futures = [self._io_pool.submit(self.execute_signal, sig)
+                   for sig in signals]
+        return [f.result() for f in futures]
+
+    def execute_order(self, symbol: str, side: OrderSide, volume: float,
+                      price: Optional[float] = None, sl: Optional[float] = None,
+                      tp: Optional[float] = None, comment: str = "",
+                      magic_number: int = 0) -> OrderResult:
+        """Führt eine direkte Order aus (Schnellpfad ohne Signal-Semantik:
+        keine Idempotency-Prüfung, kein Risk-Sizing, keine SL/TP-Ableitung)"""
+        try:
+            # Symbol abonnieren
+            if not self.mt5_client.subscribe_symbol(symbol):
+                return OrderResult(
+                    success=False,
+                    error_message=f"Symbol {symbol} nicht verfügbar",
+                    error_code=ErrorCode.SYMBOL_UNAVAILABLE
+                )
+
+            # Aktueller Preis
+            tick = mt5.symbol_info_tick(symbol)
+            if tick is None:
+                return OrderResult(
+                    success=False,
+                    error_message=f"Aktueller Preis für {symbol} nicht verfügbar",
+                    error_code=ErrorCode.PRICE_UNAVAILABLE
+                )
+
+            current_price = tick.ask if side == OrderSide.BUY else tick.bid
+            order_type = mt5.ORDER_TYPE_BUY if side == OrderSide.BUY else mt5.ORDER_TYPE_SELL
+
+            request = self._base_request.copy()
+            request.update(
+                symbol=symbol,
+                volume=volume,
+                type=order_type,
+                price=price or current_price,
+                sl=sl or 0.0,
+                tp=tp or 0.0,
+                magic=magic_number,
+                comment=comment,
+            )
+
+            # Order senden
+            result = mt5.order_send(request)
+
+            if result.retcode != mt5.TRADE_RETCODE_DONE:
+                return OrderResult(
+                    success=False,
+                    error_message=f"Order fehlgeschlagen: {result.comment}",
+                    error_code=ErrorCode.ORDER_FAILED
+                )
+
+            return OrderResult(
+                success=True,
+                order_id=result.order,
+                position_id=result.position,
+                executed_price=result.price,
+                sl_price=sl,
+                tp_price=tp,
+                lot_size=volume,
+                server_time=datetime.fromtimestamp(result.time)
+            )
+
+        except Exception as e:
+            self.logger.error(f"Fehler bei Order-Ausführung: {e}")
+            return OrderResult(
+                success=False,
+                error_message=f"Interner Fehler: {str(e)}",
+                error_code=ErrorCode.INTERNAL_ERROR
+            )
+
     def get_positions(self, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
         """Ruft offene Positionen ab"""
         try:
@@ -327,7 +500,7 @@ class TradingEngine:
                 result.append({
                     'ticket': pos.ticket,
                     'symbol': pos.symbol,
-                    'type': 'buy' if pos.type == mt5.POSITION_TYPE_BUY else 'sell',
+                    'type': _POS_TYPE_STR.get(pos.type, 'sell'),
                     'volume': pos.volume,
                     'price_open': pos.price_open,
                     'price_current': pos.price_current,
@@ -337,7 +510,9 @@ class TradingEngine:
                     'swap': pos.swap,
                     'comment': pos.comment,
                     'magic': pos.magic,
-                    'time': datetime.fromtimestamp(pos.time)
+                    # Epoch-Int; die ISO-Formatierung passiert an der
+                    # JSON-Grenze, nicht pro Zeile hier
+                    'time': pos.time
                 })
             
             return result
@@ -346,17 +521,24 @@ class TradingEngine:
             self.logger.error(f"Fehler beim Abrufen der Positionen: {e}")
             return []
     
-    def modify_position(self, ticket: int, sl: Optional[float] = None, 
+    def get_positions_bulk(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        """Ruft Positionen mehrerer Symbole parallel über den IO-Pool ab
+        (N sequenzielle Roundtrips -> ~1 RTT bis zur Poolgröße)"""
+        if not symbols:
+            return []
+
+        results = self._io_pool.map(self.get_positions, symbols)
+        return [pos for chunk in results for pos in chunk]
+
+    def modify_position(self, ticket: int, sl: Optional[float] = None,
                        tp: Optional[float] = None) -> bool:
         """Modifiziert Position"""
         try:
             # Position finden
-            position = mt5.positions_get(ticket=ticket)
-            if not position:
+            pos = self._get_position(ticket)
+            if pos is None:
                 return False
-            
-            pos = position[0]
-            
+
             request = {
                 "action": mt5.TRADE_ACTION_SLTP,
                 "symbol": pos.symbol,
@@ -376,28 +558,24 @@ class TradingEngine:
         """Schließt Position"""
         try:
             # Position finden
-            position = mt5.positions_get(ticket=ticket)
-            if not position:
+            pos = self._get_position(ticket)
+            if pos is None:
                 return False
-            
-            pos = position[0]
+
             close_volume = volume or pos.volume
             
             # Gegenorder erstellen
             order_type = mt5.ORDER_TYPE_SELL if pos.type == mt5.POSITION_TYPE_BUY else mt5.ORDER_TYPE_BUY
             
-            request = {
-                "action": mt5.TRADE_ACTION_DEAL,
-                "symbol": pos.symbol,
-                "volume": close_volume,
-                "type": order_type,
-                "position": ticket,
-                "deviation": 20,
-                "magic": pos.magic,
-                "comment": f"Close position {ticket}",
-                "type_time": mt5.ORDER_TIME_GTC,
-                "type_filling": mt5.ORDER_FILLING_IOC,
-            }
+            request = self._base_request.copy()
+            request.update(
+                symbol=pos.symbol,
+                volume=close_volume,
+                type=order_type,
+                position=ticket,
+                magic=pos.magic,
+                comment=f"Close position {ticket}",
+            )
             
             result = mt5.order_send(request)
             return result.retcode == mt5.TRADE_RETCODE_DONE
@@ -406,13 +584,19 @@ class TradingEngine:
             self.logger.error(f"Fehler beim Schließen der Position {ticket}: {e}")
             return False
 
-# Globale Trading Engine Instanz
+# Globale Trading Engine Instanz (Double-checked Locking, siehe app.mt5)
 trading_engine: Optional[TradingEngine] = None
+_init_lock = threading.Lock()
 
-def init_trading_engine(config: Config, mt5_client: MT5Client) -> None:
-    """Initialisiert die Trading Engine"""
+def init_trading_engine(config: Config, mt5_client: MT5Client,
+                        redis_client: Optional[redis.Redis] = None) -> None:
+    """Initialisiert die Trading Engine (thread-sicher, einmalig)"""
     global trading_engine
-    trading_engine = TradingEngine(config, mt5_client)
+    if trading_engine is not None:
+        return
+    with _init_lock:
+        if trading_engine is None:
+            trading_engine = TradingEngine(config, mt5_client, redis_client)
 
 def get_trading_engine() -> Optional[TradingEngine]:
     """Gibt die Trading Engine zurück"""
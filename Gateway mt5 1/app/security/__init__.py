@@ -4,17 +4,73 @@ Implementiert API-Key Authentifizierung, HMAC-Signaturen und Rate Limiting
 """
 
 import hmac
-import hashlib
+import heapq
+import ipaddress
 import base64
+import logging
+import logging.handlers
+import os
+import queue
+import secrets
+import threading
 import time
 import json
-import uuid
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, Tuple
+from datetime import datetime
+from typing import Optional, Dict, Any, Tuple, Union
 from functools import wraps
 from flask import request, jsonify, current_app, g
 import redis
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
 from app.config import Config
+from app.security.rate_limit import RATE_LIMIT_LUA
+
+# orjson für das Audit-Log, falls verfügbar (C-Serializer, gibt Bytes
+# direkt aus); Fallback auf stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Nonce-Check und Token-Bucket in einem atomaren Skript: der
+# authentifizierte Hot-Path zahlt einen Redis-Roundtrip statt zwei
+# (SET NX EX für die Nonce, danach der Bucket aus RATE_LIMIT_LUA).
+# KEYS[1] = Nonce-Key, KEYS[2] = Bucket;
+# ARGV = nonce_ttl, capacity, refill_rate (Tokens/s), now_ms, cost.
+# Rückgabe: {nonce_ok, allowed}
+AUTH_CHECK_LUA = """
+local nonce_ok = 0
+if redis.call('SET', KEYS[1], '1', 'NX', 'EX', ARGV[1]) then
+  nonce_ok = 1
+end
+
+local bucket = KEYS[2]
+local capacity = tonumber(ARGV[2])
+local rate = tonumber(ARGV[3])
+local now_ms = tonumber(ARGV[4])
+local cost = tonumber(ARGV[5])
+
+local state = redis.call('HMGET', bucket, 'tokens', 'last_refill')
+local tokens = tonumber(state[1])
+local last_refill = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  last_refill = now_ms
+end
+
+tokens = math.min(capacity, tokens + (now_ms - last_refill) * rate / 1000)
+
+local allowed = 0
+if tokens >= cost then
+  allowed = 1
+  tokens = tokens - cost
+end
+
+redis.call('HSET', bucket, 'tokens', tokens, 'last_refill', now_ms)
+redis.call('PEXPIRE', bucket, math.ceil(capacity / rate * 1000) * 2)
+
+return {nonce_ok, allowed}
+"""
 
 class SecurityError(Exception):
     """Sicherheitsbezogene Fehler"""
@@ -38,22 +94,59 @@ class SecurityManager:
     def __init__(self, config: Config, redis_client: Optional[redis.Redis] = None):
         self.config = config
         self.redis_client = redis_client
-        self.nonce_cache: Dict[str, datetime] = {}  # Fallback für Redis
+        # Fallback ohne Redis: Set für den O(1)-Replay-Check plus
+        # Min-Heap nach Ablaufzeit für die amortisierte Bereinigung
+        self.nonce_cache: set = set()
+        self._nonce_heap: list = []
         self.nonce_ttl = 300  # 5 Minuten
+        # Schlüsselmaterial einmal vorbereiten. Das HMAC-Objekt mit
+        # bereits eingearbeitetem Schlüsselblock wird als Template
+        # vorgehalten und pro Signatur nur kopiert; die Nachricht wird
+        # inkrementell gefüttert statt erst per f-String zusammenkopiert
+        # (spart eine volle Kopie großer Request-Bodies)
+        self._public_key = config.API_PUBLIC_KEY or ''
+        self._secret_bytes = (config.API_SECRET_KEY or '').encode('utf-8')
+        self._hmac_template = hmac.new(self._secret_bytes, digestmod='sha256')
+        # Allowlist einmal beim Init parsen statt Split+Strip pro
+        # Request; CIDR-Einträge werden als Netze vorgehalten
+        self._allowed_ips = frozenset(
+            ip.strip() for ip in config.ALLOWED_IPS.split(',') if ip.strip()
+        )
+        self._allow_all = bool({'*', '0.0.0.0'} & self._allowed_ips)
+        self._allowed_networks = []
+        for entry in self._allowed_ips:
+            if '/' in entry:
+                try:
+                    self._allowed_networks.append(
+                        ipaddress.ip_network(entry, strict=False))
+                except ValueError:
+                    logging.getLogger(__name__).warning(
+                        f"Ungültiger Allowlist-Eintrag: {entry}")
+        # Token-Bucket-Skript (gemeinsam mit dem RateLimiter); evalsha
+        # mit automatischem NOSCRIPT-Reload über register_script
+        self._bucket = (redis_client.register_script(RATE_LIMIT_LUA)
+                        if redis_client else None)
+        # Kombiniertes Nonce+Rate-Limit-Skript für authenticate_request
+        self._auth_check = (redis_client.register_script(AUTH_CHECK_LUA)
+                            if redis_client else None)
     
-    def generate_signature(self, secret: str, method: str, path: str, 
-                         body: str, timestamp: str, nonce: str) -> str:
-        """Generiert HMAC-SHA256 Signatur"""
-        message = f"{method.upper()}{path}{body}{timestamp}{nonce}".encode('utf-8')
-        signature = hmac.new(
-            secret.encode('utf-8'),
-            message,
-            hashlib.sha256
-        ).digest()
-        return base64.b64encode(signature).decode('utf-8')
-    
-    def verify_signature(self, signature: str, secret: str, method: str, 
-                        path: str, body: str, timestamp: str, nonce: str) -> bool:
+    def generate_signature(self, secret: str, method: str, path: str,
+                         body: Union[str, bytes], timestamp: str, nonce: str) -> str:
+        """Generiert HMAC-SHA256 Signatur (inkrementell; body darf
+        bereits bytes sein und wird dann ohne Umkopieren gefüttert)"""
+        if secret == self.config.API_SECRET_KEY:
+            h = self._hmac_template.copy()
+        else:
+            h = hmac.new(secret.encode('utf-8'), digestmod='sha256')
+        h.update(method.upper().encode('ascii'))
+        h.update(path.encode('utf-8'))
+        h.update(body if isinstance(body, bytes) else body.encode('utf-8'))
+        h.update(timestamp.encode('ascii'))
+        h.update(nonce.encode('ascii'))
+        return base64.b64encode(h.digest()).decode('ascii')
+
+    def verify_signature(self, signature: str, secret: str, method: str,
+                        path: str, body: Union[str, bytes], timestamp: str, nonce: str) -> bool:
         """Verifiziert HMAC-Signatur"""
         expected_signature = self.generate_signature(
             secret, method, path, body, timestamp, nonce
@@ -61,108 +154,141 @@ class SecurityManager:
         return hmac.compare_digest(signature, expected_signature)
     
     def validate_timestamp(self, timestamp: str, tolerance: int = 300) -> bool:
-        """Validiert Zeitstempel (Replay-Schutz)"""
-        try:
-            request_time = int(timestamp)
-            current_time = int(time.time())
-            return abs(current_time - request_time) <= tolerance
-        except (ValueError, TypeError):
+        """Validiert Zeitstempel (Replay-Schutz). isascii+isdecimal-
+        Vorprüfung statt try/except-int(): Malformed Input (der
+        Angriffs-Normalfall) kostet keine Exception-Maschinerie, und
+        Nicht-ASCII-Ziffern (die isdigit durchließe, int() aber ablehnt)
+        fallen hier schon durch. Die aktuelle Sekunde wird pro Request
+        in g gecacht."""
+        if not timestamp or not timestamp.isascii() or not timestamp.isdecimal():
             return False
+
+        try:
+            now = getattr(g, '_now_s', None)
+            if now is None:
+                now = time.time_ns() // 1_000_000_000
+                g._now_s = now
+        except RuntimeError:
+            # Aufruf außerhalb eines Request-Kontexts (Tests)
+            now = time.time_ns() // 1_000_000_000
+
+        return abs(now - int(timestamp)) <= tolerance
     
     def validate_nonce(self, nonce: str) -> bool:
         """Validiert Nonce (Replay-Schutz)"""
         if len(nonce) < 16:
             return False
         
-        # Redis-basierte Validierung
+        # Redis-basierte Validierung: SET NX EX ist atomar - ein
+        # Roundtrip statt EXISTS+SETEX und kein TOCTOU-Fenster, in dem
+        # zwei parallele Requests dieselbe Nonce durchbekommen
         if self.redis_client:
             try:
-                key = f"nonce:{nonce}"
-                if self.redis_client.exists(key):
-                    return False
-                self.redis_client.setex(key, self.nonce_ttl, "1")
-                return True
+                result = self.redis_client.set(
+                    f"nonce:{nonce}", b"1", nx=True, ex=self.nonce_ttl
+                )
+                return result is not None
             except redis.RedisError:
                 pass
         
-        # Fallback: In-Memory-Cache
+        # Fallback: In-Memory-Cache. Abgelaufene Nonces werden vom
+        # Heap-Kopf geräumt (amortisiert O(log n)) statt das komplette
+        # Dict pro Request per Comprehension neu zu bauen (O(n))
+        now = time.time()
+        heap = self._nonce_heap
+        while heap and heap[0][0] < now:
+            _, expired = heapq.heappop(heap)
+            self.nonce_cache.discard(expired)
+
         if nonce in self.nonce_cache:
             return False
-        
-        self.nonce_cache[nonce] = datetime.utcnow()
-        
-        # Cleanup alter Nonces
-        cutoff = datetime.utcnow() - timedelta(seconds=self.nonce_ttl)
-        self.nonce_cache = {
-            k: v for k, v in self.nonce_cache.items() 
-            if v > cutoff
-        }
-        
+
+        self.nonce_cache.add(nonce)
+        heapq.heappush(heap, (now + self.nonce_ttl, nonce))
         return True
     
     def validate_ip(self, ip: str) -> bool:
-        """Validiert IP-Adresse gegen Allowlist"""
-        allowed_ips = self.config.ALLOWED_IPS.split(',')
-        allowed_ips = [ip.strip() for ip in allowed_ips]
-        
-        # Spezielle IPs
-        if '0.0.0.0' in allowed_ips or '*' in allowed_ips:
+        """Validiert IP-Adresse gegen die vorgeparste Allowlist
+        (Set-Lookup; CIDR-Netze nur, wenn konfiguriert)"""
+        if self._allow_all or ip in self._allowed_ips:
             return True
-        
-        return ip in allowed_ips
+
+        if not self._allowed_networks:
+            return False
+
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        return any(addr in network for network in self._allowed_networks)
     
     def check_rate_limit(self, identifier: str, limit: int, window: int = 60) -> bool:
-        """Prüft Rate Limit"""
+        """Prüft Rate Limit (atomarer Token-Bucket, ein Redis-Roundtrip
+        statt GET/INCR/EXPIRE und ohne 2x-Burst an Fenstergrenzen)"""
         if not self.redis_client:
             return True  # Kein Rate Limiting ohne Redis
-        
+
         try:
-            key = f"rate_limit:{identifier}"
-            current = self.redis_client.get(key)
-            
-            if current is None:
-                self.redis_client.setex(key, window, 1)
-                return True
-            
-            if int(current) >= limit:
-                return False
-            
-            self.redis_client.incr(key)
-            return True
-            
+            allowed, _remaining, _retry_ms = self._bucket(
+                keys=[f"tb:{identifier}"],
+                args=[limit, limit / window, int(time.time() * 1000), 1]
+            )
+            return bool(allowed)
+
         except redis.RedisError:
             return True  # Bei Redis-Fehlern Rate Limiting deaktivieren
     
     def authenticate_request(self) -> Tuple[bool, Optional[str]]:
         """Authentifiziert API-Request"""
-        # Header prüfen
-        api_key = request.headers.get('X-API-KEY')
-        timestamp = request.headers.get('X-TS')
-        nonce = request.headers.get('X-NONCE')
-        signature = request.headers.get('X-SIGNATURE')
+        # Header prüfen: direkt aus dem WSGI-Environ (ein O(1)-dict.get
+        # pro Header statt der case-insensitiven EnvironHeaders-Scans)
+        env = request.environ
+        api_key = env.get('HTTP_X_API_KEY')
+        timestamp = env.get('HTTP_X_TS')
+        nonce = env.get('HTTP_X_NONCE')
+        signature = env.get('HTTP_X_SIGNATURE')
         
         if not all([api_key, timestamp, nonce, signature]):
             return False, "Fehlende Authentifizierungs-Header"
         
         # API-Key validieren
-        if api_key != self.config.API_PUBLIC_KEY:
+        if api_key != self._public_key:
             return False, "Ungültiger API-Key"
         
         # Zeitstempel validieren
         if not self.validate_timestamp(timestamp):
             return False, "Ungültiger oder abgelaufener Zeitstempel"
         
-        # Nonce validieren
-        if not self.validate_nonce(nonce):
-            return False, "Nonce bereits verwendet oder ungültig"
-        
-        # IP validieren
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+        # IP validieren (vor der Nonce, damit der Bucket-Key für den
+        # kombinierten Redis-Aufruf bereits feststeht)
+        client_ip = getattr(g, 'client_ip', None) or request.remote_addr
         if not self.validate_ip(client_ip):
             return False, "IP-Adresse nicht erlaubt"
-        
-        # Signatur validieren
-        body = request.get_data(as_text=True)
+
+        # Nonce und Rate Limit in einem Redis-Roundtrip prüfen; das
+        # Rate-Limit-Ergebnis landet in g, require_auth wertet es aus
+        # statt einen zweiten Roundtrip zu machen
+        if self._auth_check is not None:
+            try:
+                limit = self.config.RATE_LIMIT_PER_MIN
+                nonce_ok, rate_ok = self._auth_check(
+                    keys=[f"nonce:{nonce}", f"tb:{client_ip}"],
+                    args=[self.nonce_ttl, limit, limit / 60,
+                          int(time.time() * 1000), 1]
+                )
+                g._rate_limit_ok = bool(rate_ok)
+                if not nonce_ok:
+                    return False, "Nonce bereits verwendet oder ungültig"
+            except redis.RedisError:
+                # validate_nonce fällt selbst auf In-Memory zurück
+                if not self.validate_nonce(nonce):
+                    return False, "Nonce bereits verwendet oder ungültig"
+        elif not self.validate_nonce(nonce):
+            return False, "Nonce bereits verwendet oder ungültig"
+
+        # Signatur validieren: Body als rohe Bytes lassen - erspart das
+        # UTF-8-Decode hier und das Re-Encode in generate_signature
+        body = request.get_data(cache=True)
         if not self.verify_signature(
             signature, 
             self.config.API_SECRET_KEY,
@@ -180,8 +306,32 @@ class SecurityManager:
 security_manager: Optional[SecurityManager] = None
 
 def init_security(config: Config, redis_client: Optional[redis.Redis] = None) -> None:
-    """Initialisiert den Sicherheitsmanager"""
+    """Initialisiert den Sicherheitsmanager.
+
+    redis_client sollte ein Client mit Connection-Pool sein; ohne
+    übergebenen Client wird aus config.REDIS_URL einer mit
+    BlockingConnectionPool, Keepalive und health_check_interval gebaut
+    (erkennt tote Idle-Sockets, bevor ein Kommando hineinläuft, und
+    erspart pro Aufruf den TCP+RESP-Handshake)."""
     global security_manager
+
+    if redis_client is None and config.REDIS_URL:
+        try:
+            pool = redis.BlockingConnectionPool.from_url(
+                config.REDIS_URL,
+                max_connections=64,
+                timeout=1,
+                socket_keepalive=True,
+                health_check_interval=30,
+            )
+            redis_client = redis.Redis(
+                connection_pool=pool,
+                retry=Retry(ExponentialBackoff(), 2),
+            )
+            redis_client.ping()
+        except redis.RedisError:
+            redis_client = None
+
     security_manager = SecurityManager(config, redis_client)
 
 def require_auth(f):
@@ -196,19 +346,57 @@ def require_auth(f):
         if not is_valid:
             return jsonify({'error': error_msg}), 401
         
+        # Rate Limiting: Ergebnis aus dem kombinierten Redis-Aufruf in
+        # authenticate_request, sonst (Fallback-Pfade) eigener Check
+        rate_ok = getattr(g, '_rate_limit_ok', None)
+        if rate_ok is None:
+            client_ip = getattr(g, 'client_ip', None) or request.remote_addr
+            rate_ok = security_manager.check_rate_limit(
+                client_ip,
+                security_manager.config.RATE_LIMIT_PER_MIN
+            )
+        if not rate_ok:
+            return jsonify({'error': 'Rate Limit überschritten'}), 429
+        
+        # Trace-ID für Logging: os.urandom direkt statt uuid4 - gleiche
+        # Entropie, aber ohne UUID-Objektbau und -Formatierung
+        g.trace_id = os.urandom(16).hex()
+
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+def require_auth_readonly(f):
+    """Decorator für lesende GET-Endpunkte: API-Key-, IP- und Rate-Limit-
+    Prüfung ohne Body-HMAC (GETs haben keinen Body, die Signatur über den
+    leeren String kostet nur Header-Parsing und einen SHA-256-Lauf)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not security_manager:
+            return jsonify({'error': 'Sicherheitssystem nicht initialisiert'}), 500
+
+        # API-Key validieren (konstante Zeit)
+        api_key = request.headers.get('X-API-KEY', '')
+        if not hmac.compare_digest(api_key, security_manager.config.API_PUBLIC_KEY or ''):
+            return jsonify({'error': 'Ungültiger API-Key'}), 401
+
+        # IP validieren
+        client_ip = getattr(g, 'client_ip', None) or request.remote_addr
+        if not security_manager.validate_ip(client_ip):
+            return jsonify({'error': 'IP-Adresse nicht erlaubt'}), 401
+
         # Rate Limiting prüfen
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
         if not security_manager.check_rate_limit(
-            client_ip, 
+            client_ip,
             security_manager.config.RATE_LIMIT_PER_MIN
         ):
             return jsonify({'error': 'Rate Limit überschritten'}), 429
-        
+
         # Trace-ID für Logging
-        g.trace_id = str(uuid.uuid4())
-        
+        g.trace_id = os.urandom(16).hex()
+
         return f(*args, **kwargs)
-    
+
     return decorated_function
 
 def require_api_key(f):
@@ -222,11 +410,42 @@ def require_api_key(f):
     
     return decorated_function
 
+# Audit-Logging läuft über eine Queue: der Request-Thread macht nur ein
+# put_nowait, das eigentliche Schreiben übernimmt ein Hintergrund-Thread
+# (QueueListener), damit Datei-I/O die Response-Latenz nicht verlängert.
+_audit_logger: Optional[logging.Logger] = None
+_audit_listener: Optional[logging.handlers.QueueListener] = None
+_audit_lock = threading.Lock()
+
+def _get_audit_logger() -> logging.Logger:
+    """Gibt den Queue-basierten Audit-Logger zurück (einmalige Initialisierung)"""
+    global _audit_logger, _audit_listener
+    logger = _audit_logger
+    if logger is not None:
+        return logger
+    with _audit_lock:
+        if _audit_logger is None:
+            audit_queue: queue.SimpleQueue = queue.SimpleQueue()
+            logger = logging.getLogger('security.audit')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(logging.handlers.QueueHandler(audit_queue))
+
+            # Der Listener schreibt in die Handler des App-Loggers
+            # (bzw. des Root-Loggers als Fallback)
+            sink_handlers = current_app.logger.handlers or logging.getLogger().handlers
+            _audit_listener = logging.handlers.QueueListener(
+                audit_queue, *sink_handlers, respect_handler_level=True
+            )
+            _audit_listener.start()
+            _audit_logger = logger
+        return _audit_logger
+
 def audit_log(action: str, details: Optional[Dict[str, Any]] = None) -> None:
     """Audit-Logging für Sicherheitsereignisse"""
     trace_id = getattr(g, 'trace_id', 'unknown')
-    client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
-    
+    client_ip = getattr(g, 'client_ip', None) or request.remote_addr
+
     log_entry = {
         'timestamp': datetime.utcnow().isoformat(),
         'trace_id': trace_id,
@@ -235,26 +454,26 @@ def audit_log(action: str, details: Optional[Dict[str, Any]] = None) -> None:
         'user_agent': request.headers.get('User-Agent', 'unknown'),
         'details': details or {}
     }
-    
-    current_app.logger.info(f"AUDIT: {json.dumps(log_entry)}")
+
+    if orjson is not None:
+        _get_audit_logger().info("AUDIT: %s", orjson.dumps(log_entry).decode('utf-8'))
+    else:
+        _get_audit_logger().info("AUDIT: %s", json.dumps(log_entry))
 
 # Hilfsfunktionen für Tests
 def generate_test_signature(secret: str, method: str, path: str, 
                           body: str, timestamp: str, nonce: str) -> str:
     """Generiert Test-Signatur für Unit-Tests"""
     message = f"{method.upper()}{path}{body}{timestamp}{nonce}".encode('utf-8')
-    signature = hmac.new(
-        secret.encode('utf-8'),
-        message,
-        hashlib.sha256
-    ).digest()
-    return base64.b64encode(signature).decode('utf-8')
+    return base64.b64encode(
+        hmac.digest(secret.encode('utf-8'), message, 'sha256')
+    ).decode('ascii')
 
 def create_test_headers(api_key: str, secret: str, method: str = 'POST', 
                       path: str = '/api/v1/signal', body: str = '{}') -> Dict[str, str]:
     """Erstellt Test-Header für Unit-Tests"""
     timestamp = str(int(time.time()))
-    nonce = str(uuid.uuid4())
+    nonce = secrets.token_hex(16)
     signature = generate_test_signature(secret, method, path, body, timestamp, nonce)
     
     return {
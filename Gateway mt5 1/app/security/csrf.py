@@ -3,7 +3,7 @@ CSRF-Schutz für MT5 Flask Gateway
 """
 
 from flask_wtf.csrf import CSRFProtect, CSRFError
-from flask import request, jsonify, render_template
+from flask import request, jsonify, render_template, g
 from functools import wraps
 
 csrf = CSRFProtect()
@@ -28,11 +28,19 @@ def csrf_required(f):
     """Decorator um CSRF-Schutz explizit zu aktivieren"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        # CSRF-Token validieren
-        if not csrf.validate_csrf(request.form.get('csrf_token')):
+        # CSRF-Token validieren. Pro Request memoisiert: bei mehrfach
+        # gestapelten Decorators wird das itsdangerous-HMAC nur einmal
+        # nachgerechnet
+        token = request.form.get('csrf_token')
+        if getattr(g, '_csrf_validated_token', None) == token and token is not None:
+            return f(*args, **kwargs)
+
+        if not csrf.validate_csrf(token):
             if request.is_json:
                 return jsonify({'error': 'CSRF-Token ungültig'}), 400
             return render_template('errors/csrf.html'), 400
+
+        g._csrf_validated_token = token
         return f(*args, **kwargs)
-    
+
     return decorated_function
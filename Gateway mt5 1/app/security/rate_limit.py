@@ -2,72 +2,101 @@
 Rate Limiting Implementierung für MT5 Flask Gateway
 """
 
+import math
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from functools import wraps
 from flask import request, jsonify, g
 import redis
 from app.config import Config
 
+# Token-Bucket als atomares Lua-Skript: ein Redis-Roundtrip statt der
+# GET/INCR/EXPIRE-Sequenz, keine Races unter Parallelität und keine
+# 2x-Bursts an Fenstergrenzen wie beim festen Fenster.
+# KEYS[1] = Bucket; ARGV = capacity, refill_rate (Tokens/s), now_ms, cost.
+# Rückgabe: {allowed, verbleibende Tokens, retry_after in ms}
+RATE_LIMIT_LUA = """
+local bucket = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now_ms = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+
+local state = redis.call('HMGET', bucket, 'tokens', 'last_refill')
+local tokens = tonumber(state[1])
+local last_refill = tonumber(state[2])
+if tokens == nil then
+  tokens = capacity
+  last_refill = now_ms
+end
+
+tokens = math.min(capacity, tokens + (now_ms - last_refill) * rate / 1000)
+
+local allowed = 0
+local retry_ms = 0
+if tokens >= cost then
+  allowed = 1
+  tokens = tokens - cost
+else
+  retry_ms = math.ceil((cost - tokens) / rate * 1000)
+end
+
+redis.call('HSET', bucket, 'tokens', tokens, 'last_refill', now_ms)
+redis.call('PEXPIRE', bucket, math.ceil(capacity / rate * 1000) * 2)
+
+return {allowed, math.floor(tokens), retry_ms}
+"""
+
 class RateLimiter:
-    """Rate Limiter mit Redis-Backend"""
-    
+    """Rate Limiter mit Redis-Backend (Token-Bucket)"""
+
     def __init__(self, config: Config, redis_client: Optional[redis.Redis] = None):
         self.config = config
         self.redis_client = redis_client
         self.default_limit = config.RATE_LIMIT_PER_MIN
         self.default_window = 60  # Sekunden
-    
-    def is_allowed(self, identifier: str, limit: Optional[int] = None, 
+        # register_script evalsha't mit automatischem NOSCRIPT-Reload
+        self._bucket = (redis_client.register_script(RATE_LIMIT_LUA)
+                        if redis_client else None)
+
+    def is_allowed(self, identifier: str, limit: Optional[int] = None,
                   window: Optional[int] = None) -> Tuple[bool, Dict[str, Any]]:
         """Prüft ob Request erlaubt ist"""
         limit = limit or self.default_limit
         window = window or self.default_window
-        
+
         if not self.redis_client:
             return True, {'limit': limit, 'remaining': limit, 'reset_time': int(time.time()) + window}
-        
+
         try:
-            key = f"rate_limit:{identifier}"
-            current_time = int(time.time())
-            window_start = current_time - (current_time % window)
-            window_key = f"{key}:{window_start}"
-            
-            # Aktuelle Anzahl der Requests in diesem Fenster
-            current_count = self.redis_client.get(window_key)
-            if current_count is None:
-                current_count = 0
-            else:
-                current_count = int(current_count)
-            
-            if current_count >= limit:
-                return False, {
-                    'limit': limit,
-                    'remaining': 0,
-                    'reset_time': window_start + window,
-                    'retry_after': window_start + window - current_time
-                }
-            
-            # Request zählen
-            pipe = self.redis_client.pipeline()
-            pipe.incr(window_key)
-            pipe.expire(window_key, window)
-            pipe.execute()
-            
-            return True, {
+            rate = limit / window
+            now = time.time()
+            allowed, remaining, retry_ms = self._bucket(
+                keys=[f"tb:{identifier}"],
+                args=[limit, rate, int(now * 1000), 1]
+            )
+
+            remaining = int(remaining)
+            info = {
                 'limit': limit,
-                'remaining': limit - current_count - 1,
-                'reset_time': window_start + window
+                'remaining': remaining,
+                # Zeitpunkt, zu dem der Bucket wieder voll wäre
+                'reset_time': int(now + (limit - remaining) / rate)
             }
-            
+            if not allowed:
+                info['retry_after'] = math.ceil(retry_ms / 1000)
+                return False, info
+
+            return True, info
+
         except redis.RedisError:
             # Bei Redis-Fehlern Rate Limiting deaktivieren
             return True, {'limit': limit, 'remaining': limit, 'reset_time': int(time.time()) + window}
     
     def get_client_identifier(self) -> str:
         """Ermittelt Client-Identifier für Rate Limiting"""
-        # IP-Adresse als Basis
-        client_ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.remote_addr)
+        # IP-Adresse als Basis (von ProxyFix aufgelöst, in g gecacht)
+        client_ip = getattr(g, 'client_ip', None) or request.remote_addr
         
         # API-Key falls vorhanden
         api_key = request.headers.get('X-API-KEY')
@@ -6,14 +6,31 @@ Online/Offline Lizenzprüfung, Feature-Gates und Monetarisierung
 import hashlib
 import json
 import logging
+import os
+import threading
+import time
 import platform
 import psutil
 import requests
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 from app.config import Config
 
+# msgpack parst den Offline-Lizenz-Cache beim Kaltstart mehrfach
+# schneller als der Pure-Python-JSON-Decoder und ist kompakter auf der
+# Platte; ohne installiertes msgpack bleibt JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Hardware-Fingerprint ist pro Boot konstant: einmal berechnet, landet
+# er im Prozess- und im Disk-Cache - spätere LicenseManager-Instanzen
+# (z. B. in Tests) zahlen die platform-/psutil-Aufrufe nicht erneut
+_HWFP_CACHE_FILE = "hwfp_cache"
+_hwfp: Optional[str] = None
+
 @dataclass
 class LicenseInfo:
     """Lizenz-Informationen"""
@@ -41,8 +58,15 @@ class LicenseManager:
         self.config = config
         self.logger = logging.getLogger(__name__)
         self.license_info: Optional[LicenseInfo] = None
+        # Pro Lizenz vorberechnete Menge freigeschalteter Features;
+        # is_feature_enabled wird damit zu einem Set-Lookup
+        self._enabled_features: frozenset = frozenset()
+        # Ablauf als POSIX-Float: is_licensed vergleicht time.time()
+        # damit statt pro Aufruf ein datetime-Objekt zu allokieren
+        self._expires_ts: float = 0.0
         self.offline_cache: Optional[Dict[str, Any]] = None
         self.cache_file = "license_cache.json"
+        self.cache_file_msgpack = "license_cache.msgpack"
         self.hardware_fingerprint = self._generate_hardware_fingerprint()
         
         # Feature-Gates definieren
@@ -80,8 +104,30 @@ class LicenseManager:
         self._load_offline_cache()
     
     def _generate_hardware_fingerprint(self) -> str:
-        """Generiert Hardware-Fingerprint"""
+        """Generiert Hardware-Fingerprint (gecacht: erst Prozess, dann
+        Disk, erst dann die teuren platform-/psutil-Abfragen)"""
+        global _hwfp
+        if _hwfp is not None:
+            return _hwfp
+
+        try:
+            with open(_HWFP_CACHE_FILE, 'r') as f:
+                cached = f.read().strip()
+            if cached:
+                _hwfp = cached
+                return cached
+        except OSError:
+            pass
+
         try:
+            # statvfs liest direkt vom Kernel; psutil.disk_usage nur als
+            # Fallback (Windows hat kein statvfs)
+            if hasattr(os, 'statvfs'):
+                st = os.statvfs('/')
+                disk_total = st.f_blocks * st.f_frsize
+            else:
+                disk_total = psutil.disk_usage('/').total
+
             # System-Informationen sammeln
             system_info = {
                 "platform": platform.platform(),
@@ -90,15 +136,26 @@ class LicenseManager:
                 "node": platform.node(),
                 "cpu_count": psutil.cpu_count(),
                 "memory": psutil.virtual_memory().total,
-                "disk": psutil.disk_usage('/').total if hasattr(psutil, 'disk_usage') else 0
+                "disk": disk_total
             }
-            
+
             # Fingerprint generieren
             fingerprint_data = json.dumps(system_info, sort_keys=True)
             fingerprint = hashlib.sha256(fingerprint_data.encode()).hexdigest()
-            
+
+            # Atomar auf Disk persistieren (Fehler sind unkritisch,
+            # dann wird beim nächsten Boot neu berechnet)
+            try:
+                tmp_file = _HWFP_CACHE_FILE + '.tmp'
+                with open(tmp_file, 'w') as f:
+                    f.write(fingerprint)
+                os.replace(tmp_file, _HWFP_CACHE_FILE)
+            except OSError:
+                pass
+
+            _hwfp = fingerprint
             return fingerprint
-            
+
         except Exception as e:
             self.logger.error(f"Fehler bei Hardware-Fingerprint: {e}")
             return "unknown"
@@ -106,16 +163,20 @@ class LicenseManager:
     def _load_offline_cache(self) -> None:
         """Lädt Offline-Cache"""
         try:
-            import os
-            if os.path.exists(self.cache_file):
+            # msgpack-Datei bevorzugen; die JSON-Datei bleibt als
+            # Migrationspfad für Bestandsinstallationen lesbar
+            if msgpack is not None and os.path.exists(self.cache_file_msgpack):
+                with open(self.cache_file_msgpack, 'rb') as f:
+                    self.offline_cache = msgpack.unpackb(f.read())
+            elif os.path.exists(self.cache_file):
                 with open(self.cache_file, 'r') as f:
                     self.offline_cache = json.load(f)
-                    
-                # Cache-Gültigkeit prüfen
-                if self.offline_cache:
-                    cache_time = datetime.fromisoformat(self.offline_cache.get('timestamp', '1970-01-01'))
-                    if datetime.utcnow() - cache_time > timedelta(hours=24):
-                        self.offline_cache = None
+
+            # Cache-Gültigkeit prüfen
+            if self.offline_cache:
+                cache_time = datetime.fromisoformat(self.offline_cache.get('timestamp', '1970-01-01'))
+                if datetime.utcnow() - cache_time > timedelta(hours=24):
+                    self.offline_cache = None
                         
         except Exception as e:
             self.logger.error(f"Fehler beim Laden des Offline-Cache: {e}")
@@ -130,8 +191,12 @@ class LicenseManager:
                 "hardware_fingerprint": self.hardware_fingerprint
             }
             
-            with open(self.cache_file, 'w') as f:
-                json.dump(cache_data, f)
+            if msgpack is not None:
+                with open(self.cache_file_msgpack, 'wb') as f:
+                    f.write(msgpack.packb(cache_data))
+            else:
+                with open(self.cache_file, 'w') as f:
+                    json.dump(cache_data, f)
                 
         except Exception as e:
             self.logger.error(f"Fehler beim Speichern des Offline-Cache: {e}")
@@ -167,9 +232,10 @@ class LicenseManager:
                 hardware_fingerprint=self.hardware_fingerprint,
                 is_valid=True
             )
-            
+            self._rebuild_enabled_features()
+
             return True
-            
+
         except Exception as e:
             self.logger.error(f"Fehler bei Offline-Lizenz-Verifikation: {e}")
             return False
@@ -204,7 +270,8 @@ class LicenseManager:
                     hardware_fingerprint=self.hardware_fingerprint,
                     is_valid=True
                 )
-                
+                self._rebuild_enabled_features()
+
                 # Offline-Cache aktualisieren
                 self._save_offline_cache(license_data)
                 
@@ -238,16 +305,37 @@ class LicenseManager:
             hardware_fingerprint=self.hardware_fingerprint,
             is_valid=True
         )
-        
+        self._rebuild_enabled_features()
+
         self.logger.info("Trial-Lizenz aktiviert")
         return True
     
+    def _rebuild_enabled_features(self) -> None:
+        """Berechnet die Menge freigeschalteter Features neu (einmal pro
+        Lizenz-Refresh statt Listen-Scan + String-Vergleiche pro Aufruf)"""
+        info = self.license_info
+        if info is None:
+            self._enabled_features = frozenset()
+            self._expires_ts = 0.0
+            return
+
+        # expires_at kommt als naive UTC-Zeit aus dem Lizenz-Server
+        self._expires_ts = info.expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+        licensed = frozenset(info.features)
+        default_enabled = info.license_type in ('trial', 'basic')
+        self._enabled_features = frozenset(
+            name for name, gate in self.feature_gates.items()
+            if name in licensed or (default_enabled and gate.enabled)
+        )
+
     def is_licensed(self) -> bool:
-        """Prüft ob Lizenz gültig ist"""
+        """Prüft ob Lizenz gültig ist (Float-Vergleich gegen den beim
+        Refresh gecachten Ablauf-Timestamp)"""
         if not self.license_info:
             return self.verify_license()
-        
-        return self.license_info.is_valid and datetime.utcnow() < self.license_info.expires_at
+
+        return self.license_info.is_valid and time.time() < self._expires_ts
     
     def get_license_info(self) -> Optional[LicenseInfo]:
         """Gibt Lizenz-Informationen zurück"""
@@ -257,24 +345,9 @@ class LicenseManager:
         return self.license_info
     
     def is_feature_enabled(self, feature_name: str) -> bool:
-        """Prüft ob Feature aktiviert ist"""
-        if not self.is_licensed():
-            return False
-        
-        # Feature-Gate prüfen
-        feature_gate = self.feature_gates.get(feature_name)
-        if not feature_gate:
-            return False
-        
-        # Lizenz-Features prüfen
-        if self.license_info and feature_name in self.license_info.features:
-            return True
-        
-        # Standard-Features für Trial/Basic
-        if self.license_info and self.license_info.license_type in ['trial', 'basic']:
-            return feature_gate.enabled
-        
-        return False
+        """Prüft ob Feature aktiviert ist (vorberechnetes Set, siehe
+        _rebuild_enabled_features)"""
+        return self.is_licensed() and feature_name in self._enabled_features
     
     def get_feature_limit(self, feature_name: str) -> Optional[int]:
         """Gibt Feature-Limit zurück"""
@@ -322,13 +395,18 @@ class LicenseManager:
             "current_activations": self.license_info.current_activations
         }
 
-# Globale Lizenz-Manager Instanz
+# Globale Lizenz-Manager Instanz (Double-checked Locking, siehe app.mt5)
 license_manager: Optional[LicenseManager] = None
+_init_lock = threading.Lock()
 
 def init_license_manager(config: Config) -> None:
-    """Initialisiert den Lizenz-Manager"""
+    """Initialisiert den Lizenz-Manager (thread-sicher, einmalig)"""
     global license_manager
-    license_manager = LicenseManager(config)
+    if license_manager is not None:
+        return
+    with _init_lock:
+        if license_manager is None:
+            license_manager = LicenseManager(config)
 
 def get_license_manager() -> Optional[LicenseManager]:
     """Gibt den Lizenz-Manager zurück"""
@@ -3,18 +3,42 @@ Logging-Service für MT5 Flask Gateway
 Strukturierte Logs, Rotation und Archivierung
 """
 
+import array
+import atexit
 import json
 import logging
+import logging.handlers
+import mmap
 import os
+import re
+import queue
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from typing import Dict, Any, Optional, List
-from dataclasses import dataclass, asdict
+from logging.handlers import (QueueHandler, QueueListener,
+                              RotatingFileHandler, TimedRotatingFileHandler)
+from typing import Dict, Any, Optional, List, Tuple, Union
+from dataclasses import dataclass
 from app.config import Config
 
+# orjson serialisiert im C-Pfad (inkl. datetime) und ist auf dem
+# Formatter-Hot-Path ein Mehrfaches schneller als stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Parser für die Log-Suche: orjson.loads toleriert Whitespace und ist
+# auf dem Parse-Hot-Path ein Mehrfaches schneller als stdlib json
+_loads = orjson.loads if orjson is not None else json.loads
+
 @dataclass
 class LogEntry:
-    """Log-Eintrag"""
+    """Log-Eintrag (Schema der strukturierten Log-Zeilen; der Formatter
+    baut das Dict aus Performance-Gründen direkt aus dem Record)"""
     timestamp: datetime
     level: str
     logger: str
@@ -29,22 +53,240 @@ class LogEntry:
 class StructuredFormatter(logging.Formatter):
     """Strukturierter Log-Formatter"""
     
+    def format_bytes(self, record) -> bytes:
+        """Formatiert Log-Record direkt zu UTF-8-Bytes. Das Dict wird
+        direkt aus dem Record gebaut - kein LogEntry-Zwischenobjekt und
+        kein rekursives asdict-Deep-Copy (inkl. extra_data) pro
+        Log-Zeile. Der Byte-Pfad spart zudem den encode(), den ein
+        Text-Stream pro Zeile intern fahren würde."""
+        # Optionale Felder über record.__dict__.get - ein C-Dict-Lookup
+        # statt des getattr-Protokolls mit Default
+        rd = record.__dict__
+        payload = {
+            'timestamp': datetime.fromtimestamp(record.created),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'function': record.funcName,
+            'line': record.lineno,
+            'trace_id': rd.get('trace_id'),
+            'user_id': rd.get('user_id'),
+            'extra_data': rd.get('extra_data'),
+        }
+        if orjson is not None:
+            return orjson.dumps(payload, default=str)
+        return json.dumps(payload, default=str, ensure_ascii=False).encode('utf-8')
+
     def format(self, record):
-        """Formatiert Log-Record"""
-        log_entry = LogEntry(
-            timestamp=datetime.fromtimestamp(record.created),
-            level=record.levelname,
-            logger=record.name,
-            message=record.getMessage(),
-            module=record.module,
-            function=record.funcName,
-            line=record.lineno,
-            trace_id=getattr(record, 'trace_id', None),
-            user_id=getattr(record, 'user_id', None),
-            extra_data=getattr(record, 'extra_data', None)
-        )
-        
-        return json.dumps(asdict(log_entry), default=str, ensure_ascii=False)
+        """Formatiert Log-Record als String (Fallback-Pfad)"""
+        return self.format_bytes(record).decode('utf-8')
+
+# Eine geteilte Formatter-Instanz für alle File-Handler - der Formatter
+# ist zustandslos, drei Instanzen bringen nichts
+_STRUCTURED_FORMATTER = StructuredFormatter()
+
+# Ab dieser Dateigröße läuft die Log-Suche über den mmap-Schnellpfad
+_MMAP_MIN_SIZE = 8 << 20  # 8 MiB
+
+def _iter_log_lines(filepath: str):
+    """Iteriert eine Log-Datei zeilenweise mit großem Lesepuffer -
+    O(1)-Speicher statt readlines über die komplette Datei"""
+    with open(filepath, 'r', encoding='utf-8', buffering=1 << 20) as f:
+        yield from f
+
+def _iter_matching_lines_mmap(filepath: str, pattern):
+    """mmap-Schnellpfad für große Dateien: der Kandidaten-Scan läuft
+    als C-Regex direkt über den gemappten Puffer, dekodiert und
+    allokiert werden nur die Treffer-Zeilen - die 99 % nicht
+    passender Bytes erzeugen keine Python-Strings"""
+    fd = os.open(filepath, os.O_RDONLY)
+    try:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+            line_end = 0
+            for match in pattern.finditer(mm):
+                if match.start() < line_end:
+                    continue  # Zeile bereits geliefert
+                start = mm.rfind(b'\n', 0, match.start()) + 1
+                line_end = mm.find(b'\n', match.end())
+                if line_end == -1:
+                    line_end = len(mm)
+                yield mm[start:line_end].decode('utf-8', 'replace')
+    finally:
+        os.close(fd)
+
+def _scan_one(filepath: str, size: int, alternation: str,
+              start_date: Optional[datetime],
+              end_date: Optional[datetime]) -> List[Dict[str, Any]]:
+    """Durchsucht eine einzelne Log-Datei. Top-Level-Funktion, damit
+    der ProcessPoolExecutor sie über Prozessgrenzen picklen kann."""
+    results = []
+
+    if size >= _MMAP_MIN_SIZE:
+        line_iter = _iter_matching_lines_mmap(
+            filepath, re.compile(alternation.encode('utf-8'), re.IGNORECASE))
+        str_pattern = None  # mmap-Pfad liefert bereits nur Treffer
+    else:
+        line_iter = _iter_log_lines(filepath)
+        str_pattern = re.compile(alternation, re.IGNORECASE)
+
+    for line in line_iter:
+        # Billiger Regex-Vorfilter, bevor json.loads die Zeile anfasst
+        if str_pattern is not None and not str_pattern.search(line):
+            continue
+
+        try:
+            log_entry = _loads(line)
+        except ValueError:
+            # Nicht-JSON Zeilen ignorieren
+            continue
+
+        # Datum-Filter
+        if start_date or end_date:
+            log_time = datetime.fromisoformat(log_entry['timestamp'])
+            if start_date and log_time < start_date:
+                continue
+            if end_date and log_time > end_date:
+                continue
+
+        results.append(log_entry)
+
+    return results
+
+class _InvertedIndex:
+    """Session-gebundener invertierter Index: Token -> begrenzte Liste
+    von (Datei, Offset, Länge). Gefüttert wird er vom Listener-Thread
+    beim Batch-Flush; eine Suche über die jüngsten Zeilen wird damit
+    zum Dict-Lookup plus gezieltem pread statt eines Datei-Scans."""
+
+    _TOKEN_RE = re.compile(r'\w+')
+
+    def __init__(self, max_postings: int = 128):
+        self._postings: Dict[str, deque] = {}
+        self._max = max_postings
+        self._lock = threading.Lock()
+
+    def add_line(self, filepath: str, offset: int, length: int,
+                 text: str) -> None:
+        tokens = set(self._TOKEN_RE.findall(text.lower()))
+        if not tokens:
+            return
+        with self._lock:
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = deque(maxlen=self._max)
+                postings.append((filepath, offset, length))
+
+    def lookup(self, terms: List[str]) -> List[Tuple[str, int, int]]:
+        """Schneidet die Posting-Listen aller Begriffe"""
+        with self._lock:
+            posting_sets = [
+                set(self._postings.get(term.lower(), ()))
+                for term in terms
+            ]
+        if not posting_sets or not all(posting_sets):
+            return []
+        return sorted(set.intersection(*posting_sets))
+
+class _BatchingHandler(logging.handlers.BufferingHandler):
+    """Sammelt Records und schreibt sie gebündelt in den Ziel-Handler:
+    ein write(2) pro Batch statt pro Log-Zeile. Geflusht wird bei
+    vollem Puffer oder spätestens nach `interval` Sekunden (ein
+    Hintergrund-Thread im LoggingService stößt das periodisch an)."""
+
+    def __init__(self, target: logging.Handler, capacity: int = 8192,
+                 interval: float = 0.5,
+                 index: Optional[_InvertedIndex] = None):
+        super().__init__(capacity)
+        self.target = target
+        self.interval = interval
+        self.index = index
+        self.setLevel(target.level)
+        self._last_flush = time.monotonic()
+        # Inkrementelle Zähler für get_log_statistics: geschriebene
+        # Bytes und ausgelöste Rotationen seit Prozessstart
+        self.bytes_written = 0
+        self.rollovers = 0
+        # Der Formatter liefert bereits UTF-8-Bytes; der Ziel-Stream
+        # wird binär geöffnet, damit kein Text-Layer pro Zeile erneut
+        # encoden muss (Handler kommen mit delay=True, der Stream ist
+        # hier also noch nicht offen)
+        if isinstance(target, logging.FileHandler):
+            target.mode = 'ab'
+            target.encoding = None
+        # Wiederverwendeter Scratch-Puffer für den Batch-Zusammenbau -
+        # eine Allokation pro Flush statt pro Record (nur der
+        # Listener-Thread flusht, ein Puffer genügt)
+        self._scratch = bytearray()
+
+    def shouldFlush(self, record) -> bool:
+        return (len(self.buffer) >= self.capacity
+                or time.monotonic() - self._last_flush > self.interval)
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            if not self.buffer:
+                self._last_flush = time.monotonic()
+                return
+            records = self.buffer
+            self.buffer = []
+        finally:
+            self.release()
+
+        target = self.target
+        to_bytes = getattr(target.formatter, 'format_bytes', None)
+        line_lengths: List[int] = []
+        if to_bytes is not None:
+            chunk = self._scratch
+            chunk.clear()
+            for record in records:
+                encoded = to_bytes(record)
+                chunk += encoded
+                chunk += b'\n'
+                line_lengths.append(len(encoded) + 1)
+        else:
+            encoded_lines = [
+                (target.format(record) + '\n').encode('utf-8')
+                for record in records
+            ]
+            line_lengths = [len(line) for line in encoded_lines]
+            chunk = b''.join(encoded_lines)
+        target.acquire()
+        try:
+            if target.stream is None:
+                target.stream = target._open()
+            # Rotation einmal pro Batch prüfen (letzter Record als Maß)
+            if hasattr(target, 'shouldRollover') and target.shouldRollover(records[-1]):
+                target.doRollover()
+                self.rollovers += 1
+            offset = target.stream.tell()
+            target.stream.write(chunk)
+            target.stream.flush()
+            self.bytes_written += len(chunk)
+            # Index auf dem Listener-Thread füttern - Request-Threads
+            # zahlen fürs Tokenisieren nichts
+            if self.index is not None:
+                filepath = target.baseFilename
+                for record, length in zip(records, line_lengths):
+                    self.index.add_line(filepath, offset, length,
+                                        record.getMessage())
+                    offset += length
+        except Exception:
+            target.handleError(records[-1])
+        finally:
+            target.release()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self.target.close()
+            super().close()
 
 class LoggingService:
     """Logging-Service"""
@@ -56,58 +298,95 @@ class LoggingService:
         self.log_file = os.path.join(self.log_dir, "mt5_gateway.log")
         self.audit_log_file = os.path.join(self.log_dir, "audit.log")
         self.error_log_file = os.path.join(self.log_dir, "error.log")
-        
+        # Datei-Liste mit kurzer TTL: pollende UI-Aufrufer teilen sich
+        # einen Verzeichnis-Scan statt pro Aufruf listdir+stat zu zahlen
+        self._files_cache: Tuple[float, List[Dict[str, Any]]] = (0.0, [])
+        self._files_cache_ttl = 2.0
+        # Zeilen-Offset-Index pro Log-Datei für Tail-Reads in O(lines):
+        # (mtime, Größe) -> array('Q') der Zeilenanfänge
+        self._offset_index: Dict[str, Tuple[Tuple[float, int], array.array]] = {}
+        # Statistik-Baseline (Dateien, Bytes) aus einem Scan plus
+        # Zähler-Schnappschuss; get_log_statistics rechnet inkrementell
+        self._stats_baseline: Optional[Tuple[int, int]] = None
+        self._stats_snapshot: Tuple[int, int] = (0, 0)
+        self._batching_handlers: List[_BatchingHandler] = []
+        # Invertierter Index über die jüngsten Zeilen des Haupt-Logs;
+        # search_recent_logs wird damit zum Lookup statt Datei-Scan
+        self._search_index = _InvertedIndex()
+
+
         # Log-Verzeichnis erstellen
         os.makedirs(self.log_dir, exist_ok=True)
-        
+
         # Logging konfigurieren
         self._setup_logging()
+
+        # Die Fach-Logger einmal auflösen statt pro log_*-Aufruf durch
+        # getLogger (Manager-Lock + Dict-Lookup) zu gehen
+        self._audit_logger = logging.getLogger('audit')
+        self._error_logger = logging.getLogger('error')
+        self._trading_logger = logging.getLogger('trading')
+        self._api_logger = logging.getLogger('api')
     
     def _setup_logging(self) -> None:
-        """Konfiguriert Logging"""
+        """Konfiguriert Logging. Die File-Handler hängen hinter einem
+        QueueHandler: der loggende Thread zahlt nur ein queue.put, das
+        Formatieren, Schreiben und Rotieren übernimmt ein
+        QueueListener-Thread - Trading- und API-Hot-Paths blockieren
+        nicht mehr auf Datei-I/O."""
         try:
             # Root Logger konfigurieren
             root_logger = logging.getLogger()
             root_logger.setLevel(getattr(logging, self.config.LOG_LEVEL.upper()))
-            
+
             # Bestehende Handler entfernen
             for handler in root_logger.handlers[:]:
                 root_logger.removeHandler(handler)
-            
+
             # Haupt-Log-Handler
             main_handler = RotatingFileHandler(
                 self.log_file,
                 maxBytes=self.config.MAX_LOG_SIZE,
                 backupCount=self.config.BACKUP_COUNT,
-                encoding='utf-8'
+                encoding='utf-8',
+                delay=True
             )
-            main_handler.setFormatter(StructuredFormatter())
+            main_handler.setFormatter(_STRUCTURED_FORMATTER)
             main_handler.setLevel(logging.INFO)
-            root_logger.addHandler(main_handler)
-            
+
             # Error-Log-Handler
             error_handler = RotatingFileHandler(
                 self.error_log_file,
                 maxBytes=self.config.MAX_LOG_SIZE,
                 backupCount=self.config.BACKUP_COUNT,
-                encoding='utf-8'
+                encoding='utf-8',
+                delay=True
             )
-            error_handler.setFormatter(StructuredFormatter())
+            error_handler.setFormatter(_STRUCTURED_FORMATTER)
             error_handler.setLevel(logging.ERROR)
-            root_logger.addHandler(error_handler)
-            
+
             # Audit-Log-Handler
             audit_handler = TimedRotatingFileHandler(
                 self.audit_log_file,
                 when='midnight',
                 interval=1,
                 backupCount=30,
-                encoding='utf-8'
+                encoding='utf-8',
+                delay=True
             )
-            audit_handler.setFormatter(StructuredFormatter())
+            audit_handler.setFormatter(_STRUCTURED_FORMATTER)
             audit_handler.setLevel(logging.INFO)
-            root_logger.addHandler(audit_handler)
-            
+
+            # File-Handler hinter Batch-Puffern: viele kleine write(2)
+            # werden zu wenigen großen gebündelt
+            batching_handlers = [
+                _BatchingHandler(main_handler, index=self._search_index),
+                _BatchingHandler(error_handler),
+                _BatchingHandler(audit_handler),
+            ]
+            self._batching_handlers = batching_handlers
+            sink_handlers = list(batching_handlers)
+
             # Console-Handler für Development
             if self.config.LOG_LEVEL.upper() == 'DEBUG':
                 console_handler = logging.StreamHandler()
@@ -115,10 +394,35 @@ class LoggingService:
                     '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
                 ))
                 console_handler.setLevel(logging.DEBUG)
-                root_logger.addHandler(console_handler)
-            
+                sink_handlers.append(console_handler)
+
+            # Nur der QueueHandler hängt am Root-Logger; der Listener
+            # bedient die eigentlichen Handler auf einem eigenen Thread
+            # und wird beim Shutdown geordnet entleert
+            self._log_queue: queue.Queue = queue.Queue(-1)
+            root_logger.addHandler(QueueHandler(self._log_queue))
+            self._listener = QueueListener(
+                self._log_queue, *sink_handlers, respect_handler_level=True
+            )
+            self._listener.start()
+            atexit.register(self._listener.stop)
+
+            # Periodischer Flush, damit Puffer auch bei ruhigem
+            # Log-Aufkommen spätestens nach 500 ms auf Disk landen
+            def _flush_loop() -> None:
+                while True:
+                    time.sleep(0.5)
+                    for handler in batching_handlers:
+                        try:
+                            handler.flush()
+                        except Exception:
+                            pass  # Flush-Thread darf nie sterben
+
+            threading.Thread(target=_flush_loop, name='log-flush',
+                             daemon=True).start()
+
             self.logger.info("Logging konfiguriert")
-            
+
         except Exception as e:
             print(f"Fehler bei Logging-Konfiguration: {e}")
     
@@ -129,8 +433,12 @@ class LoggingService:
     def log_audit(self, action: str, details: Dict[str, Any], 
                   trace_id: Optional[str] = None, user_id: Optional[str] = None) -> None:
         """Audit-Log"""
-        audit_logger = logging.getLogger('audit')
-        
+        audit_logger = self._audit_logger
+        # Level-Check vor der Dict-Allokation - ist INFO aus, kostet
+        # der Aufruf nur den isEnabledFor-Lookup
+        if not audit_logger.isEnabledFor(logging.INFO):
+            return
+
         # Extra-Daten hinzufügen
         extra_data = {
             'action': action,
@@ -138,14 +446,16 @@ class LoggingService:
             'trace_id': trace_id,
             'user_id': user_id
         }
-        
-        audit_logger.info(f"AUDIT: {action}", extra={'extra_data': extra_data})
+
+        audit_logger.info("AUDIT: %s", action, extra={'extra_data': extra_data})
     
     def log_error(self, error: Exception, context: Dict[str, Any] = None,
                   trace_id: Optional[str] = None, user_id: Optional[str] = None) -> None:
         """Error-Log"""
-        error_logger = logging.getLogger('error')
-        
+        error_logger = self._error_logger
+        if not error_logger.isEnabledFor(logging.ERROR):
+            return
+
         extra_data = {
             'error_type': type(error).__name__,
             'error_message': str(error),
@@ -153,28 +463,33 @@ class LoggingService:
             'trace_id': trace_id,
             'user_id': user_id
         }
-        
-        error_logger.error(f"ERROR: {error}", extra={'extra_data': extra_data})
+
+        error_logger.error("ERROR: %s", error, extra={'extra_data': extra_data})
     
     def log_trading_event(self, event_type: str, symbol: str, 
                          details: Dict[str, Any], trace_id: Optional[str] = None) -> None:
         """Trading-Event-Log"""
-        trading_logger = logging.getLogger('trading')
-        
+        trading_logger = self._trading_logger
+        if not trading_logger.isEnabledFor(logging.INFO):
+            return
+
         extra_data = {
             'event_type': event_type,
             'symbol': symbol,
             'details': details,
             'trace_id': trace_id
         }
-        
-        trading_logger.info(f"TRADING: {event_type} - {symbol}", extra={'extra_data': extra_data})
+
+        trading_logger.info("TRADING: %s - %s", event_type, symbol,
+                            extra={'extra_data': extra_data})
     
     def log_api_request(self, method: str, endpoint: str, status_code: int,
                        response_time: float, trace_id: Optional[str] = None) -> None:
         """API-Request-Log"""
-        api_logger = logging.getLogger('api')
-        
+        api_logger = self._api_logger
+        if not api_logger.isEnabledFor(logging.INFO):
+            return
+
         extra_data = {
             'method': method,
             'endpoint': endpoint,
@@ -182,137 +497,287 @@ class LoggingService:
             'response_time': response_time,
             'trace_id': trace_id
         }
-        
-        api_logger.info(f"API: {method} {endpoint} - {status_code}", extra={'extra_data': extra_data})
+
+        api_logger.info("API: %s %s - %d", method, endpoint, status_code,
+                        extra={'extra_data': extra_data})
     
     def get_log_files(self) -> List[Dict[str, Any]]:
-        """Gibt verfügbare Log-Dateien zurück"""
+        """Gibt verfügbare Log-Dateien zurück (2-Sekunden-TTL-Cache;
+        scandir liefert die stat-Infos aus dem Verzeichnis-Eintrag mit)"""
+        cached_at, cached = self._files_cache
+        if time.monotonic() - cached_at < self._files_cache_ttl:
+            return cached
+
         log_files = []
-        
+
         try:
-            for filename in os.listdir(self.log_dir):
-                if filename.endswith('.log'):
-                    filepath = os.path.join(self.log_dir, filename)
-                    stat = os.stat(filepath)
-                    
+            with os.scandir(self.log_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.log'):
+                        continue
+                    stat = entry.stat()
+
                     log_files.append({
-                        'filename': filename,
-                        'filepath': filepath,
+                        'filename': entry.name,
+                        'filepath': entry.path,
                         'size': stat.st_size,
+                        # Roher Float für Vergleiche und Sortierung;
+                        # die ISO-Strings bleiben für die UI
+                        'mtime': stat.st_mtime,
                         'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
                         'created': datetime.fromtimestamp(stat.st_ctime).isoformat()
                     })
-            
-            # Nach Änderungsdatum sortieren
-            log_files.sort(key=lambda x: x['modified'], reverse=True)
-            
+
+            # Nach Änderungsdatum sortieren (Float- statt String-Vergleich)
+            log_files.sort(key=lambda x: x['mtime'], reverse=True)
+            self._files_cache = (time.monotonic(), log_files)
+
         except Exception as e:
             self.logger.error(f"Fehler beim Abrufen der Log-Dateien: {e}")
-        
+
         return log_files
     
+    def _get_line_offsets(self, filepath: str) -> array.array:
+        """Liefert die Byte-Offsets aller Zeilenanfänge einer Log-Datei.
+        Lazy per mmap gebaut, im Prozess gecacht und als .idx-Datei
+        persistiert (invalide, sobald mtime oder Größe abweichen) -
+        Restarts scannen die Datei nicht erneut."""
+        st = os.stat(filepath)
+        stamp = (st.st_mtime, st.st_size)
+        cached = self._offset_index.get(filepath)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        idx_file = filepath + '.idx'
+        offsets: Optional[array.array] = None
+        try:
+            with open(idx_file, 'rb') as f:
+                mtime, size = struct.unpack('<dQ', f.read(16))
+                if mtime == st.st_mtime and size == st.st_size:
+                    offsets = array.array('Q')
+                    offsets.frombytes(f.read())
+        except (OSError, struct.error):
+            offsets = None
+
+        if offsets is None:
+            offsets = array.array('Q', [0])
+            if st.st_size:
+                with open(filepath, 'rb') as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    pos = mm.find(b'\n')
+                    while pos != -1:
+                        offsets.append(pos + 1)
+                        pos = mm.find(b'\n', pos + 1)
+
+            # Index atomar persistieren; Fehler sind unkritisch
+            try:
+                tmp_file = idx_file + '.tmp'
+                with open(tmp_file, 'wb') as f:
+                    f.write(struct.pack('<dQ', st.st_mtime, st.st_size))
+                    f.write(offsets.tobytes())
+                os.replace(tmp_file, idx_file)
+            except OSError:
+                pass
+
+        self._offset_index[filepath] = (stamp, offsets)
+        return offsets
+
     def read_log_file(self, filename: str, lines: int = 100) -> List[str]:
-        """Liest Log-Datei"""
+        """Liest die letzten N Zeilen einer Log-Datei. Große Dateien
+        springen über den Offset-Index direkt an den Tail (ein Seek plus
+        N Zeilen), kleine werden per deque gestreamt."""
         try:
             filepath = os.path.join(self.log_dir, filename)
-            
+
             if not os.path.exists(filepath):
                 return []
-            
-            with open(filepath, 'r', encoding='utf-8') as f:
-                all_lines = f.readlines()
-                
-            # Letzte N Zeilen
-            return all_lines[-lines:] if lines > 0 else all_lines
-            
+
+            if lines > 0 and os.path.getsize(filepath) >= _MMAP_MIN_SIZE:
+                offsets = self._get_line_offsets(filepath)
+                # Der Index trägt nach jedem '\n' einen Offset ein; bei
+                # newline-terminierten Dateien ist der letzte Eintrag
+                # also EOF, kein Zeilenanfang. Darum lines+1 Einträge
+                # zurückspringen - der [-lines:]-Slice unten trimmt die
+                # überzählige Zeile bei unterminierten Dateien
+                start = offsets[-(lines + 1)] if len(offsets) > lines + 1 else 0
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    f.seek(start)
+                    return f.readlines()[-lines:]
+
+            return list(deque(_iter_log_lines(filepath), maxlen=lines))
+
         except Exception as e:
             self.logger.error(f"Fehler beim Lesen der Log-Datei {filename}: {e}")
             return []
     
-    def search_logs(self, query: str, log_type: str = "all", 
+    def search_logs(self, query: Union[str, List[str]], log_type: str = "all",
                    start_date: Optional[datetime] = None,
                    end_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
-        """Durchsucht Logs"""
+        """Durchsucht Logs (gestreamt: Zeilen laufen einzeln durch den
+        Filter statt die Datei komplett in den Speicher zu laden).
+
+        query darf auch eine Liste von Suchbegriffen sein; alle Begriffe
+        werden einmal zu einem case-insensitiven Alternations-Regex
+        kompiliert - ein C-Scan pro Zeile statt lower()-Kopie und
+        Substring-Suche pro Begriff."""
         results = []
-        
+        queries = [query] if isinstance(query, str) else list(query)
+        alternation = '|'.join(map(re.escape, queries))
+
         try:
-            log_files = self.get_log_files()
-            
-            for log_file in log_files:
-                if log_type != "all" and log_type not in log_file['filename']:
-                    continue
-                
-                lines = self.read_log_file(log_file['filename'], 0)
-                
-                for line in lines:
-                    try:
-                        log_entry = json.loads(line.strip())
-                        
-                        # Datum-Filter
-                        if start_date or end_date:
-                            log_time = datetime.fromisoformat(log_entry['timestamp'])
-                            if start_date and log_time < start_date:
-                                continue
-                            if end_date and log_time > end_date:
-                                continue
-                        
-                        # Query-Filter
-                        if query.lower() in line.lower():
-                            results.append({
-                                'log_file': log_file['filename'],
-                                'log_entry': log_entry
-                            })
-                            
-                    except json.JSONDecodeError:
-                        # Nicht-JSON Zeilen ignorieren
-                        continue
-            
+            targets = [
+                log_file for log_file in self.get_log_files()
+                if log_type == "all" or log_type in log_file['filename']
+            ]
+
+            # Mehrere Dateien parallel scannen: Regex und JSON-Parse
+            # halten den GIL, also Prozesse statt Threads
+            if len(targets) > 1:
+                workers = min(len(targets), os.cpu_count() or 1)
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    futures = {
+                        pool.submit(_scan_one, log_file['filepath'],
+                                    log_file['size'], alternation,
+                                    start_date, end_date): log_file['filename']
+                        for log_file in targets
+                    }
+                    for future in as_completed(futures):
+                        filename = futures[future]
+                        results.extend(
+                            {'log_file': filename, 'log_entry': entry}
+                            for entry in future.result()
+                        )
+            else:
+                for log_file in targets:
+                    results.extend(
+                        {'log_file': log_file['filename'], 'log_entry': entry}
+                        for entry in _scan_one(log_file['filepath'],
+                                               log_file['size'], alternation,
+                                               start_date, end_date)
+                    )
+
             # Nach Zeitstempel sortieren
             results.sort(key=lambda x: x['log_entry']['timestamp'], reverse=True)
-            
+
         except Exception as e:
             self.logger.error(f"Fehler bei Log-Suche: {e}")
-        
+
         return results
     
+    def search_recent_logs(self, query: str) -> List[Dict[str, Any]]:
+        """Durchsucht die jüngsten Zeilen über den invertierten Index:
+        Posting-Listen schneiden, dann nur die Treffer-Zeilen per pread
+        lesen - kein Datei-Scan. Der Index ist session-gebunden und
+        begrenzt; für historische oder rotierte Logs bleibt search_logs
+        zuständig."""
+        terms = _InvertedIndex._TOKEN_RE.findall(query)
+        if not terms:
+            return []
+
+        results = []
+        fds: Dict[str, int] = {}
+        try:
+            for filepath, offset, length in self._search_index.lookup(terms):
+                fd = fds.get(filepath)
+                if fd is None:
+                    try:
+                        fd = fds[filepath] = os.open(filepath, os.O_RDONLY)
+                    except OSError:
+                        continue
+                line = os.pread(fd, length, offset).decode('utf-8', 'replace')
+                try:
+                    log_entry = _loads(line)
+                except ValueError:
+                    continue
+                results.append({
+                    'log_file': os.path.basename(filepath),
+                    'log_entry': log_entry
+                })
+        finally:
+            for fd in fds.values():
+                os.close(fd)
+
+        results.sort(key=lambda x: x['log_entry']['timestamp'], reverse=True)
+        return results
+
     def cleanup_old_logs(self, days: int = 30) -> int:
         """Bereinigt alte Log-Dateien"""
         cleaned_count = 0
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
-        
+        # Cutoff einmal als Epoch-Float; der Vergleich pro Datei ist dann
+        # ein Float-Compare statt eines fromisoformat-Roundtrips
+        cutoff_ts = (datetime.now() - timedelta(days=days)).timestamp()
+
         try:
-            log_files = self.get_log_files()
-            
-            for log_file in log_files:
-                file_date = datetime.fromisoformat(log_file['modified'])
-                
-                if file_date < cutoff_date:
-                    try:
-                        os.remove(log_file['filepath'])
-                        cleaned_count += 1
-                        self.logger.info(f"Alte Log-Datei gelöscht: {log_file['filename']}")
-                    except Exception as e:
-                        self.logger.error(f"Fehler beim Löschen der Log-Datei {log_file['filename']}: {e}")
-            
+            # Opfer erst einsammeln, dann in einer engen Schleife
+            # unlinken - ein Summary-Log am Ende statt eines Log-Emits
+            # (inkl. kompletter Handler-Kette) pro gelöschter Datei
+            victims = [
+                log_file for log_file in self.get_log_files()
+                if log_file['mtime'] < cutoff_ts
+            ]
+
+            for victim in victims:
+                try:
+                    os.unlink(victim['filepath'])
+                    cleaned_count += 1
+                except OSError:
+                    continue
+                # Zugehörigen Offset-Index gleich mit entsorgen
+                try:
+                    os.unlink(victim['filepath'] + '.idx')
+                except OSError:
+                    pass
+                self._offset_index.pop(victim['filepath'], None)
+
+            if cleaned_count:
+                # Datei-Cache invalidieren, der nächste Aufruf scannt neu
+                self._files_cache = (0.0, [])
+                self.logger.info("Log-Bereinigung: %d alte Dateien entfernt",
+                                 cleaned_count)
+
         except Exception as e:
             self.logger.error(f"Fehler bei Log-Bereinigung: {e}")
-        
+
         return cleaned_count
     
-    def get_log_statistics(self) -> Dict[str, Any]:
-        """Gibt Log-Statistiken zurück"""
+    def _counter_totals(self) -> Tuple[int, int]:
+        """Summiert Bytes und Rotationen über die Batch-Handler"""
+        handlers = getattr(self, '_batching_handlers', [])
+        return (sum(h.bytes_written for h in handlers),
+                sum(h.rollovers for h in handlers))
+
+    def get_log_statistics(self, refresh: bool = False) -> Dict[str, Any]:
+        """Gibt Log-Statistiken zurück. Der Normalfall rechnet aus einer
+        einmal gescannten Baseline plus den Handler-Zählern (O(1), keine
+        Syscalls pro Poll); refresh=True erzwingt einen neuen
+        Verzeichnis-Scan und setzt die Baseline neu."""
         try:
-            log_files = self.get_log_files()
-            total_size = sum(log_file['size'] for log_file in log_files)
-            
+            if refresh or self._stats_baseline is None:
+                self._files_cache = (0.0, [])
+                log_files = self.get_log_files()
+                self._stats_baseline = (
+                    len(log_files),
+                    sum(log_file['size'] for log_file in log_files)
+                )
+                self._stats_snapshot = self._counter_totals()
+            else:
+                log_files = self._files_cache[1]
+
+            base_files, base_size = self._stats_baseline
+            snap_bytes, snap_rolls = self._stats_snapshot
+            cur_bytes, cur_rolls = self._counter_totals()
+
+            total_size = base_size + (cur_bytes - snap_bytes)
+            total_files = base_files + (cur_rolls - snap_rolls)
+
             return {
-                'total_files': len(log_files),
+                'total_files': total_files,
                 'total_size_bytes': total_size,
                 'total_size_mb': round(total_size / (1024 * 1024), 2),
                 'log_files': log_files,
                 'log_directory': self.log_dir
             }
-            
+
         except Exception as e:
             self.logger.error(f"Fehler bei Log-Statistiken: {e}")
             return {}
@@ -6,12 +6,20 @@ Persistente App-Einstellungen und Konfigurationsverwaltung
 import json
 import logging
 import os
+import threading
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass, asdict
 from app.config import Config
 
-@dataclass
+# orjson liest und schreibt die Settings-Datei im C-Pfad; ohne
+# Installation bleibt stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+@dataclass(slots=True)
 class AppSettings:
     """App-Einstellungen"""
     mt5_server: str
@@ -44,6 +52,16 @@ class SettingsManager:
         self.logger = logging.getLogger(__name__)
         self.settings_file = "app_settings.json"
         self.settings: Optional[AppSettings] = None
+        # Koaleszierte Speicherung: viele set_setting-Aufrufe in Folge
+        # werden zu einem Disk-Write zusammengefasst
+        self._save_lock = threading.Lock()
+        self._save_timer: Optional[threading.Timer] = None
+        # Memoisierte Dict-Sicht der Settings: asdict läuft einmal pro
+        # Mutation statt pro Save/Export/Summary-Aufruf
+        self._settings_dict: Optional[Dict[str, Any]] = None
+        # Monoton steigende Versionsnummer pro Mutation - Routen können
+        # darauf ETags und Response-Caches aufbauen
+        self.version = 0
         
         # Standard-Einstellungen
         self.default_settings = AppSettings(
@@ -77,44 +95,63 @@ class SettingsManager:
         """Lädt Einstellungen aus Datei"""
         try:
             if os.path.exists(self.settings_file):
-                with open(self.settings_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
+                if orjson is not None:
+                    with open(self.settings_file, 'rb') as f:
+                        data = orjson.loads(f.read())
+                else:
+                    with open(self.settings_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
                 
                 # Datetime-Objekte konvertieren
                 data['created_at'] = datetime.fromisoformat(data['created_at'])
                 data['updated_at'] = datetime.fromisoformat(data['updated_at'])
                 
                 self.settings = AppSettings(**data)
+                self._rebuild_dict()
                 self.logger.info("Einstellungen geladen")
             else:
                 self.settings = self.default_settings
                 self.save_settings()
                 self.logger.info("Standard-Einstellungen erstellt")
-                
+
         except Exception as e:
             self.logger.error(f"Fehler beim Laden der Einstellungen: {e}")
             self.settings = self.default_settings
+            self._rebuild_dict()
     
+    def _rebuild_dict(self) -> None:
+        """Baut die memoisierte Dict-Sicht neu (Datetime-Felder bereits
+        ISO-formatiert)"""
+        data = asdict(self.settings)
+        data['created_at'] = self.settings.created_at.isoformat()
+        data['updated_at'] = self.settings.updated_at.isoformat()
+        self._settings_dict = data
+        self.version += 1
+
     def save_settings(self) -> bool:
         """Speichert Einstellungen in Datei"""
         try:
             if not self.settings:
                 return False
-            
-            # Aktualisierungszeit setzen
+
+            # Aktualisierungszeit setzen und Dict-Sicht auffrischen
             self.settings.updated_at = datetime.utcnow()
-            
-            # In Dictionary konvertieren
-            data = asdict(self.settings)
-            
-            # Datetime-Objekte konvertieren
-            data['created_at'] = self.settings.created_at.isoformat()
-            data['updated_at'] = self.settings.updated_at.isoformat()
-            
-            # Speichern
-            with open(self.settings_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            
+            self._rebuild_dict()
+            data = self._settings_dict
+
+            # Kompakt serialisieren (die Datei wird nur von Maschinen
+            # gelesen) und atomar über eine Temp-Datei ersetzen - ein
+            # Crash mitten im Write korrumpiert die Settings nicht
+            if orjson is not None:
+                payload = orjson.dumps(data)
+            else:
+                payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+            tmp_file = self.settings_file + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_file, self.settings_file)
+
             self.logger.info("Einstellungen gespeichert")
             return True
             
@@ -122,6 +159,23 @@ class SettingsManager:
             self.logger.error(f"Fehler beim Speichern der Einstellungen: {e}")
             return False
     
+    def _schedule_save(self) -> bool:
+        """Plant eine koaleszierte Speicherung in 100 ms: wer in einer
+        Schleife mehrere Einstellungen setzt, erzeugt einen Disk-Write
+        statt N komplette Datei-Rewrites"""
+        with self._save_lock:
+            if self._save_timer is None:
+                timer = threading.Timer(0.1, self._flush_save)
+                timer.daemon = True
+                timer.start()
+                self._save_timer = timer
+        return True
+
+    def _flush_save(self) -> None:
+        with self._save_lock:
+            self._save_timer = None
+        self.save_settings()
+
     def get_settings(self) -> AppSettings:
         """Gibt aktuelle Einstellungen zurück"""
         if not self.settings:
@@ -147,9 +201,10 @@ class SettingsManager:
             for key, value in kwargs.items():
                 if key in allowed_fields and hasattr(self.settings, key):
                     setattr(self.settings, key, value)
-            
-            # Speichern
-            return self.save_settings()
+            self._rebuild_dict()
+
+            # Speichern (koalesziert)
+            return self._schedule_save()
             
         except Exception as e:
             self.logger.error(f"Fehler beim Aktualisieren der Einstellungen: {e}")
@@ -180,7 +235,8 @@ class SettingsManager:
             
             if hasattr(self.settings, key):
                 setattr(self.settings, key, value)
-                return self.save_settings()
+                self._rebuild_dict()
+                return self._schedule_save()
             
             return False
             
@@ -189,15 +245,14 @@ class SettingsManager:
             return False
     
     def export_settings(self) -> Dict[str, Any]:
-        """Exportiert Einstellungen"""
+        """Exportiert Einstellungen (flache Kopie der memoisierten
+        Dict-Sicht statt eines asdict-Laufs pro Aufruf)"""
         if not self.settings:
             self.load_settings()
-        
-        data = asdict(self.settings)
-        data['created_at'] = self.settings.created_at.isoformat()
-        data['updated_at'] = self.settings.updated_at.isoformat()
-        
-        return data
+        if self._settings_dict is None:
+            self._rebuild_dict()
+
+        return dict(self._settings_dict)
     
     def import_settings(self, data: Dict[str, Any]) -> bool:
         """Importiert Einstellungen"""
@@ -4,13 +4,14 @@ Zahlungsabwicklung und Abonnement-Management
 """
 
 import logging
-import stripe
+import threading
+import types
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 from dataclasses import dataclass
 from app.config import Config
 
-@dataclass
+@dataclass(slots=True)
 class StripeCustomer:
     """Stripe-Kunde"""
     customer_id: str
@@ -18,7 +19,7 @@ class StripeCustomer:
     name: str
     created_at: datetime
 
-@dataclass
+@dataclass(slots=True)
 class StripeSubscription:
     """Stripe-Abonnement"""
     subscription_id: str
@@ -31,17 +32,34 @@ class StripeSubscription:
 
 class StripeService:
     """Stripe-Service für Zahlungsabwicklung"""
-    
+
+    # Event-Typ -> Handler-Methode; Dict-Lookup statt if/elif-Kette
+    # im Webhook-Hot-Path
+    _HANDLERS = {
+        'checkout.session.completed': '_handle_checkout_completed',
+        'customer.subscription.created': '_handle_subscription_created',
+        'customer.subscription.updated': '_handle_subscription_updated',
+        'customer.subscription.deleted': '_handle_subscription_deleted',
+        'invoice.payment_succeeded': '_handle_payment_succeeded',
+        'invoice.payment_failed': '_handle_payment_failed',
+    }
+
     def __init__(self, config: Config):
         self.config = config
         self.logger = logging.getLogger(__name__)
-        
-        # Stripe konfigurieren
+
+        # Stripe konfigurieren. Das SDK wird erst hier importiert -
+        # Deployments ohne Stripe zahlen den Import-Graphen (urllib3,
+        # certifi, ...) beim Kaltstart nicht
+        import stripe
+        self._stripe = stripe
         stripe.api_key = config.STRIPE_SECRET_KEY
         self.webhook_secret = config.STRIPE_WEBHOOK_SECRET
         
-        # Verfügbare Pläne
-        self.plans = {
+        # Verfügbare Pläne (read-only View - die Tabelle ist statisch und
+        # wird von Checkout-Templates referenziert, versehentliche
+        # Mutationen würden sonst still durchschlagen)
+        self.plans = types.MappingProxyType({
             'basic': {
                 'name': 'Basic',
                 'price': 9900,  # €99.00 in Cent
@@ -63,12 +81,32 @@ class StripeService:
                 'interval': 'month',
                 'features': ['unlimited_orders', 'all_strategies', 'white_label', '24_7_support']
             }
+        })
+
+        # Line-Item-Struktur pro Plan einmal vorbauen; pro Checkout wird
+        # nur noch referenziert statt das verschachtelte Dict neu aufzubauen
+        self._line_item_templates = {
+            plan_id: [{
+                'price_data': {
+                    'currency': plan['currency'],
+                    'product_data': {
+                        'name': f"MT5 Gateway {plan['name']}",
+                        'description': f"{plan['name']} Lizenz für MT5 Flask Gateway"
+                    },
+                    'unit_amount': plan['price'],
+                    'recurring': {
+                        'interval': plan['interval']
+                    }
+                },
+                'quantity': 1,
+            }]
+            for plan_id, plan in self.plans.items()
         }
-    
+
     def create_customer(self, email: str, name: str) -> Optional[StripeCustomer]:
         """Erstellt Stripe-Kunde"""
         try:
-            customer = stripe.Customer.create(
+            customer = self._stripe.Customer.create(
                 email=email,
                 name=name,
                 metadata={
@@ -84,7 +122,7 @@ class StripeService:
                 created_at=datetime.fromtimestamp(customer.created)
             )
             
-        except stripe.error.StripeError as e:
+        except self._stripe.error.StripeError as e:
             self.logger.error(f"Fehler beim Erstellen des Stripe-Kunden: {e}")
             return None
     
@@ -92,27 +130,14 @@ class StripeService:
                                success_url: str, cancel_url: str) -> Optional[str]:
         """Erstellt Checkout-Session"""
         try:
-            plan = self.plans.get(plan_id)
-            if not plan:
+            line_items = self._line_item_templates.get(plan_id)
+            if not line_items:
                 return None
-            
-            session = stripe.checkout.Session.create(
+
+            session = self._stripe.checkout.Session.create(
                 customer=customer_id,
                 payment_method_types=['card'],
-                line_items=[{
-                    'price_data': {
-                        'currency': plan['currency'],
-                        'product_data': {
-                            'name': f"MT5 Gateway {plan['name']}",
-                            'description': f"{plan['name']} Lizenz für MT5 Flask Gateway"
-                        },
-                        'unit_amount': plan['price'],
-                        'recurring': {
-                            'interval': plan['interval']
-                        }
-                    },
-                    'quantity': 1,
-                }],
+                line_items=line_items,
                 mode='subscription',
                 success_url=success_url,
                 cancel_url=cancel_url,
@@ -124,14 +149,14 @@ class StripeService:
             
             return session.url
             
-        except stripe.error.StripeError as e:
+        except self._stripe.error.StripeError as e:
             self.logger.error(f"Fehler beim Erstellen der Checkout-Session: {e}")
             return None
     
     def get_subscription(self, subscription_id: str) -> Optional[StripeSubscription]:
         """Ruft Abonnement ab"""
         try:
-            subscription = stripe.Subscription.retrieve(subscription_id)
+            subscription = self._stripe.Subscription.retrieve(subscription_id)
             
             return StripeSubscription(
                 subscription_id=subscription.id,
@@ -143,7 +168,7 @@ class StripeService:
                 cancel_at_period_end=subscription.cancel_at_period_end
             )
             
-        except stripe.error.StripeError as e:
+        except self._stripe.error.StripeError as e:
             self.logger.error(f"Fehler beim Abrufen des Abonnements: {e}")
             return None
     
@@ -152,43 +177,34 @@ class StripeService:
         """Kündigt Abonnement"""
         try:
             if cancel_at_period_end:
-                stripe.Subscription.modify(
+                self._stripe.Subscription.modify(
                     subscription_id,
                     cancel_at_period_end=True
                 )
             else:
-                stripe.Subscription.delete(subscription_id)
+                self._stripe.Subscription.delete(subscription_id)
             
             return True
             
-        except stripe.error.StripeError as e:
+        except self._stripe.error.StripeError as e:
             self.logger.error(f"Fehler beim Kündigen des Abonnements: {e}")
             return False
     
     def handle_webhook(self, payload: str, signature: str) -> Optional[Dict[str, Any]]:
         """Behandelt Stripe-Webhook"""
         try:
-            event = stripe.Webhook.construct_event(
+            event = self._stripe.Webhook.construct_event(
                 payload, signature, self.webhook_secret
             )
             
             # Event verarbeiten
-            if event['type'] == 'checkout.session.completed':
-                return self._handle_checkout_completed(event['data']['object'])
-            elif event['type'] == 'customer.subscription.created':
-                return self._handle_subscription_created(event['data']['object'])
-            elif event['type'] == 'customer.subscription.updated':
-                return self._handle_subscription_updated(event['data']['object'])
-            elif event['type'] == 'customer.subscription.deleted':
-                return self._handle_subscription_deleted(event['data']['object'])
-            elif event['type'] == 'invoice.payment_succeeded':
-                return self._handle_payment_succeeded(event['data']['object'])
-            elif event['type'] == 'invoice.payment_failed':
-                return self._handle_payment_failed(event['data']['object'])
-            
+            handler_name = self._HANDLERS.get(event['type'])
+            if handler_name is not None:
+                return getattr(self, handler_name)(event['data']['object'])
+
             return {'status': 'ignored', 'event_type': event['type']}
             
-        except stripe.error.SignatureVerificationError as e:
+        except self._stripe.error.SignatureVerificationError as e:
             self.logger.error(f"Stripe-Webhook-Signatur ungültig: {e}")
             return None
         except Exception as e:
@@ -274,13 +290,22 @@ class StripeService:
         """Gibt alle verfügbaren Pläne zurück"""
         return self.plans
 
-# Globale Stripe-Service Instanz
+# Globale Stripe-Service Instanz (Double-checked Locking, siehe app.mt5)
 stripe_service: Optional[StripeService] = None
+_init_lock = threading.Lock()
 
 def init_stripe_service(config: Config) -> None:
-    """Initialisiert den Stripe-Service"""
+    """Initialisiert den Stripe-Service (thread-sicher, einmalig)"""
     global stripe_service
-    stripe_service = StripeService(config)
+    if stripe_service is not None:
+        return
+    # Ohne konfigurierten Key bleibt der Service (und damit das SDK)
+    # komplett ungeladen
+    if not config.STRIPE_SECRET_KEY:
+        return
+    with _init_lock:
+        if stripe_service is None:
+            stripe_service = StripeService(config)
 
 def get_stripe_service() -> Optional[StripeService]:
     """Gibt den Stripe-Service zurück"""
@@ -3,18 +3,30 @@ Telemetrie-Service für MT5 Flask Gateway
 Opt-in Metriken und DSGVO-konforme Datensammlung
 """
 
+import itertools
 import json
 import logging
 import platform
+import threading
+import time
 import uuid
+from collections import Counter, deque
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Deque, Dict, Any, Optional, List
 from dataclasses import dataclass, asdict
 from app.config import Config
 
+# orjson serialisiert die Export-Payloads im C-Pfad (SIMD-Zahlformat,
+# direkte UTF-8-Emission); ohne Installation bleibt stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 @dataclass
 class TelemetryEvent:
-    """Telemetrie-Event"""
+    """Telemetrie-Event (Schema der Einträge im Ring-Puffer; gespeichert
+    wird aus Performance-Gründen direkt das fertig serialisierte Dict)"""
     event_id: str
     event_type: str
     timestamp: datetime
@@ -32,6 +44,51 @@ class SystemMetrics:
     network_io: Dict[str, int]
     active_connections: int
 
+def _aggregate_samples(samples: List[SystemMetrics]) -> Dict[str, Any]:
+    """Verdichtet rohe Metrik-Samples zu einem Bucket (avg/min/max)"""
+    cpu = [s.cpu_usage for s in samples]
+    mem = [s.memory_usage for s in samples]
+    disk = [s.disk_usage for s in samples]
+    n = len(samples)
+    return {
+        "timestamp": samples[-1].timestamp.isoformat(),
+        "count": n,
+        "cpu": {"avg": sum(cpu) / n, "min": min(cpu), "max": max(cpu)},
+        "memory": {"avg": sum(mem) / n, "min": min(mem), "max": max(mem)},
+        "disk": {"avg": sum(disk) / n, "min": min(disk), "max": max(disk)},
+    }
+
+def _aggregate_buckets(buckets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Verdichtet bereits aggregierte Buckets eine Stufe weiter
+    (Durchschnitte gewichtet nach Sample-Anzahl)"""
+    total = sum(b["count"] for b in buckets)
+    result: Dict[str, Any] = {
+        "timestamp": buckets[-1]["timestamp"],
+        "count": total,
+    }
+    for key in ("cpu", "memory", "disk"):
+        result[key] = {
+            "avg": sum(b[key]["avg"] * b["count"] for b in buckets) / total,
+            "min": min(b[key]["min"] for b in buckets),
+            "max": max(b[key]["max"] for b in buckets),
+        }
+    return result
+
+def _count_tcp_connections(psutil) -> int:
+    """Zählt aktive TCP-Verbindungen. Auf Linux ein einzelner kleiner
+    Read aus /proc/net/sockstat; psutil.net_connections würde dafür
+    jeden Socket des Systems enumerieren und pro Socket ein
+    Python-Objekt allokieren."""
+    try:
+        with open('/proc/net/sockstat', 'r') as f:
+            for line in f:
+                if line.startswith('TCP:'):
+                    parts = line.split()
+                    return int(parts[parts.index('inuse') + 1])
+    except (OSError, ValueError):
+        pass
+    return len(psutil.net_connections(kind='tcp4'))
+
 class TelemetryService:
     """Telemetrie-Service"""
     
@@ -40,10 +97,54 @@ class TelemetryService:
         self.logger = logging.getLogger(__name__)
         self.is_enabled = not config.TELEMETRY_OPTOUT
         self.session_id = str(uuid.uuid4())
-        self.events: List[TelemetryEvent] = []
-        self.metrics: List[SystemMetrics] = []
+        # Event-IDs: Session-Präfix plus monotone Sequenz statt
+        # uuid4 (os.urandom-Syscall) pro Event - eindeutig innerhalb
+        # der Session reicht für Telemetrie
+        self._session_prefix = self.session_id[:8] + ":"
+        self._seq = itertools.count()
+        # ISO-Timestamp mit Sekunden-Granularität cachen: unter Last
+        # wird pro Sekunde einmal formatiert statt pro Event
+        self._ts_cache: tuple = (0, "")
         self.max_events = 1000
         self.max_metrics = 100
+        # Ring-Puffer pro Event-Kategorie: ein Burst billiger api_calls
+        # kann die seltenen, wertvollen error-Events nicht mehr
+        # verdrängen. Entleert wird gewichtet (Fehler zuerst).
+        self._cat_buffers: Dict[str, Deque[Dict[str, Any]]] = {
+            "error": deque(maxlen=500),
+            "trading_signal": deque(maxlen=300),
+            "api_call": deque(maxlen=self.max_events),
+        }
+        self._cat_weights = {"error": 5, "trading_signal": 3, "api_call": 1}
+        self.metrics: Deque[SystemMetrics] = deque(maxlen=self.max_metrics)
+        # Drop-newest-Backpressure: ist der Puffer voll, wird gezählt
+        # und verworfen, bevor Event-Objekt und UUID allokiert werden
+        self._dropped = 0
+        # Event-Zählung beim Schreiben pflegen - die Zusammenfassung
+        # liest dann O(1) statt alle Events zu scannen
+        self._event_counts: Counter = Counter()
+        # Metriken sammelt ein Hintergrund-Thread; Request-Handler
+        # lesen nur das letzte Sample
+        self.metrics_interval = 30.0
+        self._metrics_lock = threading.Lock()
+        # Verbindungszählung läuft mit 1/10 der Metrik-Kadenz;
+        # dazwischen wird der letzte Wert wiederverwendet
+        self._conn_tick = 0
+        self._last_conn_count = 0
+        # Gestufte Verdichtung: rohe Samples im feinen Ring, dazu
+        # Minuten- und Stunden-Buckets (avg/min/max) - lange Retention
+        # bei begrenztem Speicher statt voller Auflösung für Minuten
+        self._m_mid: Deque[Dict[str, Any]] = deque(maxlen=60)
+        self._m_coarse: Deque[Dict[str, Any]] = deque(maxlen=720)
+        self._rollup_tick = 0
+        self._mid_rollup_tick = 0
+        # Periodischer Batch-Flush des Event-Puffers auf Disk: bindet
+        # den Speicher und bündelt viele Appends zu einem Write
+        self.flush_interval = 30.0
+        self.export_file = "telemetry_events.ndjson"
+        self._flush_watermark = int(
+            sum(buf.maxlen for buf in self._cat_buffers.values()) * 0.8)
+        self._export_writer = None
         
         # DSGVO-Hinweise
         self.privacy_notice = {
@@ -66,47 +167,94 @@ class TelemetryService:
     def disable_telemetry(self) -> None:
         """Deaktiviert Telemetrie"""
         self.is_enabled = False
-        self.events.clear()
+        for buffer in self._cat_buffers.values():
+            buffer.clear()
         self.metrics.clear()
+        self._event_counts.clear()
         self.logger.info("Telemetrie deaktiviert")
     
-    def _create_event(self, event_type: str, data: Dict[str, Any], 
-                     user_id: Optional[str] = None) -> TelemetryEvent:
-        """Erstellt Telemetrie-Event"""
-        return TelemetryEvent(
-            event_id=str(uuid.uuid4()),
-            event_type=event_type,
-            timestamp=datetime.utcnow(),
-            session_id=self.session_id,
-            user_id=user_id,
-            data=data
-        )
+    def _now_iso(self) -> str:
+        """Gibt den aktuellen UTC-Zeitstempel als ISO-String zurück
+        (pro Sekunde einmal formatiert, danach aus dem Cache)"""
+        sec = int(time.time())
+        if sec != self._ts_cache[0]:
+            self._ts_cache = (sec, datetime.utcfromtimestamp(sec).isoformat())
+        return self._ts_cache[1]
+
+    def _create_event(self, event_type: str, data: Dict[str, Any],
+                     user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Erstellt Telemetrie-Event. Events sind nach der Erzeugung
+        unveränderlich - sie werden direkt export-fertig serialisiert
+        (Timestamp bereits ISO), der Export spart sich damit das
+        asdict-Deep-Copy pro Event."""
+        return {
+            "event_id": self._session_prefix + str(next(self._seq)),
+            "event_type": event_type,
+            "timestamp": self._now_iso(),
+            "session_id": self.session_id,
+            "user_id": user_id,
+            "data": data
+        }
     
-    def track_api_call(self, endpoint: str, method: str, status_code: int, 
+    def _try_append_event(self, event_type: str, data: Dict[str, Any],
+                          user_id: Optional[str] = None) -> None:
+        """Hängt ein Event an den Puffer seiner Kategorie, sofern dort
+        Platz ist. Unter Last wird verworfen, BEVOR Event-Dict und ID
+        allokiert werden - der dominante Preis unter Überlast."""
+        buffer = self._cat_buffers.get(event_type)
+        if buffer is None:
+            buffer = self._cat_buffers.setdefault(
+                event_type, deque(maxlen=500))
+        if len(buffer) >= buffer.maxlen:
+            self._dropped += 1
+            return
+
+        buffer.append(self._create_event(event_type, data, user_id))
+        self._event_counts[event_type] += 1
+
+    def _total_buffered(self) -> int:
+        return sum(len(buf) for buf in self._cat_buffers.values())
+
+    def _weighted_events(self, drain: bool = False) -> List[Dict[str, Any]]:
+        """Zieht Events gewichtet round-robin aus den Kategorie-Puffern
+        (Fehler zuerst); mit drain=True werden die Puffer dabei geleert"""
+        if drain:
+            pending = {cat: buf for cat, buf in self._cat_buffers.items() if buf}
+        else:
+            pending = {
+                cat: deque(buf) for cat, buf in self._cat_buffers.items() if buf
+            }
+
+        result: List[Dict[str, Any]] = []
+        while pending:
+            for cat in list(pending):
+                buf = pending[cat]
+                for _ in range(self._cat_weights.get(cat, 1)):
+                    if not buf:
+                        del pending[cat]
+                        break
+                    result.append(buf.popleft())
+        return result
+
+    def track_api_call(self, endpoint: str, method: str, status_code: int,
                       response_time: float, user_id: Optional[str] = None) -> None:
         """Verfolgt API-Aufrufe"""
         if not self.is_enabled:
             return
-        
+
         try:
             event_data = {
                 "endpoint": endpoint,
                 "method": method,
                 "status_code": status_code,
-                "response_time_ms": response_time,
-                "timestamp": datetime.utcnow().isoformat()
+                "response_time_ms": response_time
             }
-            
-            event = self._create_event("api_call", event_data, user_id)
-            self.events.append(event)
-            
-            # Events begrenzen
-            if len(self.events) > self.max_events:
-                self.events = self.events[-self.max_events:]
-                
+
+            self._try_append_event("api_call", event_data, user_id)
+
         except Exception as e:
             self.logger.error(f"Fehler beim Verfolgen von API-Aufruf: {e}")
-    
+
     def track_error(self, error_type: str, error_message: str, 
                    context: Dict[str, Any], user_id: Optional[str] = None) -> None:
         """Verfolgt Fehler"""
@@ -117,13 +265,11 @@ class TelemetryService:
             event_data = {
                 "error_type": error_type,
                 "error_message": error_message[:200],  # Begrenzen
-                "context": context,
-                "timestamp": datetime.utcnow().isoformat()
+                "context": context
             }
             
-            event = self._create_event("error", event_data, user_id)
-            self.events.append(event)
-            
+            self._try_append_event("error", event_data, user_id)
+
         except Exception as e:
             self.logger.error(f"Fehler beim Verfolgen von Fehler: {e}")
     
@@ -138,64 +284,136 @@ class TelemetryService:
                 "strategy": strategy,
                 "symbol": symbol,
                 "side": side,
-                "success": success,
-                "timestamp": datetime.utcnow().isoformat()
+                "success": success
             }
             
-            event = self._create_event("trading_signal", event_data, user_id)
-            self.events.append(event)
-            
+            self._try_append_event("trading_signal", event_data, user_id)
+
         except Exception as e:
             self.logger.error(f"Fehler beim Verfolgen von Trading-Signal: {e}")
     
-    def track_system_metrics(self) -> None:
-        """Sammelt System-Metriken"""
-        if not self.is_enabled:
-            return
-        
+    def _collect_system_metrics(self) -> None:
+        """Sammelt ein System-Metrik-Sample (läuft auf dem
+        Hintergrund-Thread, nie auf einem Request-Thread)"""
+        import psutil
+
+        # CPU-Nutzung seit dem letzten Aufruf - blockiert nicht
+        cpu_usage = psutil.cpu_percent(interval=None)
+
+        # Speicher-Nutzung
+        memory = psutil.virtual_memory()
+        memory_usage = memory.percent
+
+        # Festplatten-Nutzung
+        disk = psutil.disk_usage('/')
+        disk_usage = (disk.used / disk.total) * 100
+
+        # Netzwerk-IO
+        network_io = psutil.net_io_counters()
+        network_data = {
+            "bytes_sent": network_io.bytes_sent,
+            "bytes_recv": network_io.bytes_recv,
+            "packets_sent": network_io.packets_sent,
+            "packets_recv": network_io.packets_recv
+        }
+
+        # Aktive Verbindungen (seltener gesampelt als CPU/Speicher)
+        if self._conn_tick % 10 == 0:
+            self._last_conn_count = _count_tcp_connections(psutil)
+        self._conn_tick += 1
+        connections = self._last_conn_count
+
+        metrics = SystemMetrics(
+            timestamp=datetime.utcnow(),
+            cpu_usage=cpu_usage,
+            memory_usage=memory_usage,
+            disk_usage=disk_usage,
+            network_io=network_data,
+            active_connections=connections
+        )
+
+        with self._metrics_lock:
+            self.metrics.append(metrics)
+
+            # Roll-up: alle 60 Samples ein Minuten-Bucket, alle 60
+            # Minuten-Buckets ein Stunden-Bucket
+            self._rollup_tick += 1
+            if self._rollup_tick % 60 == 0:
+                self._m_mid.append(
+                    _aggregate_samples(list(self.metrics)[-60:]))
+                self._mid_rollup_tick += 1
+                if self._mid_rollup_tick % 60 == 0:
+                    self._m_coarse.append(
+                        _aggregate_buckets(list(self._m_mid)[-60:]))
+
+    def _metrics_loop(self) -> None:
+        """Hintergrund-Schleife für die Metrik-Sammlung. Das frühere
+        psutil.cpu_percent(interval=1) schlief eine volle Sekunde auf
+        dem Aufrufer-Thread; hier zahlt das niemand im Request-Pfad."""
         try:
             import psutil
-            
-            # CPU-Nutzung
-            cpu_usage = psutil.cpu_percent(interval=1)
-            
-            # Speicher-Nutzung
-            memory = psutil.virtual_memory()
-            memory_usage = memory.percent
-            
-            # Festplatten-Nutzung
-            disk = psutil.disk_usage('/')
-            disk_usage = (disk.used / disk.total) * 100
-            
-            # Netzwerk-IO
-            network_io = psutil.net_io_counters()
-            network_data = {
-                "bytes_sent": network_io.bytes_sent,
-                "bytes_recv": network_io.bytes_recv,
-                "packets_sent": network_io.packets_sent,
-                "packets_recv": network_io.packets_recv
-            }
-            
-            # Aktive Verbindungen
-            connections = len(psutil.net_connections())
-            
-            metrics = SystemMetrics(
-                timestamp=datetime.utcnow(),
-                cpu_usage=cpu_usage,
-                memory_usage=memory_usage,
-                disk_usage=disk_usage,
-                network_io=network_data,
-                active_connections=connections
+            psutil.cpu_percent(interval=None)  # Priming-Aufruf
+        except ImportError:
+            self.logger.warning("psutil nicht verfügbar, keine System-Metriken")
+            return
+
+        while True:
+            time.sleep(self.metrics_interval)
+            if not self.is_enabled:
+                continue
+            try:
+                self._collect_system_metrics()
+            except Exception as e:
+                self.logger.error(f"Fehler beim Sammeln von System-Metriken: {e}")
+
+    def _flush_events(self) -> None:
+        """Entleert den Event-Puffer gebündelt in die NDJSON-Datei -
+        ein gepufferter Write pro Batch statt Events unbegrenzt im
+        Speicher zu halten"""
+        batch = self._weighted_events(drain=True)
+        if not batch:
+            return
+
+        if self._export_writer is None:
+            self._export_writer = open(self.export_file, 'ab', buffering=65536)
+        if orjson is not None:
+            self._export_writer.writelines(
+                orjson.dumps(event) + b'\n' for event in batch
             )
-            
-            self.metrics.append(metrics)
-            
-            # Metriken begrenzen
-            if len(self.metrics) > self.max_metrics:
-                self.metrics = self.metrics[-self.max_metrics:]
-                
-        except Exception as e:
-            self.logger.error(f"Fehler beim Sammeln von System-Metriken: {e}")
+        else:
+            self._export_writer.writelines(
+                json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n'
+                for event in batch
+            )
+        self._export_writer.flush()
+
+    def _flush_loop(self) -> None:
+        """Hintergrund-Schleife für den Event-Flush: spätestens alle
+        flush_interval Sekunden oder beim Überschreiten der Hochwasser-
+        Marke wandert der Puffer auf Disk"""
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(1.0)
+            if not self.is_enabled:
+                continue
+            now = time.monotonic()
+            if (now - last_flush < self.flush_interval
+                    and self._total_buffered() < self._flush_watermark):
+                continue
+            try:
+                self._flush_events()
+            except Exception as e:
+                self.logger.error(f"Fehler beim Telemetrie-Flush: {e}")
+            last_flush = now
+
+    def track_system_metrics(self) -> Optional[SystemMetrics]:
+        """Gibt das letzte gecachte Metrik-Sample zurück (nicht
+        blockierend; die Sammlung läuft auf dem Hintergrund-Thread)"""
+        if not self.is_enabled:
+            return None
+
+        with self._metrics_lock:
+            return self.metrics[-1] if self.metrics else None
     
     def get_telemetry_summary(self) -> Dict[str, Any]:
         """Gibt Telemetrie-Zusammenfassung zurück"""
@@ -203,21 +421,21 @@ class TelemetryService:
             return {"enabled": False}
         
         try:
-            # Events nach Typ gruppieren
-            event_counts = {}
-            for event in self.events:
-                event_type = event.event_type
-                event_counts[event_type] = event_counts.get(event_type, 0) + 1
-            
             # Letzte Metriken
             latest_metrics = self.metrics[-1] if self.metrics else None
             
             return {
                 "enabled": True,
                 "session_id": self.session_id,
-                "total_events": len(self.events),
-                "event_counts": event_counts,
+                "total_events": self._total_buffered(),
+                "dropped_events": self._dropped,
+                "event_counts": dict(self._event_counts),
                 "latest_metrics": asdict(latest_metrics) if latest_metrics else None,
+                "metrics_tiers": {
+                    "raw": len(self.metrics),
+                    "minute": len(self._m_mid),
+                    "hour": len(self._m_coarse)
+                },
                 "privacy_notice": self.privacy_notice
             }
             
@@ -231,13 +449,10 @@ class TelemetryService:
             return {"enabled": False}
         
         try:
-            # Events serialisieren
-            events_data = []
-            for event in self.events:
-                event_dict = asdict(event)
-                event_dict['timestamp'] = event.timestamp.isoformat()
-                events_data.append(event_dict)
-            
+            # Events liegen bereits export-fertig in den Puffern;
+            # gewichtet interleaved, damit Fehler vorn stehen
+            events_data = self._weighted_events()
+
             # Metriken serialisieren
             metrics_data = []
             for metric in self.metrics:
@@ -251,6 +466,8 @@ class TelemetryService:
                 "export_timestamp": datetime.utcnow().isoformat(),
                 "events": events_data,
                 "metrics": metrics_data,
+                "metrics_minute": list(self._m_mid),
+                "metrics_hour": list(self._m_coarse),
                 "privacy_notice": self.privacy_notice
             }
             
@@ -260,8 +477,13 @@ class TelemetryService:
     
     def clear_telemetry_data(self) -> None:
         """Löscht Telemetrie-Daten"""
-        self.events.clear()
+        for buffer in self._cat_buffers.values():
+            buffer.clear()
         self.metrics.clear()
+        self._m_mid.clear()
+        self._m_coarse.clear()
+        self._event_counts.clear()
+        self._dropped = 0
         self.logger.info("Telemetrie-Daten gelöscht")
     
     def get_privacy_notice(self) -> Dict[str, Any]:
@@ -280,13 +502,22 @@ class TelemetryService:
             ]
         }
 
-# Globale Telemetrie-Service Instanz
+# Globale Telemetrie-Service Instanz (Double-checked Locking, siehe app.mt5)
 telemetry_service: Optional[TelemetryService] = None
+_init_lock = threading.Lock()
 
 def init_telemetry_service(config: Config) -> None:
-    """Initialisiert den Telemetrie-Service"""
+    """Initialisiert den Telemetrie-Service (thread-sicher, einmalig)"""
     global telemetry_service
-    telemetry_service = TelemetryService(config)
+    if telemetry_service is not None:
+        return
+    with _init_lock:
+        if telemetry_service is None:
+            telemetry_service = TelemetryService(config)
+            threading.Thread(target=telemetry_service._metrics_loop,
+                             name='telemetry-metrics', daemon=True).start()
+            threading.Thread(target=telemetry_service._flush_loop,
+                             name='telemetry-flush', daemon=True).start()
 
 def get_telemetry_service() -> Optional[TelemetryService]:
     """Gibt den Telemetrie-Service zurück"""
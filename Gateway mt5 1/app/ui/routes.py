@@ -3,20 +3,53 @@ UI-Routen für MT5 Flask Gateway
 Web-Interface für Dashboard, Konfiguration, Logs und Lizenzierung
 """
 
+import io
+import json
 import logging
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash
+import re
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, redirect, url_for, flash
 from flask_login import login_required, current_user
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from app.security import require_api_key
-from app.services.licensing import get_license_manager
-from app.services.settings import get_settings_manager
-from app.services.logging import get_logging_service
-from app.mt5 import get_mt5_client
 from app.mt5.account import get_account_manager
 
 # UI Blueprint erstellen
 ui = Blueprint('ui', __name__)
 logger = logging.getLogger(__name__)
 
+# Ein kompiliertes Alternations-Pattern für die Level-Zählung: ein
+# C-Scan pro Zeile statt bis zu drei Substring-Suchen
+_LEVEL_RE = re.compile(r'\b(ERROR|WARNING|INFO)\b')
+
+# Serialisierte Config-Antwort pro Settings-Version: pollende Dashboards
+# bekommen 304er bzw. den gecachten Body statt pro Poll ein JSON-Build
+_config_cache = {'version': -1, 'body': ''}
+
+# Inbound-Payloads der Config-POSTs: validate_json parst und validiert
+# in einem pydantic-core-Durchlauf statt get_json plus float()/int()
+# pro Feld (Adapter einmal beim Import kompiliert, siehe app.api.schemas)
+class _Mt5ConfigPayload(BaseModel):
+    server: str = ''
+    login: str = ''
+    password: str = ''
+    path: str = ''
+
+class _TradingConfigPayload(BaseModel):
+    default_risk_percent: float = 1.0
+    max_concurrent_orders: int = 10
+    min_lot_size: float = 0.01
+    max_lot_size: float = 100.0
+
+class _ApiConfigPayload(BaseModel):
+    public_key: str = ''
+    secret_key: str = ''
+    allowed_ips: str = ''
+    rate_limit: int = 60
+
+_MT5_CFG_ADAPTER = TypeAdapter(_Mt5ConfigPayload)
+_TRADING_CFG_ADAPTER = TypeAdapter(_TradingConfigPayload)
+_API_CFG_ADAPTER = TypeAdapter(_ApiConfigPayload)
+
 @ui.route('/')
 def index():
     """Hauptdashboard"""
@@ -52,32 +85,42 @@ def license():
 def get_config():
     """Gibt aktuelle Konfiguration zurück"""
     try:
-        settings_manager = get_settings_manager()
+        settings_manager = current_app.extensions['mt5_services'].settings
         if not settings_manager:
             return jsonify({'error': 'Settings Manager nicht verfügbar'}), 503
         
-        settings = settings_manager.get_settings()
-        
-        return jsonify({
-            'mt5': {
-                'server': settings.mt5_server,
-                'login': settings.mt5_login,
-                'password': settings.mt5_password,
-                'path': settings.mt5_path
-            },
-            'trading': {
-                'default_risk_percent': settings.default_risk_percent,
-                'max_concurrent_orders': settings.max_concurrent_orders,
-                'min_lot_size': settings.min_lot_size,
-                'max_lot_size': settings.max_lot_size
-            },
-            'api': {
-                'public_key': settings.api_public_key,
-                'secret_key': settings.api_secret_key,
-                'allowed_ips': ','.join(settings.allowed_ips),
-                'rate_limit': settings.api_rate_limit
-            }
-        }), 200
+        version = settings_manager.version
+        etag_value = f'cfg-{version}'
+        if etag_value in request.if_none_match:
+            return '', 304
+
+        if _config_cache['version'] != version:
+            settings = settings_manager.get_settings()
+            _config_cache['body'] = json.dumps({
+                'mt5': {
+                    'server': settings.mt5_server,
+                    'login': settings.mt5_login,
+                    'password': settings.mt5_password,
+                    'path': settings.mt5_path
+                },
+                'trading': {
+                    'default_risk_percent': settings.default_risk_percent,
+                    'max_concurrent_orders': settings.max_concurrent_orders,
+                    'min_lot_size': settings.min_lot_size,
+                    'max_lot_size': settings.max_lot_size
+                },
+                'api': {
+                    'public_key': settings.api_public_key,
+                    'secret_key': settings.api_secret_key,
+                    'allowed_ips': ','.join(settings.allowed_ips),
+                    'rate_limit': settings.api_rate_limit
+                }
+            }, ensure_ascii=False)
+            _config_cache['version'] = version
+
+        response = Response(_config_cache['body'], mimetype='application/json')
+        response.set_etag(etag_value)
+        return response, 200
         
     except Exception as e:
         logger.error(f"Fehler beim Abrufen der Konfiguration: {e}")
@@ -88,18 +131,22 @@ def get_config():
 def save_mt5_config():
     """Speichert MT5-Konfiguration"""
     try:
-        data = request.get_json()
-        settings_manager = get_settings_manager()
+        settings_manager = current_app.extensions['mt5_services'].settings
         if not settings_manager:
             return jsonify({'error': 'Settings Manager nicht verfügbar'}), 503
-        
+
+        try:
+            cfg = _MT5_CFG_ADAPTER.validate_json(request.get_data())
+        except ValidationError as e:
+            return jsonify({'error': 'Ungültige Daten', 'details': e.errors()}), 400
+
         success = settings_manager.update_settings(
-            mt5_server=data.get('server', ''),
-            mt5_login=data.get('login', ''),
-            mt5_password=data.get('password', ''),
-            mt5_path=data.get('path', '')
+            mt5_server=cfg.server,
+            mt5_login=cfg.login,
+            mt5_password=cfg.password,
+            mt5_path=cfg.path
         )
-        
+
         if success:
             return jsonify({'message': 'MT5-Konfiguration gespeichert'}), 200
         else:
@@ -114,23 +161,22 @@ def save_mt5_config():
 def save_trading_config():
     """Speichert Trading-Konfiguration"""
     try:
-        data = request.get_json()
-        settings_manager = get_settings_manager()
+        settings_manager = current_app.extensions['mt5_services'].settings
         if not settings_manager:
             return jsonify({'error': 'Settings Manager nicht verfügbar'}), 503
-        
-        success = settings_manager.update_settings(
-            default_risk_percent=float(data.get('default_risk_percent', 1.0)),
-            max_concurrent_orders=int(data.get('max_concurrent_orders', 10)),
-            min_lot_size=float(data.get('min_lot_size', 0.01)),
-            max_lot_size=float(data.get('max_lot_size', 100.0))
-        )
-        
+
+        try:
+            cfg = _TRADING_CFG_ADAPTER.validate_json(request.get_data())
+        except ValidationError as e:
+            return jsonify({'error': 'Ungültige Daten', 'details': e.errors()}), 400
+
+        success = settings_manager.update_settings(**cfg.model_dump())
+
         if success:
             return jsonify({'message': 'Trading-Konfiguration gespeichert'}), 200
         else:
             return jsonify({'error': 'Fehler beim Speichern'}), 500
-            
+
     except Exception as e:
         logger.error(f"Fehler beim Speichern der Trading-Konfiguration: {e}")
         return jsonify({'error': 'Interner Fehler'}), 500
@@ -140,18 +186,22 @@ def save_trading_config():
 def save_api_config():
     """Speichert API-Konfiguration"""
     try:
-        data = request.get_json()
-        settings_manager = get_settings_manager()
+        settings_manager = current_app.extensions['mt5_services'].settings
         if not settings_manager:
             return jsonify({'error': 'Settings Manager nicht verfügbar'}), 503
-        
+
+        try:
+            cfg = _API_CFG_ADAPTER.validate_json(request.get_data())
+        except ValidationError as e:
+            return jsonify({'error': 'Ungültige Daten', 'details': e.errors()}), 400
+
         success = settings_manager.update_settings(
-            api_public_key=data.get('public_key', ''),
-            api_secret_key=data.get('secret_key', ''),
-            allowed_ips=data.get('allowed_ips', '').split(','),
-            api_rate_limit=int(data.get('rate_limit', 60))
+            api_public_key=cfg.public_key,
+            api_secret_key=cfg.secret_key,
+            allowed_ips=cfg.allowed_ips.split(','),
+            api_rate_limit=cfg.rate_limit
         )
-        
+
         if success:
             return jsonify({'message': 'API-Konfiguration gespeichert'}), 200
         else:
@@ -167,13 +217,12 @@ def generate_api_keys():
     """Generiert neue API-Keys"""
     try:
         import secrets
-        import string
-        
-        # Öffentlichen Key generieren
-        public_key = 'pub_' + ''.join(secrets.choices(string.ascii_letters + string.digits, k=32))
-        
-        # Geheimen Key generieren
-        secret_key = 'sec_' + ''.join(secrets.choices(string.ascii_letters + string.digits, k=64))
+
+        # Ein urandom-Syscall plus Base64 pro Key statt einer
+        # choice-Schleife mit einem CSPRNG-Draw pro Zeichen (das
+        # frühere secrets.choices existiert zudem gar nicht)
+        public_key = 'pub_' + secrets.token_urlsafe(24)   # ~32 Zeichen
+        secret_key = 'sec_' + secrets.token_urlsafe(48)   # ~64 Zeichen
         
         return jsonify({
             'public_key': public_key,
@@ -190,7 +239,7 @@ def test_mt5_connection():
     """Testet MT5-Verbindung"""
     try:
         data = request.get_json()
-        mt5_client = get_mt5_client()
+        mt5_client = current_app.extensions['mt5_services'].mt5
         if not mt5_client:
             return jsonify({'error': 'MT5 Client nicht verfügbar'}), 503
         
@@ -218,7 +267,7 @@ def test_mt5_connection():
 def get_license_status():
     """Gibt Lizenz-Status zurück"""
     try:
-        license_manager = get_license_manager()
+        license_manager = current_app.extensions['mt5_services'].license
         if not license_manager:
             return jsonify({'error': 'License Manager nicht verfügbar'}), 503
         
@@ -240,7 +289,7 @@ def activate_license():
         if not license_key:
             return jsonify({'error': 'Lizenz-Key erforderlich'}), 400
         
-        license_manager = get_license_manager()
+        license_manager = current_app.extensions['mt5_services'].license
         if not license_manager:
             return jsonify({'error': 'License Manager nicht verfügbar'}), 503
         
@@ -261,7 +310,7 @@ def activate_license():
 def get_log_files():
     """Gibt verfügbare Log-Dateien zurück"""
     try:
-        logging_service = get_logging_service()
+        logging_service = current_app.extensions['mt5_services'].logging
         if not logging_service:
             return jsonify({'error': 'Logging Service nicht verfügbar'}), 503
         
@@ -277,21 +326,32 @@ def get_log_files():
 def view_log_file(filename):
     """Zeigt Log-Datei-Inhalt"""
     try:
-        logging_service = get_logging_service()
+        logging_service = current_app.extensions['mt5_services'].logging
         if not logging_service:
             return jsonify({'error': 'Logging Service nicht verfügbar'}), 503
         
         lines = logging_service.read_log_file(filename, 1000)  # Letzte 1000 Zeilen
-        content = ''.join(lines)
-        
+
+        # Ein Durchlauf statt vier: Inhalt in einen StringIO schreiben
+        # und die Level dabei mit einem Regex-Scan pro Zeile zählen
+        counts = {'ERROR': 0, 'WARNING': 0, 'INFO': 0}
+        buf = io.StringIO()
+        search = _LEVEL_RE.search
+        for line in lines:
+            buf.write(line)
+            m = search(line)
+            if m:
+                counts[m.group(1)] += 1
+        content = buf.getvalue()
+
         # Einfache Statistiken
         stats = {
             'total_lines': len(lines),
-            'error_lines': len([line for line in lines if 'ERROR' in line]),
-            'warning_lines': len([line for line in lines if 'WARNING' in line]),
-            'info_lines': len([line for line in lines if 'INFO' in line])
+            'error_lines': counts['ERROR'],
+            'warning_lines': counts['WARNING'],
+            'info_lines': counts['INFO']
         }
-        
+
         return jsonify({
             'content': content,
             'stats': stats
@@ -312,10 +372,24 @@ def download_log_file(filename):
         log_dir = "logs"
         filepath = os.path.join(log_dir, filename)
         
-        if not os.path.exists(filepath):
+        try:
+            mtime = os.path.getmtime(filepath)
+        except OSError:
             return jsonify({'error': 'Datei nicht gefunden'}), 404
-        
-        return send_file(filepath, as_attachment=True, download_name=filename)
+
+        # conditional=True aktiviert ETag/Range-Unterstützung: das
+        # Dashboard-Auto-Refresh bekommt billige 304er, und der
+        # WSGI-Server kann den Body per wsgi.file_wrapper/sendfile(2)
+        # streamen statt ihn durch Python-Puffer zu kopieren
+        return send_file(
+            filepath,
+            as_attachment=True,
+            download_name=filename,
+            conditional=True,
+            etag=True,
+            last_modified=mtime,
+            max_age=0
+        )
         
     except Exception as e:
         logger.error(f"Fehler beim Download der Log-Datei: {e}")
@@ -330,7 +404,7 @@ def search_logs():
         log_type = request.args.get('log_type', 'all')
         log_level = request.args.get('log_level', 'all')
         
-        logging_service = get_logging_service()
+        logging_service = current_app.extensions['mt5_services'].logging
         if not logging_service:
             return jsonify({'error': 'Logging Service nicht verfügbar'}), 503
         
@@ -351,7 +425,7 @@ def search_logs():
 def get_log_stats():
     """Gibt Log-Statistiken zurück"""
     try:
-        logging_service = get_logging_service()
+        logging_service = current_app.extensions['mt5_services'].logging
         if not logging_service:
             return jsonify({'error': 'Logging Service nicht verfügbar'}), 503
         
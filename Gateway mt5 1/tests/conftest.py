@@ -0,0 +1,23 @@
+"""
+Gemeinsame Fixtures für die Test-Suite
+"""
+
+import pytest
+from app import create_app
+from app.config import TestingConfig
+
+# App und Client einmal pro Session bauen: create_app initialisiert alle
+# Services, registriert Blueprints und kompiliert die Pydantic-Adapter -
+# das pro Test zu wiederholen serialisiert nur Setup-Kosten. Zustand pro
+# Test liegt in den funktions-skopierten Mock-Fixtures, nicht in der App.
+@pytest.fixture(scope='session')
+def app():
+    """Erstellt Test-App"""
+    app = create_app(TestingConfig())
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture(scope='session')
+def client(app):
+    """Erstellt Test-Client"""
+    return app.test_client()
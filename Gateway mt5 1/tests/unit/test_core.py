@@ -4,31 +4,79 @@ Tests für Sicherheit, Trading Engine und API-Endpunkte
 """
 
 import pytest
+import asyncio
 import json
 import time
+from dataclasses import replace
+from typing import List
+from pydantic import TypeAdapter
 import hmac
 import hashlib
 import base64
+import secrets
 from datetime import datetime, timedelta
 from unittest.mock import Mock, patch, MagicMock
-from app import create_app
 from app.config import TestingConfig
-from app.security import SecurityManager, generate_test_signature, create_test_headers
-from app.mt5.trading import TradingEngine, TradingSignal, OrderSide, OrderType, RiskConfig, StopLossConfig, TakeProfitConfig
+from app.security import SecurityManager, generate_test_signature
+from app.mt5.trading import TradingEngine, TradingSignal, OrderSide, OrderType, RiskConfig, StopLossConfig, TakeProfitConfig, ErrorCode
 from app.mt5.mock import MockMT5Client, MockTradingEngine
-from app.api.schemas import TradingSignalRequest, OrderRequest
+from app.api.schemas import TradingSignalRequest, OrderRequest, SIGNAL_ADAPTER, ORDER_ADAPTER
 
-@pytest.fixture
-def app():
-    """Erstellt Test-App"""
-    app = create_app(TestingConfig())
-    app.config['TESTING'] = True
-    return app
+# Vorinitialisierter HMAC-Signer für die API-Tests: der SHA-256-Key-
+# Schedule wird einmal beim Import berechnet, pro Request-Signatur nur
+# noch copy()+update() statt hmac.new aus den Roh-Strings
+TEST_API_KEY = "test_pub_key"
+_TEST_SIGNER = hmac.new(b"test_sec_key", digestmod='sha256')
+
+# Kanonischen Signatur-String als bytes.join bauen: ein Buffer in einer
+# Allokation statt einer Kette von str-Zwischenobjekten plus Encode
+_METHOD_BYTES = {"GET": b"GET", "POST": b"POST", "PUT": b"PUT", "DELETE": b"DELETE"}
+
+# Kanonisches Trading-Signal einmal bauen; Tests spezialisieren per
+# dataclasses.replace statt die verschachtelten Risk/SL/TP-Configs
+# jedes Mal neu zu konstruieren
+_BASE_SIGNAL = TradingSignal(
+    strategy="test_strategy",
+    symbol="EURUSD",
+    side=OrderSide.BUY,
+    order_type=OrderType.MARKET,
+    risk=RiskConfig(percent=1.0),
+    sl=StopLossConfig(pips=20),
+    tp=TakeProfitConfig(pips=40)
+)
+
+BASE_SIGNAL_DICT = {
+    "strategy": "test_strategy",
+    "symbol": "EURUSD",
+    "side": "buy",
+    "type": "market",
+    "risk": {"percent": 1.0},
+    "sl": {"pips": 20},
+    "tp": {"pips": 40}
+}
+
+# Fall-Tabellen für die Schema-Tests; der Listen-Adapter validiert den
+# ganzen Batch in einem pydantic-core-Aufruf statt Modell für Modell
+VALID_SIGNAL_CASES = [
+    {**BASE_SIGNAL_DICT, "comment": "test_comment", "idempotency_key": "test_key_123"},
+    {**BASE_SIGNAL_DICT, "side": "sell"},
+    {**BASE_SIGNAL_DICT, "type": "limit", "price": 1.1000},
+]
+
+INVALID_SIGNAL_CASES = [
+    {**BASE_SIGNAL_DICT, "strategy": ""},  # Leerer String
+    {**BASE_SIGNAL_DICT, "side": "invalid_side"},  # Ungültige Seite
+    {**BASE_SIGNAL_DICT, "risk": {"percent": 15.0}},  # Zu hohes Risiko
+]
+
+_SIGNAL_LIST_ADAPTER = TypeAdapter(List[TradingSignalRequest])
 
 @pytest.fixture
-def client(app):
-    """Erstellt Test-Client"""
-    return app.test_client()
+def base_signal():
+    """Signal-Vorlage für Trading-Tests"""
+    return _BASE_SIGNAL
+
+# app- und client-Fixtures kommen session-skopiert aus tests/conftest.py
 
 @pytest.fixture
 def mock_mt5_client():
@@ -173,21 +221,23 @@ class TestTradingEngine:
         
         # Andere Key (sollte funktionieren)
         assert mock_trading_engine.validate_idempotency(key2)
-    
-    def test_execute_signal(self, mock_trading_engine):
+
+    def test_bulk_idempotency(self, mock_trading_engine):
+        """Test Idempotency-Store unter Last"""
+        for i in range(1000):
+            assert mock_trading_engine.validate_idempotency(f"bulk_key_{i}")
+
+        # Duplikate werden auch bei vollem Store per Hash-Lookup
+        # abgelehnt - kein linearer Scan über alle Keys
+        assert not mock_trading_engine.validate_idempotency("bulk_key_0")
+        assert not mock_trading_engine.validate_idempotency("bulk_key_999")
+        assert isinstance(mock_trading_engine.idempotency_cache, dict)
+
+    def test_execute_signal(self, mock_trading_engine, base_signal):
         """Test Signal-Ausführung"""
-        signal = TradingSignal(
-            strategy="test_strategy",
-            symbol="EURUSD",
-            side=OrderSide.BUY,
-            order_type=OrderType.MARKET,
-            risk=RiskConfig(percent=1.0),
-            sl=StopLossConfig(pips=20),
-            tp=TakeProfitConfig(pips=40),
-            comment="test_signal",
-            idempotency_key="test_idempotency_123"
-        )
-        
+        signal = replace(base_signal, comment="test_signal",
+                         idempotency_key="test_idempotency_123")
+
         result = mock_trading_engine.execute_signal(signal)
         
         assert result.success
@@ -196,20 +246,11 @@ class TestTradingEngine:
         assert result.executed_price is not None
         assert result.lot_size is not None
     
-    def test_execute_signal_duplicate(self, mock_trading_engine):
+    def test_execute_signal_duplicate(self, mock_trading_engine, base_signal):
         """Test doppelte Signal-Ausführung"""
-        signal = TradingSignal(
-            strategy="test_strategy",
-            symbol="EURUSD",
-            side=OrderSide.BUY,
-            order_type=OrderType.MARKET,
-            risk=RiskConfig(percent=1.0),
-            sl=StopLossConfig(pips=20),
-            tp=TakeProfitConfig(pips=40),
-            comment="test_signal",
-            idempotency_key="duplicate_test_key"
-        )
-        
+        signal = replace(base_signal, comment="test_signal",
+                         idempotency_key="duplicate_test_key")
+
         # Erste Ausführung
         result1 = mock_trading_engine.execute_signal(signal)
         assert result1.success
@@ -217,17 +258,42 @@ class TestTradingEngine:
         # Zweite Ausführung (sollte fehlschlagen)
         result2 = mock_trading_engine.execute_signal(signal)
         assert not result2.success
-        assert "bereits verwendet" in result2.error_message
+        assert result2.error_code is ErrorCode.DUPLICATE_IDEMPOTENCY
 
 class TestAPIEndpoints:
     """Tests für API-Endpunkte"""
-    
+
+    @pytest.fixture
+    def signer(self):
+        """Baut signierte Test-Header über den gecachten HMAC-Signer"""
+        def _headers(method: str, path: str, body: str = '') -> dict:
+            timestamp = str(int(time.time()))
+            nonce = secrets.token_hex(16)
+            mac = _TEST_SIGNER.copy()
+            mac.update(b"".join((
+                _METHOD_BYTES[method.upper()],
+                path.encode('ascii'),
+                body if isinstance(body, bytes) else body.encode('utf-8'),
+                timestamp.encode('ascii'),
+                nonce.encode('ascii'),
+            )))
+            return {
+                'X-API-KEY': TEST_API_KEY,
+                'X-TS': timestamp,
+                'X-NONCE': nonce,
+                'X-SIGNATURE': base64.b64encode(mac.digest()).decode('ascii'),
+                'Content-Type': 'application/json'
+            }
+        return _headers
+
     def test_health_endpoint(self, client):
         """Test Health Check Endpoint"""
         response = client.get('/api/v1/health')
         assert response.status_code == 200
-        
-        data = json.loads(response.data)
+
+        # get_json parst über den JSON-Provider der App (orjson, falls
+        # installiert) und cacht das Ergebnis am Response-Objekt
+        data = response.get_json()
         assert 'status' in data
         assert 'timestamp' in data
         assert 'version' in data
@@ -246,54 +312,30 @@ class TestAPIEndpoints:
         
         assert response.status_code == 401
     
-    def test_signal_endpoint_authorized(self, client):
+    def test_signal_endpoint_authorized(self, client, signer):
         """Test Signal Endpoint mit Authentifizierung"""
-        # Test-Header erstellen
-        headers = create_test_headers(
-            api_key="test_pub_key",
-            secret="test_sec_key",
-            method="POST",
-            path="/api/v1/signal",
-            body='{"strategy":"test","symbol":"EURUSD","side":"buy","type":"market","risk":{"percent":1.0},"sl":{"pips":20},"tp":{"pips":40}}'
-        )
-        
-        response = client.post('/api/v1/signal', 
-                             json={
-                                 "strategy": "test",
-                                 "symbol": "EURUSD",
-                                 "side": "buy",
-                                 "type": "market",
-                                 "risk": {"percent": 1.0},
-                                 "sl": {"pips": 20},
-                                 "tp": {"pips": 40}
-                             },
-                             headers=headers)
-        
+        # Payload einmal serialisieren und exakt diese Bytes signieren
+        # und posten - kein zweiter Serialisierungslauf, der von der
+        # signierten Darstellung abweichen könnte
+        payload = {**BASE_SIGNAL_DICT, "strategy": "test"}
+        body = json.dumps(payload, separators=(',', ':'))
+        headers = signer("POST", "/api/v1/signal", body=body)
+
+        response = client.post('/api/v1/signal', data=body, headers=headers)
+
         # Mock-Modus sollte funktionieren
         assert response.status_code in [200, 503]  # 503 wenn MT5 nicht verfügbar
     
-    def test_positions_endpoint(self, client):
+    def test_positions_endpoint(self, client, signer):
         """Test Positions Endpoint"""
-        headers = create_test_headers(
-            api_key="test_pub_key",
-            secret="test_sec_key",
-            method="GET",
-            path="/api/v1/positions",
-            body=""
-        )
+        headers = signer("GET", "/api/v1/positions")
         
         response = client.get('/api/v1/positions', headers=headers)
         assert response.status_code in [200, 503]
     
-    def test_account_endpoint(self, client):
+    def test_account_endpoint(self, client, signer):
         """Test Account Endpoint"""
-        headers = create_test_headers(
-            api_key="test_pub_key",
-            secret="test_sec_key",
-            method="GET",
-            path="/api/v1/account",
-            body=""
-        )
+        headers = signer("GET", "/api/v1/account")
         
         response = client.get('/api/v1/account', headers=headers)
         assert response.status_code in [200, 503]
@@ -301,45 +343,35 @@ class TestAPIEndpoints:
 class TestSchemas:
     """Tests für Pydantic-Schemas"""
     
-    def test_trading_signal_request_valid(self):
-        """Test gültiges Trading-Signal-Request"""
-        data = {
-            "strategy": "test_strategy",
-            "symbol": "EURUSD",
-            "side": "buy",
-            "type": "market",
-            "risk": {"percent": 1.0},
-            "sl": {"pips": 20},
-            "tp": {"pips": 40},
-            "comment": "test_comment",
-            "idempotency_key": "test_key_123"
-        }
-        
-        request = TradingSignalRequest(**data)
-        
-        assert request.strategy == "test_strategy"
+    @pytest.mark.parametrize("data", VALID_SIGNAL_CASES)
+    def test_trading_signal_request_valid(self, data):
+        """Test gültige Trading-Signal-Requests"""
+        # Über die beim Import kompilierten Adapter validieren - derselbe
+        # Pfad, den auch die API-Routen nehmen
+        request = SIGNAL_ADAPTER.validate_python(data)
+
+        assert request.strategy == data["strategy"]
         assert request.symbol == "EURUSD"
-        assert request.side == "buy"
-        assert request.type == "market"
+        assert request.side == data["side"]
+        assert request.type == data["type"]
         assert request.risk.percent == 1.0
         assert request.sl.pips == 20
         assert request.tp.pips == 40
-    
-    def test_trading_signal_request_invalid(self):
-        """Test ungültiges Trading-Signal-Request"""
-        data = {
-            "strategy": "",  # Leerer String
-            "symbol": "EURUSD",
-            "side": "invalid_side",  # Ungültige Seite
-            "type": "market",
-            "risk": {"percent": 15.0},  # Zu hohes Risiko
-            "sl": {"pips": 20},
-            "tp": {"pips": 40}
-        }
-        
+
+    @pytest.mark.parametrize("data", INVALID_SIGNAL_CASES)
+    def test_trading_signal_request_invalid(self, data):
+        """Test ungültige Trading-Signal-Requests"""
         with pytest.raises(Exception):  # Pydantic ValidationError
-            TradingSignalRequest(**data)
-    
+            SIGNAL_ADAPTER.validate_python(data)
+
+    def test_trading_signal_request_batch(self):
+        """Test Batch-Validierung über den Listen-Adapter"""
+        requests = _SIGNAL_LIST_ADAPTER.validate_python(VALID_SIGNAL_CASES)
+
+        assert len(requests) == len(VALID_SIGNAL_CASES)
+        assert all(r.symbol == "EURUSD" for r in requests)
+
+
     def test_order_request_valid(self):
         """Test gültiges Order-Request"""
         data = {
@@ -352,7 +384,7 @@ class TestSchemas:
             "comment": "test_order"
         }
         
-        request = OrderRequest(**data)
+        request = ORDER_ADAPTER.validate_python(data)
         
         assert request.symbol == "EURUSD"
         assert request.side == "buy"
@@ -389,20 +421,11 @@ class TestMockMT5:
         assert account_info['balance'] == 10000.0
         assert account_info['currency'] == "USD"
     
-    def test_mock_mt5_positions(self, mock_trading_engine):
+    def test_mock_mt5_positions(self, mock_trading_engine, base_signal):
         """Test Mock Positionen"""
         # Position hinzufügen
-        signal = TradingSignal(
-            strategy="test",
-            symbol="EURUSD",
-            side=OrderSide.BUY,
-            order_type=OrderType.MARKET,
-            risk=RiskConfig(percent=1.0),
-            sl=StopLossConfig(pips=20),
-            tp=TakeProfitConfig(pips=40),
-            comment="test_position"
-        )
-        
+        signal = replace(base_signal, strategy="test", comment="test_position")
+
         result = mock_trading_engine.execute_signal(signal)
         assert result.success
         
@@ -416,21 +439,13 @@ class TestMockMT5:
 class TestIntegration:
     """Integration Tests"""
     
-    def test_full_trading_flow(self, mock_trading_engine):
+    def test_full_trading_flow(self, mock_trading_engine, base_signal):
         """Test vollständiger Trading-Flow"""
         # Signal erstellen
-        signal = TradingSignal(
-            strategy="integration_test",
-            symbol="EURUSD",
-            side=OrderSide.BUY,
-            order_type=OrderType.MARKET,
-            risk=RiskConfig(percent=1.0),
-            sl=StopLossConfig(pips=20),
-            tp=TakeProfitConfig(pips=40),
-            comment="integration_test_signal",
-            idempotency_key="integration_test_key"
-        )
-        
+        signal = replace(base_signal, strategy="integration_test",
+                         comment="integration_test_signal",
+                         idempotency_key="integration_test_key")
+
         # Signal ausführen
         result = mock_trading_engine.execute_signal(signal)
         assert result.success
@@ -459,5 +474,47 @@ class TestIntegration:
         positions = mock_trading_engine.get_positions()
         assert len(positions) == 0
 
+    def test_positions_bulk(self, mock_trading_engine, base_signal):
+        """Test Positions-API mit vielen offenen Positionen"""
+        for i in range(500):
+            result = mock_trading_engine.execute_signal(
+                replace(base_signal, idempotency_key=f"bulk_pos_{i}"))
+            assert result.success
+
+        positions = mock_trading_engine.get_positions()
+        assert len(positions) == 500
+        assert sum(1 for p in positions if p['type'] == 'buy') == 500
+
+    def test_pipelined_flow(self, mock_trading_engine, base_signal):
+        """Test gepipelinete Signal-Verarbeitung (Producer/Consumer)"""
+        async def _run():
+            loop = asyncio.get_running_loop()
+            queue = asyncio.Queue()
+            results = []
+
+            async def consumer():
+                while True:
+                    signal = await queue.get()
+                    if signal is None:
+                        return
+                    results.append(await loop.run_in_executor(
+                        None, mock_trading_engine.execute_signal, signal))
+
+            workers = [asyncio.ensure_future(consumer()) for _ in range(4)]
+
+            for i in range(100):
+                await queue.put(replace(base_signal, comment="pipeline_test",
+                                        idempotency_key=f"pipeline_key_{i}"))
+            for _ in workers:
+                await queue.put(None)
+
+            await asyncio.gather(*workers)
+            return results
+
+        results = asyncio.run(_run())
+
+        assert len(results) == 100
+        assert all(result.success for result in results)
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])